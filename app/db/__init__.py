@@ -4,6 +4,8 @@ from config import Config
 from .main_db import MainDb
 from .main_db import DbPersist
 from .media_db import MediaDb
+from .meta_db import MetaDb
+from .sqlite_engine import sql_stats
 from alembic.config import Config as AlembicConfig
 from alembic.command import upgrade as alembic_upgrade
 
@@ -14,6 +16,7 @@ def init_db():
     """
     log.console('开始初始化数据库...')
     MediaDb().init_db()
+    MetaDb().init_db()
     MainDb().init_db()
     log.console('数据库初始化完成')
 
@@ -39,6 +42,18 @@ def update_db():
         alembic_cfg.set_main_option('script_location', script_location)
         alembic_cfg.set_main_option('sqlalchemy.url', f"sqlite:///{db_location}")
         alembic_upgrade(alembic_cfg, 'head')
+        # 已建立的连接不会感知更新后新建的索引，重建连接池
+        MainDb().dispose()
         log.console('数据库更新完成')
     except Exception as e:
         log.console(f'数据库更新失败：{e}')
+
+
+def get_db_stats(top=50):
+    """
+    数据库执行统计：按累计耗时排序的语句统计及各写入队列的统计
+    """
+    return {
+        "statements": sql_stats.get_stats(top=top),
+        "writers": [MainDb().writer.get_stats(), MediaDb().writer.get_stats()]
+    }
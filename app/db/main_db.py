@@ -1,27 +1,22 @@
 import os
 import threading
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import QueuePool
 
 from app.db.models import Base
-from app.utils import ExceptionUtils, PathUtils
+from app.db.sqlite_engine import create_sqlite_engine, release_after_read, DbWriter
+from app.utils import PathUtils
 from config import Config
 
 lock = threading.Lock()
-_Engine = create_engine(
-    f"sqlite:///{os.path.join(Config().get_config_path(), 'user.db')}?check_same_thread=False",
-    echo=False,
-    poolclass=QueuePool,
-    pool_pre_ping=True,
-    pool_size=100,
-    pool_recycle=60 * 10,
-    max_overflow=0
-)
+_DbFile = os.path.join(Config().get_config_path(), 'user.db')
+_Engine = create_sqlite_engine(_DbFile, "user.db")
 _Session = scoped_session(sessionmaker(bind=_Engine,
                                        autoflush=True,
                                        autocommit=False,
                                        expire_on_commit=False))
+release_after_read(_Session.session_factory)
+_Writer = DbWriter(_DbFile, "user.db", _Session)
 
 
 class MainDb:
@@ -30,11 +25,52 @@ class MainDb:
     def session(self):
         return _Session()
 
+    @property
+    def writer(self):
+        return _Writer
+
     def init_db(self):
         with lock:
             Base.metadata.create_all(_Engine)
             self.init_db_version()
 
+    @staticmethod
+    def dispose():
+        """
+        关闭连接池中的所有连接
+        """
+        _Session.remove()
+        _Engine.dispose()
+        _Writer.dispose()
+
+    @staticmethod
+    def close():
+        """
+        停止写入线程、关闭所有连接并删除WAL日志文件，覆盖数据库文件前调用，完成后调用reopen恢复写入
+        """
+        _Writer.stop()
+        _Session.remove()
+        _Engine.dispose()
+        for suffix in ["-wal", "-shm"]:
+            wal_file = f"{_DbFile}{suffix}"
+            if os.path.exists(wal_file):
+                os.remove(wal_file)
+
+    @staticmethod
+    def reopen():
+        """
+        恢复写入，读连接在下次查询时重新建立
+        """
+        _Writer.resume()
+
+    @staticmethod
+    def checkpoint():
+        """
+        将WAL日志写回数据库文件，直接复制数据库文件前调用
+        """
+        with _Engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
     def init_db_version(self):
         """
         初始化数据库版本
@@ -91,6 +127,12 @@ class MainDb:
         """
         self.session.execute(text(sql))
 
+    def execute(self, statement, params=None):
+        """
+        执行SQLAlchemy语句，params为列表时批量执行
+        """
+        return self.session.execute(statement, params)
+
     def flush(self):
         """
         刷写
@@ -112,7 +154,7 @@ class MainDb:
 
 class DbPersist(object):
     """
-    数据库持久化装饰器
+    数据库持久化装饰器，写操作在写入队列中执行并提交
     """
 
     def __init__(self, db):
@@ -120,13 +162,6 @@ class DbPersist(object):
 
     def __call__(self, f):
         def persist(*args, **kwargs):
-            try:
-                ret = f(*args, **kwargs)
-                self.db.commit()
-                return True if ret is None else ret
-            except Exception as e:
-                ExceptionUtils.exception_traceback(e)
-                self.db.rollback()
-                return False
+            return self.db.writer.execute(f, *args, **kwargs)
 
         return persist
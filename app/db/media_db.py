@@ -4,27 +4,21 @@ import threading
 import time
 
 from cachetools import cached, TTLCache
-from sqlalchemy import create_engine
+from sqlalchemy import inspect, insert
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import QueuePool
 
 from app.db.models import BaseMedia, MEDIASYNCITEMS, MEDIASYNCSTATISTIC
-from app.utils import ExceptionUtils
-from config import Config
+from app.db.sqlite_engine import create_sqlite_engine, release_after_read, DbWriter
+from config import Config, DB_IN_QUERY_SIZE
 
 lock = threading.Lock()
-_Engine = create_engine(
-    f"sqlite:///{os.path.join(Config().get_config_path(), 'media.db')}?check_same_thread=False",
-    echo=False,
-    poolclass=QueuePool,
-    pool_pre_ping=True,
-    pool_size=100,
-    pool_recycle=60 * 10,
-    max_overflow=0
-)
+_DbFile = os.path.join(Config().get_config_path(), 'media.db')
+_Engine = create_sqlite_engine(_DbFile, "media.db")
 _Session = scoped_session(sessionmaker(bind=_Engine,
                                        autoflush=True,
                                        autocommit=False))
+release_after_read(_Session.session_factory)
+_Writer = DbWriter(_DbFile, "media.db", _Session)
 
 
 class MediaDb:
@@ -33,74 +27,113 @@ class MediaDb:
     def session(self):
         return _Session()
 
+    @property
+    def writer(self):
+        return _Writer
+
     @staticmethod
     def init_db():
         with lock:
             BaseMedia.metadata.create_all(_Engine)
+            # media.db不经过版本升级，已存在的表需单独补建新增的字段及索引
+            columns = [column.get("name") for column in inspect(_Engine).get_columns(MEDIASYNCITEMS.__tablename__)]
+            if "ETAG" not in columns:
+                with _Engine.begin() as conn:
+                    conn.exec_driver_sql("ALTER TABLE MEDIASYNC_ITEMS ADD COLUMN ETAG TEXT")
+            for index in MEDIASYNCITEMS.__table__.indexes:
+                index.create(_Engine, checkfirst=True)
 
     def insert(self, server_type, iteminfo, seasoninfo):
         if not server_type or not iteminfo:
             return False
-        try:
-            self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
-                                                      MEDIASYNCITEMS.ITEM_ID == iteminfo.get("id")).delete()
-            self.session.flush()
-            self.session.add(MEDIASYNCITEMS(
-                SERVER=server_type,
-                LIBRARY=iteminfo.get("library"),
-                ITEM_ID=iteminfo.get("id"),
-                ITEM_TYPE=iteminfo.get("type"),
-                TITLE=iteminfo.get("title"),
-                ORGIN_TITLE=iteminfo.get("originalTitle"),
-                YEAR=iteminfo.get("year"),
-                TMDBID=iteminfo.get("tmdbid"),
-                IMDBID=iteminfo.get("imdbid"),
-                PATH=iteminfo.get("path"),
-                JSON=json.dumps(seasoninfo)
-            ))
-            self.session.commit()
-            return True
-        except Exception as e:
-            ExceptionUtils.exception_traceback(e)
-            self.session.rollback()
-        return False
+        return _Writer.execute(self.__insert, server_type, iteminfo, seasoninfo)
+
+    def __insert(self, server_type, iteminfo, seasoninfo):
+        self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
+                                                  MEDIASYNCITEMS.ITEM_ID == iteminfo.get("id")).delete()
+        self.session.flush()
+        self.session.add(MEDIASYNCITEMS(**self.__get_item(server_type, iteminfo, seasoninfo)))
+
+    @staticmethod
+    def __get_item(server_type, iteminfo, seasoninfo):
+        return {
+            "SERVER": server_type,
+            "LIBRARY": iteminfo.get("library"),
+            "ITEM_ID": iteminfo.get("id"),
+            "ITEM_TYPE": iteminfo.get("type"),
+            "TITLE": iteminfo.get("title"),
+            "ORGIN_TITLE": iteminfo.get("originalTitle"),
+            "YEAR": iteminfo.get("year"),
+            "TMDBID": iteminfo.get("tmdbid"),
+            "IMDBID": iteminfo.get("imdbid"),
+            "PATH": iteminfo.get("path"),
+            "JSON": json.dumps(seasoninfo),
+            "ETAG": iteminfo.get("etag")
+        }
+
+    def get_etags(self, server_type):
+        """
+        查询已同步的媒体ID及对应的etag
+        """
+        if not server_type:
+            return {}
+        return dict(self.session.query(MEDIASYNCITEMS.ITEM_ID,
+                                       MEDIASYNCITEMS.ETAG).filter(MEDIASYNCITEMS.SERVER == server_type).all())
+
+    def sync(self, server_type, items, delete_ids, total_count, movie_count, tv_count):
+        """
+        在一个事务中写入新增或变化的媒体、删除已不存在的媒体并更新统计，提交前查询到的仍是原来的数据
+        :param server_type: 媒体服务器类型
+        :param items: 新增或变化的媒体，(iteminfo, seasoninfo)列表
+        :param delete_ids: 需删除的媒体ID列表
+        :param total_count: 媒体总数，为None时不更新统计
+        """
+        if not server_type:
+            return False
+        return _Writer.execute(self.__sync, server_type, items, delete_ids, total_count, movie_count, tv_count)
+
+    def __sync(self, server_type, items, delete_ids, total_count, movie_count, tv_count):
+        item_ids = [iteminfo.get("id") for iteminfo, _ in items] + list(delete_ids)
+        for i in range(0, len(item_ids), DB_IN_QUERY_SIZE):
+            self.session.query(MEDIASYNCITEMS).filter(
+                MEDIASYNCITEMS.SERVER == server_type,
+                MEDIASYNCITEMS.ITEM_ID.in_(item_ids[i:i + DB_IN_QUERY_SIZE])
+            ).delete(synchronize_session=False)
+        if items:
+            self.session.execute(insert(MEDIASYNCITEMS),
+                                 [self.__get_item(server_type, iteminfo, seasoninfo)
+                                  for iteminfo, seasoninfo in items])
+        if total_count is not None:
+            self.__statistics(server_type, total_count, movie_count, tv_count)
 
     def empty(self, server_type=None, library=None):
-        try:
-            if server_type and library:
-                self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
-                                                          MEDIASYNCITEMS.LIBRARY == library).delete()
-            elif server_type:
-                self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type).delete()
-            else:
-                self.session.query(MEDIASYNCITEMS).delete()
-            self.session.commit()
-            return True
-        except Exception as e:
-            ExceptionUtils.exception_traceback(e)
-            self.session.rollback()
-        return False
+        return _Writer.execute(self.__empty, server_type, library)
+
+    def __empty(self, server_type=None, library=None):
+        if server_type and library:
+            self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
+                                                      MEDIASYNCITEMS.LIBRARY == library).delete()
+        elif server_type:
+            self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type).delete()
+        else:
+            self.session.query(MEDIASYNCITEMS).delete()
 
     def statistics(self, server_type, total_count, movie_count, tv_count):
         if not server_type:
             return False
-        try:
-            self.session.query(MEDIASYNCSTATISTIC).filter(MEDIASYNCSTATISTIC.SERVER == server_type).delete()
-            self.session.flush()
-            self.session.add(MEDIASYNCSTATISTIC(
-                SERVER=server_type,
-                TOTAL_COUNT=total_count,
-                MOVIE_COUNT=movie_count,
-                TV_COUNT=tv_count,
-                UPDATE_TIME=time.strftime('%Y-%m-%d %H:%M:%S',
-                                          time.localtime(time.time()))
-            ))
-            self.session.commit()
-            return True
-        except Exception as e:
-            ExceptionUtils.exception_traceback(e)
-            self.session.rollback()
-        return False
+        return _Writer.execute(self.__statistics, server_type, total_count, movie_count, tv_count)
+
+    def __statistics(self, server_type, total_count, movie_count, tv_count):
+        self.session.query(MEDIASYNCSTATISTIC).filter(MEDIASYNCSTATISTIC.SERVER == server_type).delete()
+        self.session.flush()
+        self.session.add(MEDIASYNCSTATISTIC(
+            SERVER=server_type,
+            TOTAL_COUNT=total_count,
+            MOVIE_COUNT=movie_count,
+            TV_COUNT=tv_count,
+            UPDATE_TIME=time.strftime('%Y-%m-%d %H:%M:%S',
+                                      time.localtime(time.time()))
+        ))
 
     @cached(cache=TTLCache(maxsize=128, ttl=60))
     def query(self, server_type, title, year, tmdbid):
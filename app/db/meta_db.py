@@ -0,0 +1,181 @@
+import os
+import pickle
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+from app.db.models import BaseMeta, TMDBCACHE
+from app.db.sqlite_engine import create_sqlite_engine
+from app.utils import ExceptionUtils
+from config import Config
+
+lock = threading.Lock()
+_Engine = create_sqlite_engine(os.path.join(Config().get_config_path(), 'meta.db'), "meta.db")
+_Session = scoped_session(sessionmaker(bind=_Engine,
+                                       autoflush=True,
+                                       autocommit=False))
+
+# 缓存KEY全文索引（trigram分词，支持大小写不敏感的子串搜索）
+_FTS_SQLS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS TMDB_CACHE_FTS "
+    "USING fts5(KEY, content='TMDB_CACHE', content_rowid='ID', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS TMDB_CACHE_AI AFTER INSERT ON TMDB_CACHE BEGIN "
+    "INSERT INTO TMDB_CACHE_FTS(rowid, KEY) VALUES (new.ID, new.KEY); END",
+    "CREATE TRIGGER IF NOT EXISTS TMDB_CACHE_AD AFTER DELETE ON TMDB_CACHE BEGIN "
+    "INSERT INTO TMDB_CACHE_FTS(TMDB_CACHE_FTS, rowid, KEY) VALUES ('delete', old.ID, old.KEY); END",
+    "CREATE TRIGGER IF NOT EXISTS TMDB_CACHE_AU AFTER UPDATE OF KEY ON TMDB_CACHE BEGIN "
+    "INSERT INTO TMDB_CACHE_FTS(TMDB_CACHE_FTS, rowid, KEY) VALUES ('delete', old.ID, old.KEY); "
+    "INSERT INTO TMDB_CACHE_FTS(rowid, KEY) VALUES (new.ID, new.KEY); END"
+]
+
+# trigram分词的最小搜索长度
+_FTS_MIN_LENGTH = 3
+
+
+class MetaDb:
+    """
+    TMDB识别缓存存储，按KEY索引，条目按需加载、增量写入
+    """
+    _fts_enable = False
+
+    @property
+    def session(self):
+        return _Session()
+
+    def init_db(self):
+        with lock:
+            BaseMeta.metadata.create_all(_Engine)
+            try:
+                for sql in _FTS_SQLS:
+                    self.session.execute(text(sql))
+                self.session.commit()
+                MetaDb._fts_enable = True
+            except Exception as e:
+                # SQLite未编译FTS5或版本过低时退化为LIKE查询
+                print(f"TMDB缓存全文索引不可用：{str(e)}")
+                self.session.rollback()
+                MetaDb._fts_enable = False
+
+    def get(self, key):
+        """
+        按KEY查询单条缓存
+        """
+        if not key:
+            return None
+        item = self.session.query(TMDBCACHE.DATA).filter(TMDBCACHE.KEY == key).first()
+        if not item:
+            return None
+        return self.__loads(item.DATA)
+
+    def count(self):
+        """
+        缓存条目总数
+        """
+        return self.session.query(TMDBCACHE.ID).count()
+
+    def upsert(self, meta_data, expire_key):
+        """
+        批量新增或更新缓存，一个事务内完成
+        :param meta_data: {key: info}
+        :param expire_key: 条目中过期时间的字段名
+        """
+        if not meta_data:
+            return True
+        try:
+            self.session.execute(
+                text("INSERT INTO TMDB_CACHE (KEY, TMDBID, TITLE, EXPIRE, DATA) "
+                     "VALUES (:key, :tmdbid, :title, :expire, :data) "
+                     "ON CONFLICT(KEY) DO UPDATE SET TMDBID = excluded.TMDBID, TITLE = excluded.TITLE, "
+                     "EXPIRE = excluded.EXPIRE, DATA = excluded.DATA"),
+                [{
+                    "key": key,
+                    "tmdbid": str(info.get("id")),
+                    "title": info.get("title"),
+                    "expire": info.get(expire_key),
+                    "data": pickle.dumps(info, pickle.HIGHEST_PROTOCOL)
+                } for key, info in meta_data.items()])
+            self.session.commit()
+            return True
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self.session.rollback()
+        return False
+
+    def delete(self, key):
+        """
+        删除单条缓存
+        """
+        try:
+            self.session.query(TMDBCACHE).filter(TMDBCACHE.KEY == key).delete()
+            self.session.commit()
+            return True
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self.session.rollback()
+        return False
+
+    def delete_by_tmdbid(self, tmdbid):
+        """
+        删除TMDBID对应的所有缓存
+        """
+        try:
+            self.session.query(TMDBCACHE).filter(TMDBCACHE.TMDBID == str(tmdbid)).delete()
+            self.session.commit()
+            return True
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self.session.rollback()
+        return False
+
+    def delete_expired(self, timestamp):
+        """
+        删除过期时间早于timestamp的缓存
+        """
+        try:
+            count = self.session.query(TMDBCACHE).filter(TMDBCACHE.EXPIRE < timestamp).delete()
+            self.session.commit()
+            return count
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self.session.rollback()
+        return 0
+
+    def empty(self):
+        """
+        清空缓存
+        """
+        try:
+            self.session.query(TMDBCACHE).delete()
+            self.session.commit()
+            return True
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self.session.rollback()
+        return False
+
+    def search(self, search, offset, limit):
+        """
+        按KEY子串分页搜索缓存
+        :return: 总数, [(key, info)]
+        """
+        query = self.session.query(TMDBCACHE.KEY, TMDBCACHE.DATA).filter(TMDBCACHE.TMDBID != '0')
+        if search:
+            if self._fts_enable and len(search) >= _FTS_MIN_LENGTH:
+                match = '"%s"' % search.replace('"', '""')
+                query = query.filter(
+                    text("TMDB_CACHE.ID IN (SELECT rowid FROM TMDB_CACHE_FTS WHERE TMDB_CACHE_FTS MATCH :match)")
+                    .bindparams(match=match))
+            else:
+                query = query.filter(TMDBCACHE.KEY.ilike(f"%{search}%"))
+        total = query.count()
+        items = query.order_by(TMDBCACHE.ID).offset(offset).limit(limit).all()
+        return total, [(item.KEY, self.__loads(item.DATA)) for item in items]
+
+    @staticmethod
+    def __loads(data):
+        try:
+            return pickle.loads(data)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return None
@@ -1,9 +1,10 @@
 # coding: utf-8
-from sqlalchemy import Column, Float, Index, Integer, Text, text, Sequence
+from sqlalchemy import Column, Float, Index, Integer, LargeBinary, Text, text, Sequence
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 BaseMedia = declarative_base()
+BaseMeta = declarative_base()
 
 
 class CONFIGFILTERGROUP(Base):
@@ -205,6 +206,9 @@ class MESSAGECLIENT(Base):
 
 class RSSHISTORY(Base):
     __tablename__ = 'RSS_HISTORY'
+    __table_args__ = (
+        Index('INDX_RSS_HISTORY_TNYS', 'TYPE', 'NAME', 'YEAR', 'SEASON'),
+    )
 
     ID = Column(Integer, Sequence('ID'), primary_key=True)
     TYPE = Column(Text)
@@ -249,6 +253,7 @@ class RSSMOVIES(Base):
     STATE = Column(Text)
     DESC = Column(Text)
     NOTE = Column(Text)
+    LAST_SEARCH = Column(Text)
 
     def as_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -258,6 +263,7 @@ class RSSTORRENTS(Base):
     __tablename__ = 'RSS_TORRENTS'
     __table_args__ = (
         Index('INDX_RSS_TORRENTS_NAME', 'TITLE', 'YEAR', 'SEASON', 'EPISODE'),
+        Index('INDX_RSS_TORRENTS_TORRENT_NAME', 'TORRENT_NAME'),
     )
 
     ID = Column(Integer, Sequence('ID'), primary_key=True)
@@ -300,6 +306,7 @@ class RSSTVS(Base):
     STATE = Column(Text)
     DESC = Column(Text)
     NOTE = Column(Text)
+    LAST_SEARCH = Column(Text)
 
     def as_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -407,7 +414,8 @@ class SITESTATISTICSHISTORY(Base):
     __tablename__ = 'SITE_STATISTICS_HISTORY'
     __table_args__ = (
         Index('INDX_SITE_STATISTICS_HISTORY_DS', 'DATE', 'URL'),
-        Index('UN_INDX_SITE_STATISTICS_HISTORY_DS', 'DATE', 'URL', unique=True)
+        Index('UN_INDX_SITE_STATISTICS_HISTORY_DS', 'DATE', 'URL', unique=True),
+        Index('INDX_SITE_STATISTICS_HISTORY_SD', 'SITE', 'DATE')
     )
 
     ID = Column(Integer, Sequence('ID'), primary_key=True)
@@ -490,6 +498,9 @@ class SYSTEMDICT(Base):
 
 class TRANSFERBLACKLIST(Base):
     __tablename__ = 'TRANSFER_BLACKLIST'
+    __table_args__ = (
+        Index('UN_INDX_TRANSFER_BLACKLIST_PATH', 'PATH', unique=True),
+    )
 
     ID = Column(Integer, Sequence('ID'), primary_key=True)
     PATH = Column(Text, index=True)
@@ -497,6 +508,11 @@ class TRANSFERBLACKLIST(Base):
 
 class TRANSFERHISTORY(Base):
     __tablename__ = 'TRANSFER_HISTORY'
+    __table_args__ = (
+        Index('UN_INDX_TRANSFER_HISTORY_SD', 'SOURCE_PATH', 'SOURCE_FILENAME', 'DEST_PATH', 'DEST_FILENAME',
+              unique=True),
+        Index('INDX_TRANSFER_HISTORY_TS', 'TMDBID', 'SEASON_EPISODE'),
+    )
 
     ID = Column(Integer, Sequence('ID'), primary_key=True)
     MODE = Column(Text)
@@ -566,6 +582,8 @@ class MEDIASYNCITEMS(BaseMedia):
     __tablename__ = 'MEDIASYNC_ITEMS'
     __table_args__ = (
         Index('INDX_MEDIASYNC_ITEMS_SL', 'SERVER', 'LIBRARY'),
+        Index('INDX_MEDIASYNC_ITEMS_ST', 'SERVER', 'TMDBID'),
+        Index('INDX_MEDIASYNC_ITEMS_STY', 'SERVER', 'TITLE', 'YEAR'),
     )
 
     ID = Column(Integer, Sequence('ID'), primary_key=True)
@@ -581,6 +599,7 @@ class MEDIASYNCITEMS(BaseMedia):
     PATH = Column(Text)
     NOTE = Column(Text)
     JSON = Column(Text)
+    ETAG = Column(Text)
 
 
 class MEDIASYNCSTATISTIC(BaseMedia):
@@ -592,3 +611,14 @@ class MEDIASYNCSTATISTIC(BaseMedia):
     MOVIE_COUNT = Column(Text)
     TV_COUNT = Column(Text)
     UPDATE_TIME = Column(Text)
+
+
+class TMDBCACHE(BaseMeta):
+    __tablename__ = 'TMDB_CACHE'
+
+    ID = Column(Integer, Sequence('ID'), primary_key=True)
+    KEY = Column(Text, unique=True)
+    TMDBID = Column(Text, index=True)
+    TITLE = Column(Text)
+    EXPIRE = Column(Integer, index=True)
+    DATA = Column(LargeBinary)
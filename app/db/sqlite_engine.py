@@ -0,0 +1,343 @@
+import queue
+import threading
+import time
+
+from cachetools import LRUCache
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+import log
+from app.utils import ExceptionUtils
+from config import DB_POOL_SIZE, DB_POOL_OVERFLOW, DB_BUSY_TIMEOUT, DB_CACHE_SIZE, DB_MMAP_SIZE, \
+    DB_WRITE_BATCH_SIZE, DB_WRITE_TIMEOUT, DB_SLOW_QUERY_TIME, DB_STATS_MAX_STATEMENTS
+
+
+class SqlStats(object):
+    """
+    按SQL语句统计执行次数及耗时，超过阈值的慢查询输出日志
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = LRUCache(maxsize=DB_STATS_MAX_STATEMENTS)
+
+    def record(self, db_name, statement, cost):
+        if statement.startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")):
+            # 去掉SAVEPOINT名称中的序号
+            statement = statement.rstrip("0123456789")
+        key = (db_name, statement)
+        with self._lock:
+            stat = self._stats.get(key)
+            if not stat:
+                stat = self._stats[key] = {"count": 0, "total_time": 0, "max_time": 0}
+            stat["count"] += 1
+            stat["total_time"] += cost
+            stat["max_time"] = max(stat["max_time"], cost)
+        if cost >= DB_SLOW_QUERY_TIME:
+            log.warn(f"【Db】{db_name} 慢查询，耗时 {round(cost, 3)} 秒：{statement[:500]}")
+
+    def get_stats(self, top=None):
+        """
+        按累计耗时倒序返回统计结果
+        """
+        with self._lock:
+            items = list(self._stats.items())
+        stats = [{
+            "db": db_name,
+            "statement": statement,
+            "count": stat["count"],
+            "total_time": round(stat["total_time"], 4),
+            "avg_time": round(stat["total_time"] / stat["count"], 4),
+            "max_time": round(stat["max_time"], 4)
+        } for (db_name, statement), stat in items]
+        stats.sort(key=lambda x: x["total_time"], reverse=True)
+        return stats[:top] if top else stats
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+sql_stats = SqlStats()
+
+
+def create_sqlite_engine(db_file, db_name, writer=False):
+    """
+    创建SQLite引擎：开启WAL、synchronous=NORMAL等优化，并统计每条语句的耗时
+    :param db_file: 数据库文件路径
+    :param db_name: 统计及日志中显示的数据库名称
+    :param writer: 是否为写入线程专用的引擎，只保留一个连接，事务开始即获取写锁并支持SAVEPOINT
+    """
+    engine = create_engine(
+        f"sqlite:///{db_file}?check_same_thread=False",
+        echo=False,
+        poolclass=QueuePool,
+        pool_pre_ping=True,
+        pool_size=1 if writer else DB_POOL_SIZE,
+        pool_recycle=60 * 10,
+        max_overflow=0 if writer else DB_POOL_OVERFLOW,
+        connect_args={"timeout": DB_BUSY_TIMEOUT}
+    )
+
+    @event.listens_for(engine, "connect")
+    def __on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        cursor.close()
+        if writer:
+            # 由begin事件显式开启事务，pysqlite自动管理事务时SAVEPOINT无法正常工作
+            dbapi_connection.isolation_level = None
+
+    if writer:
+        @event.listens_for(engine, "begin")
+        def __on_begin(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def __before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def __after_execute(conn, cursor, statement, parameters, context, executemany):
+        start_times = conn.info.get("query_start_time")
+        if start_times:
+            sql_stats.record(db_name, statement, time.perf_counter() - start_times.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def __on_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+
+    return engine
+
+
+# 写入线程退出标志
+_WRITER_STOP = object()
+# 写操作状态：排队中、执行中、调用方等待超时已放弃
+_JOB_QUEUED = 0
+_JOB_RUNNING = 1
+_JOB_ABANDONED = 2
+
+
+def release_after_read(session_factory):
+    """
+    读会话执行查询后立即取出全部结果并关闭会话，释放连接回连接池，线程不再长期占用读连接，
+    会话中已开启事务或有未提交的修改时不处理
+    :param session_factory: 读会话的sessionmaker
+    """
+
+    @event.listens_for(session_factory, "do_orm_execute")
+    def __on_execute(orm_execute_state):
+        session = orm_execute_state.session
+        if not orm_execute_state.is_select \
+                or session.in_transaction() \
+                or session.new or session.dirty or session.deleted:
+            return None
+        frozen_result = orm_execute_state.invoke_statement().freeze()
+        session.close()
+        return frozen_result()
+
+
+class DbWriteJob(object):
+    __slots__ = ("func", "args", "kwargs", "result", "event", "submit_time", "state")
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.result = False
+        self.event = threading.Event()
+        self.submit_time = time.time()
+        self.state = _JOB_QUEUED
+
+
+class DbWriter(object):
+    """
+    数据库写入队列：所有写操作由一个线程串行执行，排队中的多个写操作合并在一个事务中提交，
+    每个写操作在各自的SAVEPOINT中执行，失败时只回滚该操作
+    """
+
+    def __init__(self, db_file, db_name, scoped_session):
+        self._db_name = db_name
+        self._engine = create_sqlite_engine(db_file, db_name, writer=True)
+        self._session_factory = sessionmaker(bind=self._engine,
+                                             autoflush=True,
+                                             autocommit=False,
+                                             expire_on_commit=False)
+        # 写入线程中通过scoped_session取得的是写入专用的会话
+        self._scoped_session = scoped_session
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._job_lock = threading.Lock()
+        # 停止后不再自动启动写入线程，直到调用resume
+        self._paused = False
+        self._stats = {"jobs": 0, "failed": 0, "batches": 0, "wait_time": 0, "exec_time": 0}
+
+    def dispose(self):
+        """
+        关闭写入连接，下次写入时重新建立
+        """
+        self._engine.dispose()
+
+    def stop(self, timeout=DB_WRITE_TIMEOUT):
+        """
+        执行完已排队的写操作后停止写入线程并关闭写入连接，调用resume前新的写操作只排队不执行
+        """
+        with self._lock:
+            self._paused = True
+            thread = self._thread
+            if thread and thread.is_alive():
+                self._queue.put(_WRITER_STOP)
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout)
+            if thread.is_alive():
+                log.error(f"【Db】{self._db_name} 写入线程未能在 {timeout} 秒内停止")
+        self._engine.dispose()
+
+    def resume(self):
+        """
+        恢复写入，启动写入线程执行停止期间排队的写操作
+        """
+        with self._lock:
+            self._paused = False
+        if not self._queue.empty():
+            self.__start()
+
+    def is_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def execute(self, func, *args, **kwargs):
+        """
+        在写入线程中执行写操作并等待提交完成，成功时返回函数返回值（None时返回True），失败时返回False
+        """
+        if self.is_writer_thread():
+            # 写操作中嵌套调用的写操作直接执行，由外层统一提交
+            try:
+                with self._scoped_session().begin_nested():
+                    ret = func(*args, **kwargs)
+                return True if ret is None else ret
+            except Exception as err:
+                ExceptionUtils.exception_traceback(err)
+                return False
+        self.__start()
+        job = DbWriteJob(func, args, kwargs)
+        self._queue.put(job)
+        timeout_logged = False
+        while not job.event.wait(1):
+            if not timeout_logged and time.time() - job.submit_time > DB_WRITE_TIMEOUT:
+                timeout_logged = True
+                with self._job_lock:
+                    abandoned = job.state == _JOB_QUEUED
+                    if abandoned:
+                        # 尚未开始执行的放弃执行，避免返回失败后又被提交
+                        job.state = _JOB_ABANDONED
+                log.error(f"【Db】{self._db_name} 写操作等待超过 {DB_WRITE_TIMEOUT} 秒"
+                          f"{'，已放弃' if abandoned else '，正在执行中，继续等待'}：{getattr(func, '__name__', func)}")
+                if abandoned:
+                    return False
+            if not self._paused and (not self._thread or not self._thread.is_alive()):
+                # 写入线程已退出，重新启动处理队列中的写操作
+                log.warn(f"【Db】{self._db_name} 写入线程已退出，正在重新启动")
+                self.__start()
+        # 当前线程会话中缓存的对象可能已被修改，移出会话，之后的查询重新读取
+        self._scoped_session().expunge_all()
+        return job.result
+
+    def __start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._paused or (self._thread and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self.__run,
+                                            name=f"DbWriter-{self._db_name}",
+                                            daemon=True)
+            self._thread.start()
+
+    def __run(self):
+        session = self._session_factory()
+        self._scoped_session.registry.set(session)
+        stopped = False
+        while not stopped:
+            jobs = []
+            job = self._queue.get()
+            while True:
+                if job is _WRITER_STOP:
+                    stopped = True
+                    break
+                jobs.append(job)
+                if len(jobs) >= DB_WRITE_BATCH_SIZE:
+                    break
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if not jobs:
+                continue
+            try:
+                self.__run_jobs(session, jobs)
+            except Exception as err:
+                ExceptionUtils.exception_traceback(err)
+            finally:
+                for job in jobs:
+                    job.event.set()
+        session.close()
+        self._scoped_session.registry.clear()
+
+    def __run_jobs(self, session, jobs):
+        start_time = time.time()
+        failed = 0
+        for job in jobs:
+            with self._job_lock:
+                if job.state == _JOB_ABANDONED:
+                    continue
+                job.state = _JOB_RUNNING
+            try:
+                with session.begin_nested():
+                    ret = job.func(*job.args, **job.kwargs)
+                job.result = True if ret is None else ret
+            except Exception as err:
+                ExceptionUtils.exception_traceback(err)
+                job.result = False
+                failed += 1
+        try:
+            session.commit()
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            session.rollback()
+            for job in jobs:
+                job.result = False
+            failed = len(jobs)
+        finally:
+            # 返回给调用线程的对象不再关联写入会话
+            session.expunge_all()
+        self._stats["jobs"] += len(jobs)
+        self._stats["failed"] += failed
+        self._stats["batches"] += 1
+        self._stats["wait_time"] += sum(start_time - job.submit_time for job in jobs)
+        self._stats["exec_time"] += time.time() - start_time
+
+    def get_stats(self):
+        """
+        写入队列统计：写操作数、失败数、提交次数、平均每次提交的写操作数、平均排队及执行时间
+        """
+        stats = dict(self._stats)
+        jobs = stats.pop("jobs")
+        batches = stats.pop("batches")
+        return {
+            "db": self._db_name,
+            "queue_depth": self._queue.qsize(),
+            "jobs": jobs,
+            "failed": stats["failed"],
+            "commits": batches,
+            "avg_batch_size": round(jobs / batches, 2) if batches else 0,
+            "avg_wait_time": round(stats["wait_time"] / jobs, 4) if jobs else 0,
+            "avg_exec_time": round(stats["exec_time"] / batches, 4) if batches else 0
+        }
@@ -3,16 +3,18 @@ import os
 import random
 import re
 import shutil
+import threading
+import time
 import traceback
 from enum import Enum
-from threading import Lock
+from functools import partial
 from time import sleep
 
 import log
 from app.conf import ModuleConf
-from app.helper import DbHelper, ProgressHelper
+from app.helper import DbHelper, ProgressHelper, HardlinkHelper
 from app.helper import ThreadHelper
-from app.media import Media, Category, Scraper
+from app.media import Media, Category, Scraper, LibraryIndex
 from app.media.meta import MetaInfo
 from app.message import Message
 from app.plugins import EventManager
@@ -20,9 +22,107 @@ from app.utils import EpisodeFormat, PathUtils, StringUtils, SystemUtils, Except
 from app.utils.commons import singleton
 from app.utils.types import MediaType, SyncType, RmtMode, EventType, ProgressKey, MovieTypes
 from config import RMT_AUDIO_TRACK_EXT, RMT_SUBEXT, RMT_MEDIAEXT, RMT_FAVTYPE, RMT_MIN_FILESIZE, DEFAULT_MOVIE_FORMAT, \
-    DEFAULT_TV_FORMAT, Config
+    DEFAULT_TV_FORMAT, TRANSFER_DEVICE_CONCURRENCY, TRANSFER_REMOTE_CONCURRENCY, COPY_VERIFY, Config
 
-lock = Lock()
+
+class TransferLimiter(object):
+    """
+    文件转移并发控制：硬链接、软链接及同盘移动不排队，
+    本地复制/跨盘移动按源和目的磁盘设备限制并发，远程转移按转移方式限制并发
+    """
+
+    def __init__(self, device_concurrency=TRANSFER_DEVICE_CONCURRENCY, remote_concurrency=TRANSFER_REMOTE_CONCURRENCY):
+        self._device_concurrency = device_concurrency
+        self._remote_concurrency = remote_concurrency
+        self._semaphores = {}
+        self._lock = threading.Lock()
+        # 按转移方式统计：次数、累计排队时间、最长排队时间、累计执行时间
+        self._stats = {}
+
+    @staticmethod
+    def __get_device(path):
+        """
+        获取路径所在的磁盘设备，路径不存在时取最近的已存在上级目录
+        """
+        while path:
+            try:
+                return os.stat(path).st_dev
+            except OSError:
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+        return None
+
+    def __get_semaphore(self, key, concurrency):
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if not semaphore:
+                semaphore = threading.Semaphore(concurrency)
+                self._semaphores[key] = semaphore
+            return semaphore
+
+    def get_slots(self, src, dest, rmt_mode):
+        """
+        获取本次转移需要占用的并发槽位及各槽位的并发数，按固定顺序排列避免死锁
+        :return: [(槽位, 并发数)]
+        """
+        if rmt_mode in [RmtMode.LINK, RmtMode.SOFTLINK]:
+            return []
+        if rmt_mode in ModuleConf.REMOTE_RMT_MODES:
+            return [(("remote", rmt_mode.value), self._remote_concurrency)]
+        src_dev = self.__get_device(src)
+        dest_dev = self.__get_device(os.path.dirname(dest)) if dest else None
+        # 同盘移动只是重命名
+        if rmt_mode == RmtMode.MOVE and src_dev is not None and src_dev == dest_dev:
+            return []
+        devices = sorted(set(dev for dev in [src_dev, dest_dev] if dev is not None))
+        return [(("device", dev), self._device_concurrency) for dev in devices]
+
+    def __get_semaphores(self, src, dest, rmt_mode):
+        return [self.__get_semaphore(key, concurrency) for key, concurrency in self.get_slots(src, dest, rmt_mode)]
+
+    def run(self, func, src, dest, rmt_mode):
+        """
+        在并发限制下执行转移
+        """
+        semaphores = self.__get_semaphores(src, dest, rmt_mode)
+        wait_start = time.time()
+        for semaphore in semaphores:
+            semaphore.acquire()
+        try:
+            exec_start = time.time()
+            return func(src, dest)
+        finally:
+            exec_end = time.time()
+            for semaphore in reversed(semaphores):
+                semaphore.release()
+            self.__record(rmt_mode, exec_start - wait_start, exec_end - exec_start)
+
+    def __record(self, rmt_mode, wait_time, exec_time):
+        with self._lock:
+            stats = self._stats.setdefault(rmt_mode.value, {"count": 0,
+                                                            "wait_time": 0,
+                                                            "max_wait_time": 0,
+                                                            "exec_time": 0})
+            stats["count"] += 1
+            stats["wait_time"] += wait_time
+            stats["max_wait_time"] = max(stats["max_wait_time"], wait_time)
+            stats["exec_time"] += exec_time
+
+    def get_stats(self):
+        """
+        按转移方式返回平均排队时间、最长排队时间、平均执行时间
+        """
+        with self._lock:
+            return {mode: {"count": stats["count"],
+                           "avg_wait_time": round(stats["wait_time"] / stats["count"], 3),
+                           "max_wait_time": round(stats["max_wait_time"], 3),
+                           "avg_exec_time": round(stats["exec_time"] / stats["count"], 3)}
+                    for mode, stats in self._stats.items()}
+
+
+transfer_limiter = TransferLimiter()
 
 
 @singleton
@@ -36,6 +136,7 @@ class FileTransfer:
     dbhelper = None
     progress = None
     eventmanager = None
+    libraryindex = None
 
     _default_rmt_mode = None
     _movie_path = None
@@ -68,6 +169,8 @@ class FileTransfer:
         self.dbhelper = DbHelper()
         self.progress = ProgressHelper()
         self.eventmanager = EventManager()
+        self.libraryindex = LibraryIndex()
+        self.libraryindex.init_config()
 
         laboratory = Config().get_config("laboratory")
         if laboratory:
@@ -151,6 +254,26 @@ class FileTransfer:
         self._default_rmt_mode = ModuleConf.RMT_MODES.get(Config().get_config('pt').get('rmt_mode', 'copy'),
                                                           RmtMode.COPY)
 
+    @staticmethod
+    def __get_copy_progress_callback(file_item):
+        """
+        生成复制进度回调，每秒最多更新一次转移进度文字
+        """
+        file_name = os.path.basename(file_item)
+        last_update = [0]
+
+        def __callback(copied, total):
+            now = time.time()
+            if copied < total and now - last_update[0] < 1:
+                return
+            last_update[0] = now
+            ProgressHelper().update(ptype=ProgressKey.FileTransfer,
+                                    text=f"{file_name} 已复制 {StringUtils.str_filesize(copied)}"
+                                         f" / {StringUtils.str_filesize(total)}"
+                                         f" ({round(copied * 100 / total, 1) if total else 100}%)")
+
+        return __callback
+
     @staticmethod
     def __transfer_command(file_item, target_file, rmt_mode):
         """
@@ -159,33 +282,43 @@ class FileTransfer:
         :param target_file: 目标文件路径
         :param rmt_mode: RmtMode转移方式
         """
-        with lock:
-            if rmt_mode == RmtMode.LINK:
-                # 更链接
-                retcode, retmsg = SystemUtils.link(file_item, target_file)
-            elif rmt_mode == RmtMode.SOFTLINK:
-                # 软链接
-                retcode, retmsg = SystemUtils.softlink(file_item, target_file)
-            elif rmt_mode == RmtMode.MOVE:
-                # 移动
-                retcode, retmsg = SystemUtils.move(file_item, target_file)
-            elif rmt_mode == RmtMode.RCLONE:
-                # Rclone移动
-                retcode, retmsg = SystemUtils.rclone_move(file_item, target_file)
-            elif rmt_mode == RmtMode.RCLONECOPY:
-                # Rclone复制
-                retcode, retmsg = SystemUtils.rclone_copy(file_item, target_file)
-            elif rmt_mode == RmtMode.MINIO:
-                # Minio移动
-                retcode, retmsg = SystemUtils.minio_move(file_item, target_file)
-            elif rmt_mode == RmtMode.MINIOCOPY:
-                # Minio复制
-                retcode, retmsg = SystemUtils.minio_copy(file_item, target_file)
-            else:
-                # 复制
-                retcode, retmsg = SystemUtils.copy(file_item, target_file)
+        if rmt_mode == RmtMode.LINK:
+            # 更链接
+            transfer_func = SystemUtils.link
+        elif rmt_mode == RmtMode.SOFTLINK:
+            # 软链接
+            transfer_func = SystemUtils.softlink
+        elif rmt_mode == RmtMode.MOVE:
+            # 移动
+            transfer_func = SystemUtils.move
+        elif rmt_mode == RmtMode.RCLONE:
+            # Rclone移动
+            transfer_func = SystemUtils.rclone_move
+        elif rmt_mode == RmtMode.RCLONECOPY:
+            # Rclone复制
+            transfer_func = SystemUtils.rclone_copy
+        elif rmt_mode == RmtMode.MINIO:
+            # Minio移动
+            transfer_func = SystemUtils.minio_move
+        elif rmt_mode == RmtMode.MINIOCOPY:
+            # Minio复制
+            transfer_func = SystemUtils.minio_copy
+        else:
+            # 复制
+            rmt_mode = RmtMode.COPY
+            transfer_func = SystemUtils.copy
+        if rmt_mode in [RmtMode.COPY, RmtMode.MOVE]:
+            transfer_func = partial(transfer_func,
+                                    progress_callback=FileTransfer.__get_copy_progress_callback(file_item),
+                                    verify=COPY_VERIFY)
+        retcode, retmsg = transfer_limiter.run(transfer_func, file_item, target_file, rmt_mode)
+        LibraryIndex().invalidate(target_file)
         if retcode != 0:
             log.error("【Rmt】%s" % retmsg)
+        elif rmt_mode == RmtMode.LINK:
+            HardlinkHelper().add_link(file_item, target_file)
+        elif rmt_mode == RmtMode.MOVE:
+            HardlinkHelper().move_file(file_item, target_file)
         return retcode
 
     def __transfer_other_files(self, org_name, new_name, rmt_mode, over_flag):
@@ -392,8 +525,11 @@ class FileTransfer:
         :param rmt_mode: RmtMode转移方式
         :param bludir: 是否蓝光目录
         """
+        # 移动模式下遍历过程中会移走文件，先取得完整的文件清单
         file_list = PathUtils.get_dir_files(src_dir)
         retcode = 0
+        # 转移成功的文件，最后统一登记黑名单
+        blacklist_files = []
         for file in file_list:
             new_file = file.replace(src_dir, target_dir)
             if os.path.exists(new_file):
@@ -409,9 +545,10 @@ class FileTransfer:
                 break
             else:
                 if not bludir:
-                    self.dbhelper.insert_transfer_blacklist(file)
+                    blacklist_files.append(file)
         if retcode == 0 and bludir:
-            self.dbhelper.insert_transfer_blacklist(src_dir)
+            blacklist_files.append(src_dir)
+        self.dbhelper.insert_transfer_blacklist(blacklist_files)
         return retcode
 
     def __transfer_origin_file(self, file_item, target_dir, rmt_mode):
@@ -470,6 +607,7 @@ class FileTransfer:
         if over_flag and old_file and os.path.isfile(old_file):
             log.info("【Rmt】正在删除已存在的文件：%s" % old_file)
             os.remove(old_file)
+            self.libraryindex.invalidate(old_file)
         log.info("【Rmt】正在转移文件：%s 到 %s" % (file_name, new_file))
         retcode = self.__transfer_command(file_item=file_item,
                                           target_file=new_file,
@@ -520,7 +658,16 @@ class FileTransfer:
         :return: 处理状态，错误信息
         """
 
+        # 转移历史记录，处理结束时批量写入
+        transfer_histories = []
+
+        def __save_transfer_histories():
+            if transfer_histories:
+                self.dbhelper.insert_transfer_histories(transfer_histories)
+                transfer_histories.clear()
+
         def __finish_transfer(status, message):
+            __save_transfer_histories()
             if status:
                 self.progress.update(ptype=ProgressKey.FileTransfer,
                                      value=100,
@@ -626,7 +773,7 @@ class FileTransfer:
 
         # 目录同步模式下，过滤掉文件列表中已处理过的
         if in_from == SyncType.MON:
-            file_list = list(filter(self.dbhelper.is_transfer_notin_blacklist, file_list))
+            file_list = self.dbhelper.filter_transfer_notin_blacklist(file_list)
             if not file_list:
                 log.info("【Rmt】所有文件均已成功转移过，没有需要处理的文件！如需重新处理，请清理缓存（服务->清理转移缓存）")
                 return __finish_transfer(True, "没有新文件需要处理")
@@ -857,13 +1004,13 @@ class FileTransfer:
                 # 输出路径
                 out_path = new_file if not bluray_disk_dir else ret_dir_path
                 # 转移历史记录
-                self.dbhelper.insert_transfer_history(
-                    in_from=in_from,
-                    rmt_mode=rmt_mode,
-                    in_path=reg_path,
-                    out_path=out_path,
-                    dest=dist_path,
-                    media_info=media)
+                transfer_histories.append({
+                    "in_from": in_from,
+                    "rmt_mode": rmt_mode,
+                    "in_path": reg_path,
+                    "out_path": out_path,
+                    "dest": dist_path,
+                    "media_info": media})
                 # 未识别手动识别或历史记录重新识别的批处理模式
                 if isinstance(episode[1], bool) and episode[1]:
                     # 未识别手动识别，更改未识别记录为已处理
@@ -933,6 +1080,7 @@ class FileTransfer:
                 ExceptionUtils.exception_traceback(err)
                 log.error("【Rmt】文件转移时发生错误：%s - %s" % (str(err), traceback.format_exc()))
         # 循环结束
+        __save_transfer_histories()
         # 统计完成情况，发送通知
         if message_medias:
             if self._simplify_library_notification:
@@ -957,8 +1105,8 @@ class FileTransfer:
                     and os.path.exists(in_path) \
                     and os.path.isdir(in_path) \
                     and not root_path \
-                    and not PathUtils.get_dir_files(in_path=in_path, exts=RMT_MEDIAEXT) \
-                    and not PathUtils.get_dir_files(in_path=in_path, exts=['.!qb', '.part']):
+                    and not PathUtils.has_dir_files(in_path=in_path, exts=RMT_MEDIAEXT) \
+                    and not PathUtils.has_dir_files(in_path=in_path, exts=['.!qb', '.part']):
                 log.info("【Rmt】目录下已无媒体文件及正在下载的文件，移动模式下删除目录：%s" % in_path)
                 shutil.rmtree(in_path)
         return __finish_transfer(success_flag, error_message)
@@ -1021,25 +1169,23 @@ class FileTransfer:
                 for m_type in [RMT_FAVTYPE, media.category]:
                     type_path = os.path.join(media_dest, m_type, dir_name)
                     # 目录是否存在
-                    if os.path.exists(type_path):
+                    if self.libraryindex.is_dir_exists(type_path):
                         file_path = type_path
                         break
             # 返回路径
             ret_dir_path = file_path
             # 路径存在标志
-            if os.path.exists(file_path):
+            if self.libraryindex.is_dir_exists(file_path):
                 dir_exist_flag = True
             # 文件路径
             file_dest = os.path.join(file_path, file_name)
             # 返回文件路径
             ret_file_path = file_dest
             # 文件是否存在
-            for ext in RMT_MEDIAEXT:
-                ext_dest = "%s%s" % (file_dest, ext)
-                if os.path.exists(ext_dest):
-                    file_exist_flag = True
-                    ret_file_path = ext_dest
-                    break
+            ext_dest = self.libraryindex.get_exists_file(file_dest, RMT_MEDIAEXT)
+            if ext_dest:
+                file_exist_flag = True
+                ret_file_path = ext_dest
         # 电视剧或者动漫
         else:
             # 目录名称
@@ -1057,7 +1203,7 @@ class FileTransfer:
                 # 返回目录路径
                 ret_dir_path = season_dir
                 # 目录是否存在
-                if os.path.exists(season_dir):
+                if self.libraryindex.is_dir_exists(season_dir):
                     dir_exist_flag = True
                 # 处理集
                 episodes = media.get_episode_list()
@@ -1067,12 +1213,10 @@ class FileTransfer:
                     # 返回文件路径
                     ret_file_path = file_path
                     # 文件存在标志
-                    for ext in RMT_MEDIAEXT:
-                        ext_dest = "%s%s" % (file_path, ext)
-                        if os.path.exists(ext_dest):
-                            file_exist_flag = True
-                            ret_file_path = ext_dest
-                            break
+                    ext_dest = self.libraryindex.get_exists_file(file_path, RMT_MEDIAEXT)
+                    if ext_dest:
+                        file_exist_flag = True
+                        ret_file_path = ext_dest
         return dir_exist_flag, ret_dir_path, file_exist_flag, ret_file_path
 
     def get_dest_path_by_info(self, dest, meta_info):
@@ -1110,13 +1254,13 @@ class FileTransfer:
             for dest_path in self._movie_path:
                 # 判断精选
                 fav_path = os.path.join(dest_path, RMT_FAVTYPE, dir_name)
-                fav_files = PathUtils.get_dir_files(fav_path, RMT_MEDIAEXT)
+                fav_files = self.libraryindex.get_dir_files(fav_path, RMT_MEDIAEXT)
                 # 其它分类
                 if self._movie_category_flag:
                     dest_path = os.path.join(dest_path, meta_info.category, dir_name)
                 else:
                     dest_path = os.path.join(dest_path, dir_name)
-                files = PathUtils.get_dir_files(dest_path, RMT_MEDIAEXT)
+                files = self.libraryindex.get_dir_files(dest_path, RMT_MEDIAEXT)
                 if len(files) > 0 or len(fav_files) > 0:
                     return [{'title': meta_info.title, 'year': meta_info.year}]
             return []
@@ -1134,26 +1278,20 @@ class FileTransfer:
             # 总需要的集
             total_episodes = [episode for episode in range(1, total_num + 1)]
             # 已存在的集
-            exists_episodes = []
+            exists_episodes = set()
             for dest_path in dest_paths:
                 if category_flag:
                     dest_path = os.path.join(dest_path, meta_info.category, dir_name, season_name)
                 else:
                     dest_path = os.path.join(dest_path, dir_name, season_name)
                 # 目录不存在
-                if not os.path.exists(dest_path):
+                if not self.libraryindex.is_dir_exists(dest_path):
                     continue
-                files = PathUtils.get_dir_files(dest_path, RMT_MEDIAEXT)
-                for file in files:
-                    file_meta_info = MetaInfo(os.path.basename(file), filePath=file)
-                    if not file_meta_info.get_season_list() or not file_meta_info.get_episode_list():
-                        continue
-                    if file_meta_info.get_name() != meta_info.title:
-                        continue
-                    if not file_meta_info.is_in_season(season):
-                        continue
-                    exists_episodes = list(set(exists_episodes).union(set(file_meta_info.get_episode_list())))
-            return list(set(total_episodes).difference(set(exists_episodes)))
+                exists_episodes.update(self.libraryindex.get_exists_episodes(season_dir=dest_path,
+                                                                              title=meta_info.title,
+                                                                              season=season,
+                                                                              exts=RMT_MEDIAEXT))
+            return list(set(total_episodes).difference(exists_episodes))
 
     def get_best_target_path(self, mtype, in_path=None, size=0):
         """
@@ -1212,6 +1350,13 @@ class FileTransfer:
                 return unknown_path
         return self._unknown_path[0]
 
+    @staticmethod
+    def get_transfer_command_stats():
+        """
+        获取各转移方式的排队及执行时间统计
+        """
+        return transfer_limiter.get_stats()
+
     def link_sync_file(self, src_path, in_file, target_dir, sync_transfer_mode):
         """
         对文件做纯链接处理，不做识别重命名，则监控模块调用
@@ -1,4 +1,6 @@
 import re
+import threading
+from functools import lru_cache
 
 import log
 from app.conf import ModuleConf
@@ -9,12 +11,151 @@ from app.utils.commons import singleton
 from app.utils.types import MediaType
 
 
+@lru_cache(maxsize=512)
+def _compile_filter_re(pattern):
+    """
+    编译搜索/订阅过滤条件中的正则，忽略大小写，同一表达式只编译一次
+    """
+    return re.compile(r"%s" % pattern, re.IGNORECASE)
+
+
+def _compile_rule_re(pattern):
+    """
+    编译过滤规则中的正则，表达式有误时返回异常，在匹配时再抛出，以保持原有的报错时机
+    """
+    try:
+        return re.compile(r'%s' % pattern.strip(), re.IGNORECASE)
+    except Exception as err:
+        return err
+
+
+def _rule_search(pattern, text):
+    """
+    使用预编译的规则正则匹配文本
+    """
+    if isinstance(pattern, Exception):
+        raise pattern
+    return pattern.search(text)
+
+
+class CompiledFilterRule(object):
+    """
+    预编译的过滤规则，创建后不再修改
+    """
+    __slots__ = ("info", "order_seq", "includes", "excludes", "sizes", "free")
+
+    def __init__(self, rule_info):
+        self.info = rule_info
+        # 命中规则的序号，优先级有误时在匹配时抛出
+        try:
+            self.order_seq = 100 - int(rule_info.get('pri'))
+        except Exception as err:
+            self.order_seq = err
+        self.includes = tuple(_compile_rule_re(include)
+                              for include in rule_info.get('include') or [] if include)
+        self.excludes = tuple(_compile_rule_re(exclude)
+                              for exclude in rule_info.get('exclude') or [] if exclude)
+        self.sizes = self.__parse_sizes(rule_info.get('size'))
+        self.free = self.__parse_free(rule_info.get('free'))
+
+    @staticmethod
+    def __parse_sizes(sizes):
+        """
+        解析大小范围，单位GB，返回(最小字节数, 最大字节数)
+        """
+        if not sizes:
+            return None
+        try:
+            if sizes.find(',') != -1:
+                sizes = sizes.split(',')
+                begin_size = int(sizes[0].strip()) if sizes[0].isdigit() else 0
+                end_size = int(sizes[1].strip()) if sizes[1].isdigit() else 0
+            else:
+                begin_size = 0
+                end_size = int(sizes.strip()) if sizes.isdigit() else 0
+            return begin_size * 1024 ** 3, end_size * 1024 ** 3
+        except Exception as err:
+            return err
+
+    @staticmethod
+    def __parse_free(free):
+        """
+        解析促销要求，返回(上传因子, 下载因子)
+        """
+        if not free:
+            return None
+        try:
+            ul_factor, dl_factor = free.split()
+            return float(ul_factor), float(dl_factor)
+        except Exception as err:
+            return err
+
+    def match(self, meta_info, title):
+        """
+        检查种子是否命中当前规则
+        :param meta_info: 识别的信息
+        :param title: 过滤使用的文本
+        :return: 是否命中
+        """
+        rule_match = True
+        # 必须包括的项
+        for include in self.includes:
+            if not _rule_search(include, title):
+                rule_match = False
+                break
+        # 不能包含的项，全部命中时才排除
+        if self.excludes and rule_match:
+            exclude_flag = False
+            for exclude in self.excludes:
+                if not _rule_search(exclude, title):
+                    exclude_flag = True
+            if not exclude_flag:
+                rule_match = False
+        # 大小
+        if self.sizes and rule_match and meta_info.size:
+            meta_info.size = StringUtils.num_filesize(meta_info.size)
+            if isinstance(self.sizes, Exception):
+                raise self.sizes
+            begin_size, end_size = self.sizes
+            if meta_info.type == MediaType.MOVIE:
+                if not begin_size <= int(meta_info.size) <= end_size:
+                    rule_match = False
+            else:
+                if meta_info.total_episodes \
+                        and not begin_size <= int(meta_info.size) / int(meta_info.total_episodes) <= end_size:
+                    rule_match = False
+        # 促销
+        if self.free and meta_info.upload_volume_factor is not None and meta_info.download_volume_factor is not None:
+            if isinstance(self.free, Exception):
+                raise self.free
+            ul_factor, dl_factor = self.free
+            if ul_factor > meta_info.upload_volume_factor \
+                    or dl_factor < meta_info.download_volume_factor:
+                rule_match = False
+        return rule_match
+
+
+class CompiledFilterGroup(object):
+    """
+    预编译的过滤规则组，规则变化时整体重建
+    """
+    __slots__ = ("id", "name", "rules")
+
+    def __init__(self, group_info, rule_infos):
+        self.id = group_info.get("id")
+        self.name = group_info.get("name")
+        self.rules = tuple(CompiledFilterRule(rule_info) for rule_info in rule_infos)
+
+
 @singleton
 class Filter:
     rg_matcher = None
     dbhelper = None
     _groups = []
     _rules = []
+    # 预编译的规则组，按规则组ID缓存，None为默认规则组
+    _compiled_groups = {}
+    _compiled_lock = threading.Lock()
 
     def __init__(self):
         self.init_config()
@@ -22,8 +163,10 @@ class Filter:
     def init_config(self):
         self.dbhelper = DbHelper()
         self.rg_matcher = ReleaseGroupsMatcher()
-        self._groups = self.get_filter_group()
-        self._rules = self.get_filter_rule()
+        with self._compiled_lock:
+            self._groups = self.get_filter_group()
+            self._rules = self.get_filter_rule()
+            self._compiled_groups = {}
 
     def get_rule_groups(self, groupid=None, default=False):
         """
@@ -93,6 +236,31 @@ class Filter:
         first_order = min([int(rule_info.get("pri")) for rule_info in self.get_rules(groupid=rulegroup)] or [0])
         return 100 - first_order
 
+    def get_compiled_group(self, rulegroup=None):
+        """
+        获取预编译的规则组，首次使用时编译并缓存
+        :param rulegroup: 规则组ID，为空时使用默认规则组
+        :return: CompiledFilterGroup，规则组不存在时返回None
+        """
+        key = str(rulegroup) if rulegroup else None
+        compiled_groups = self._compiled_groups
+        if key in compiled_groups:
+            return compiled_groups.get(key)
+        with self._compiled_lock:
+            if key in self._compiled_groups:
+                return self._compiled_groups.get(key)
+            if not rulegroup:
+                group_info = self.get_rule_groups(default=True)
+                if not group_info:
+                    compiled = None
+                else:
+                    compiled = CompiledFilterGroup(group_info, self.get_rules(groupid=group_info.get("id")))
+            else:
+                group_info = self.get_rule_groups(groupid=rulegroup)
+                compiled = CompiledFilterGroup(group_info, self.get_rules(groupid=group_info.get("id")))
+            self._compiled_groups[key] = compiled
+            return compiled
+
     def check_rules(self, meta_info, rulegroup=None):
         """
         检查种子是否匹配站点过滤规则：排除规则、包含规则，优先规则
@@ -105,99 +273,62 @@ class Filter:
         # 为-1时不使用过滤规则
         if rulegroup and int(rulegroup) == -1:
             return True, 0, "不过滤"
+        # 过滤规则组
+        compiled_group = self.get_compiled_group(rulegroup)
+        if not compiled_group:
+            return True, 0, "未配置过滤规则"
+        return self.__check_compiled_rules(meta_info, compiled_group)
+
+    def check_rules_batch(self, meta_infos, rulegroup=None):
+        """
+        批量检查种子是否匹配站点过滤规则，规则组只查找一次
+        :param meta_infos: 识别的信息列表
+        :param rulegroup: 规则组ID
+        :return: 与meta_infos一一对应的(是否匹配，匹配的优先值，规则名称)列表
+        """
+        if not meta_infos:
+            return []
+        if rulegroup and int(rulegroup) == -1:
+            return [(True, 0, "不过滤") if meta_info else (False, 0, "") for meta_info in meta_infos]
+        compiled_group = self.get_compiled_group(rulegroup)
+        results = []
+        for meta_info in meta_infos:
+            if not meta_info:
+                results.append((False, 0, ""))
+            elif not compiled_group:
+                results.append((True, 0, "未配置过滤规则"))
+            else:
+                results.append(self.__check_compiled_rules(meta_info, compiled_group))
+        return results
+
+    @staticmethod
+    def __check_compiled_rules(meta_info, compiled_group):
+        """
+        使用预编译的规则组检查种子
+        """
         # 过滤使用的文本
         title = meta_info.rev_string
         if meta_info.subtitle:
             title = f"{title} {meta_info.subtitle}"
-        # 过滤规则组
-        if not rulegroup:
-            rulegroup = self.get_rule_groups(default=True)
-            if not rulegroup:
-                return True, 0, "未配置过滤规则"
-        else:
-            rulegroup = self.get_rule_groups(groupid=rulegroup)
-        filters = self.get_rules(groupid=rulegroup.get("id"))
         # 命中优先级
         order_seq = 0
         # 当前规则组是否命中
         group_match = True
-        for filter_info in filters:
+        for rule in compiled_group.rules:
             try:
-                # 当前规则是否命中
-                rule_match = True
                 # 命中规则的序号
-                order_seq = 100 - int(filter_info.get('pri'))
-                # 必须包括的项
-                includes = filter_info.get('include')
-                if includes and rule_match:
-                    include_flag = True
-                    for include in includes:
-                        if not include:
-                            continue
-                        if not re.search(r'%s' % include.strip(), title, re.IGNORECASE):
-                            include_flag = False
-                            break
-                    if not include_flag:
-                        rule_match = False
-
-                # 不能包含的项
-                excludes = filter_info.get('exclude')
-                if excludes and rule_match:
-                    exclude_flag = False
-                    exclude_count = 0
-                    for exclude in excludes:
-                        if not exclude:
-                            continue
-                        exclude_count += 1
-                        if not re.search(r'%s' % exclude.strip(), title, re.IGNORECASE):
-                            exclude_flag = True
-                    if exclude_count > 0 and not exclude_flag:
-                        rule_match = False
-                # 大小
-                sizes = filter_info.get('size')
-                if sizes and rule_match and meta_info.size:
-                    meta_info.size = StringUtils.num_filesize(meta_info.size)
-                    if sizes.find(',') != -1:
-                        sizes = sizes.split(',')
-                        if sizes[0].isdigit():
-                            begin_size = int(sizes[0].strip())
-                        else:
-                            begin_size = 0
-                        if sizes[1].isdigit():
-                            end_size = int(sizes[1].strip())
-                        else:
-                            end_size = 0
-                    else:
-                        begin_size = 0
-                        if sizes.isdigit():
-                            end_size = int(sizes.strip())
-                        else:
-                            end_size = 0
-                    if meta_info.type == MediaType.MOVIE:
-                        if not begin_size * 1024 ** 3 <= int(meta_info.size) <= end_size * 1024 ** 3:
-                            rule_match = False
-                    else:
-                        if meta_info.total_episodes \
-                                and not begin_size * 1024 ** 3 <= int(meta_info.size) / int(meta_info.total_episodes) <= end_size * 1024 ** 3:
-                            rule_match = False
-
-                # 促销
-                free = filter_info.get("free")
-                if free and meta_info.upload_volume_factor is not None and meta_info.download_volume_factor is not None:
-                    ul_factor, dl_factor = free.split()
-                    if float(ul_factor) > meta_info.upload_volume_factor \
-                            or float(dl_factor) < meta_info.download_volume_factor:
-                        rule_match = False
-
-                if rule_match:
-                    return True, order_seq, rulegroup.get("name")
+                if isinstance(rule.order_seq, Exception):
+                    raise rule.order_seq
+                order_seq = rule.order_seq
+                if rule.match(meta_info, title):
+                    return True, order_seq, compiled_group.name
                 else:
                     group_match = False
             except Exception as err:
-                log.error(f"【Filter】过滤规则出现严重错误 {err}，请检查：{filter_info}")
+                log.error(f"【Filter】过滤规则出现严重错误 {err}，请检查：{rule.info}")
         if not group_match:
-            return False, 0, rulegroup.get("name")
-        return True, order_seq, rulegroup.get("name")
+            return False, 0, compiled_group.name
+        return True, order_seq, compiled_group.name
 
     def is_rule_free(self, rulegroup=None):
         """
@@ -264,14 +395,14 @@ class Filter:
             restype_re = ModuleConf.TORRENT_SEARCH_PARAMS["restype"].get(filter_args.get("restype"))
             if not meta_info.get_edtion_string():
                 return False, 0, f"{meta_info.org_string} 不符合质量 {filter_args.get('restype')} 要求"
-            if restype_re and not re.search(r"%s" % restype_re, meta_info.get_edtion_string(), re.I):
+            if restype_re and not _compile_filter_re(restype_re).search(meta_info.get_edtion_string()):
                 return False, 0, f"{meta_info.org_string} 不符合质量 {filter_args.get('restype')} 要求"
         # 过滤分辨率
         if filter_args.get("pix"):
             pix_re = ModuleConf.TORRENT_SEARCH_PARAMS["pix"].get(filter_args.get("pix"))
             if not meta_info.resource_pix:
                 return False, 0, f"{meta_info.org_string} 不符合分辨率 {filter_args.get('pix')} 要求"
-            if pix_re and not re.search(r"%s" % pix_re, meta_info.resource_pix, re.I):
+            if pix_re and not _compile_filter_re(pix_re).search(meta_info.resource_pix):
                 return False, 0, f"{meta_info.org_string} 不符合分辨率 {filter_args.get('pix')} 要求"
         # 过滤制作组/字幕组
         if filter_args.get("team"):
@@ -284,7 +415,7 @@ class Filter:
                     return False, 0, f"{meta_info.org_string} 不符合制作组/字幕组 {team} 要求"
                 else:
                     meta_info.resource_team = resource_team
-            elif not re.search(r"%s" % team, meta_info.resource_team, re.I):
+            elif not _compile_filter_re(team).search(meta_info.resource_team):
                 return False, 0, f"{meta_info.org_string} 不符合制作组/字幕组 {team} 要求"
         # 过滤促销
         if filter_args.get("sp_state"):
@@ -296,17 +427,17 @@ class Filter:
         # 过滤包含
         if filter_args.get("include"):
             include = filter_args.get("include")
-            if not re.search(r"%s" % include, text, re.I):
+            if not _compile_filter_re(include).search(text):
                 return False, 0, f"{meta_info.org_string} 不符合包含 {include} 要求"
         # 过滤排除
         if filter_args.get("exclude"):
             exclude = filter_args.get("exclude")
-            if re.search(r"%s" % exclude, text, re.I):
+            if _compile_filter_re(exclude).search(text):
                 return False, 0, f"{meta_info.org_string} 不符合排除 {exclude} 要求"
         # 过滤关键字
         if filter_args.get("key"):
             key = filter_args.get("key")
-            if not re.search(r"%s" % key, text, re.I):
+            if not _compile_filter_re(key).search(text):
                 return False, 0, f"{meta_info.org_string} 不符合 {key} 要求"
         # 过滤过滤规则，-1表示不使用过滤规则，空则使用默认过滤规则
         if filter_args.get("rule"):
@@ -330,6 +461,25 @@ class Filter:
             )
             return match_flag, order_seq, match_msg
 
+    def check_torrent_filter_batch(self, meta_infos, filter_args):
+        """
+        批量对种子进行过滤，促销因子取自各meta_info
+        :param meta_infos: 名称识别后的MetaBase对象列表
+        :param filter_args: 过滤条件的字典
+        :return: 与meta_infos一一对应的(是否匹配，匹配的优先值，匹配信息)列表
+        """
+        if not meta_infos:
+            return []
+        # 预先编译规则组，避免在循环中加锁查找
+        rulegroup = filter_args.get("rule")
+        if not rulegroup or int(rulegroup) != -1:
+            self.get_compiled_group(rulegroup)
+        return [self.check_torrent_filter(meta_info=meta_info,
+                                          filter_args=filter_args,
+                                          uploadvolumefactor=meta_info.upload_volume_factor,
+                                          downloadvolumefactor=meta_info.download_volume_factor)
+                for meta_info in meta_infos]
+
     def add_group(self, name, default='N'):
         """
         添加过滤规则组
@@ -4,11 +4,13 @@ import time
 import json
 from enum import Enum
 from sqlalchemy import cast, func, and_, case
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from app.db import MainDb, DbPersist
 from app.db.models import *
 from app.utils import StringUtils
 from app.utils.types import MediaType, RmtMode
+from config import DB_IN_QUERY_SIZE
 
 
 class DbHelper:
@@ -71,6 +73,14 @@ class DbHelper:
         """
         return self._db.query(SEARCHRESULTINFO).filter(SEARCHRESULTINFO.ID == dl_id).all()
 
+    @DbPersist(_db)
+    def replace_search_results(self, media_items: list, title=None, ident_flag=True):
+        """
+        清空搜索结果并插入新的结果，在同一事务中完成
+        """
+        self._db.query(SEARCHRESULTINFO).delete()
+        self.insert_search_results(media_items, title, ident_flag)
+
     def get_search_results(self):
         """
         查询搜索结果的所有记录
@@ -114,14 +124,42 @@ class DbHelper:
         """
         插入识别转移记录
         """
-        if not media_info or not media_info.tmdb_info:
+        history = self.__get_transfer_history_item(in_from=in_from,
+                                                   rmt_mode=rmt_mode,
+                                                   in_path=in_path,
+                                                   out_path=out_path,
+                                                   dest=dest,
+                                                   media_info=media_info)
+        if not history:
             return
+        self.__upsert_transfer_histories([history])
+
+    @DbPersist(_db)
+    def insert_transfer_histories(self, histories: list):
+        """
+        批量插入识别转移记录，已存在的记录更新转移时间
+        :param histories: 列表，每项为insert_transfer_history参数组成的字典
+        """
+        items = []
+        for history in histories or []:
+            item = self.__get_transfer_history_item(**history)
+            if item:
+                items.append(item)
+        self.__upsert_transfer_histories(items)
+
+    @staticmethod
+    def __get_transfer_history_item(in_from: Enum, rmt_mode: RmtMode, in_path, out_path, dest, media_info):
+        """
+        组装识别转移记录
+        """
+        if not media_info or not media_info.tmdb_info:
+            return None
         if in_path:
             in_path = os.path.normpath(in_path)
             source_path = os.path.dirname(in_path)
             source_filename = os.path.basename(in_path)
         else:
-            return
+            return None
         if out_path:
             outpath = os.path.normpath(out_path)
             dest_path = os.path.dirname(outpath)
@@ -131,31 +169,35 @@ class DbHelper:
             dest_path = ""
             dest_filename = ""
             season_episode = media_info.get_season_string()
-        title = media_info.title
-        timestr = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
-        if self.is_transfer_history_exists(source_path, source_filename, dest_path, dest_filename):
-            # 更新历史转移记录的时间
-            self.update_transfer_history_date(source_path, source_filename, dest_path, dest_filename, timestr)
+        return {
+            "MODE": str(rmt_mode.value),
+            "TYPE": media_info.type.value,
+            "CATEGORY": media_info.category,
+            "TMDBID": int(media_info.tmdb_id),
+            "TITLE": media_info.title,
+            "YEAR": media_info.year,
+            "SEASON_EPISODE": season_episode,
+            "SOURCE": str(in_from.value),
+            "SOURCE_PATH": source_path,
+            "SOURCE_FILENAME": source_filename,
+            "DEST": dest or "",
+            "DEST_PATH": dest_path,
+            "DEST_FILENAME": dest_filename,
+            "DATE": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+        }
+
+    def __upsert_transfer_histories(self, items):
+        """
+        写入识别转移记录，源文件和目的文件相同的记录已存在时只更新转移时间
+        """
+        if not items:
             return
-        dest = dest or ""
-        self._db.insert(
-            TRANSFERHISTORY(
-                MODE=str(rmt_mode.value),
-                TYPE=media_info.type.value,
-                CATEGORY=media_info.category,
-                TMDBID=int(media_info.tmdb_id),
-                TITLE=title,
-                YEAR=media_info.year,
-                SEASON_EPISODE=season_episode,
-                SOURCE=str(in_from.value),
-                SOURCE_PATH=source_path,
-                SOURCE_FILENAME=source_filename,
-                DEST=dest,
-                DEST_PATH=dest_path,
-                DEST_FILENAME=dest_filename,
-                DATE=timestr
-            )
+        statement = sqlite_insert(TRANSFERHISTORY)
+        statement = statement.on_conflict_do_update(
+            index_elements=["SOURCE_PATH", "SOURCE_FILENAME", "DEST_PATH", "DEST_FILENAME"],
+            set_={"DATE": statement.excluded.DATE}
         )
+        self._db.execute(statement, items)
 
     def get_transfer_history(self, search, page, rownum):
         """
@@ -412,19 +454,40 @@ class DbHelper:
         """
         return not self.is_transfer_in_blacklist(path)
 
+    def get_transfer_in_blacklist(self, paths):
+        """
+        批量查询黑名单
+        :param paths: 路径列表
+        :return: 在黑名单中的路径集合（格式化后的路径）
+        """
+        paths = list({os.path.normpath(path) for path in paths or [] if path})
+        blacklist = set()
+        for i in range(0, len(paths), DB_IN_QUERY_SIZE):
+            blacklist.update(
+                item.PATH for item in self._db.query(TRANSFERBLACKLIST.PATH).filter(
+                    TRANSFERBLACKLIST.PATH.in_(paths[i:i + DB_IN_QUERY_SIZE])
+                ).all())
+        return blacklist
+
+    def filter_transfer_notin_blacklist(self, paths):
+        """
+        过滤掉黑名单中的路径，保持原有顺序
+        """
+        blacklist = self.get_transfer_in_blacklist(paths)
+        return [path for path in paths if os.path.normpath(path) not in blacklist]
+
     @DbPersist(_db)
     def insert_transfer_blacklist(self, path):
         """
-        插入黑名单记录
+        插入黑名单记录，支持传入路径列表批量插入
         """
         if not path:
             return
-        if self.is_transfer_in_blacklist(path):
+        paths = path if isinstance(path, list) else [path]
+        items = [{"PATH": p} for p in dict.fromkeys(os.path.normpath(p) for p in paths if p)]
+        if not items:
             return
-        else:
-            self._db.insert(TRANSFERBLACKLIST(
-                PATH=os.path.normpath(path)
-            ))
+        self._db.execute(sqlite_insert(TRANSFERBLACKLIST).on_conflict_do_nothing(index_elements=["PATH"]), items)
 
     @DbPersist(_db)
     def delete_transfer_blacklist(self, path):
@@ -765,6 +828,18 @@ class DbHelper:
                     "STATE": state
                 })
 
+    @DbPersist(_db)
+    def update_rss_movie_last_search(self, rssid):
+        """
+        更新电影订阅的最后搜索时间
+        """
+        if not rssid:
+            return
+        self._db.query(RSSMOVIES).filter(RSSMOVIES.ID == int(rssid)).update(
+            {
+                "LAST_SEARCH": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+            })
+
     def get_rss_tvs(self, state=None, rssid=None):
         """
         查询订阅电视剧信息
@@ -1058,6 +1133,18 @@ class DbHelper:
                     "STATE": state
                 })
 
+    @DbPersist(_db)
+    def update_rss_tv_last_search(self, rssid):
+        """
+        更新电视剧订阅的最后搜索时间
+        """
+        if not rssid:
+            return
+        self._db.query(RSSTVS).filter(RSSTVS.ID == int(rssid)).update(
+            {
+                "LAST_SEARCH": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+            })
+
     def is_sync_in_history(self, path, dest):
         """
         查询是否存在同步历史记录
@@ -0,0 +1,316 @@
+import json
+import os
+import pickle
+import threading
+import time
+
+import log
+from app.helper.db_helper import DbHelper
+from app.utils import ExceptionUtils, PathUtils, SystemUtils
+from app.utils.commons import singleton
+from config import Config
+
+lock = threading.RLock()
+
+
+@singleton
+class HardlinkHelper(object):
+    """
+    硬链接索引，记录下载目录、媒体库目录、同步目录中链接数大于1的文件的(st_dev, st_ino)与路径的对应关系，
+    启动时遍历根目录，修改时间未变化的目录直接使用保存在配置目录中的上次结果，之后由目录监控及文件转移结果增量更新
+    """
+    dbhelper = None
+    # 索引的根目录
+    _roots = []
+    # (st_dev, st_ino) -> 路径集合
+    _inode_paths = {}
+    # 路径 -> (st_dev, st_ino)
+    _path_inodes = {}
+    # 索引是否已建立完成
+    _ready = False
+    # 是否正在建立索引
+    _building = False
+    # 当前索引的批次，根目录变化时递增，旧的遍历线程结果作废
+    _build_seq = 0
+
+    def __init__(self):
+        self.init_config()
+
+    def init_config(self):
+        """
+        读取索引的根目录，根目录有变化时后台重建索引
+        """
+        self.dbhelper = DbHelper()
+        if os.name == "nt":
+            return
+        roots = self.__get_roots()
+        with lock:
+            # 根目录未变化时，已建立或正在建立的索引继续使用
+            if roots == self._roots and (self._ready or self._building):
+                return
+            self._roots = roots
+            self._inode_paths = {}
+            self._path_inodes = {}
+            self._ready = False
+            self._building = bool(roots)
+            self._build_seq += 1
+            build_seq = self._build_seq
+        if roots:
+            threading.Thread(target=self.__build_index, args=(roots, build_seq), daemon=True).start()
+
+    @staticmethod
+    def __get_index_file():
+        return os.path.join(Config().get_config_path(), "hardlinks.dat")
+
+    def __load_dirs(self):
+        """
+        读取上次保存的目录遍历结果：目录 -> (修改时间, 子目录名列表, [(文件名, st_dev, st_ino)])
+        """
+        index_file = self.__get_index_file()
+        if not os.path.exists(index_file):
+            return {}
+        try:
+            with open(index_file, 'rb') as f:
+                dirs = pickle.load(f)
+            return dirs if isinstance(dirs, dict) else {}
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return {}
+
+    def __save_dirs(self, dirs):
+        """
+        保存目录遍历结果，下次启动时修改时间未变化的目录不再重新遍历
+        """
+        index_file = self.__get_index_file()
+        try:
+            tmp_file = f"{index_file}.tmp"
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(dirs, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, index_file)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+
+    @staticmethod
+    def __scan_dir(path):
+        """
+        遍历单个目录，返回子目录名列表及链接数大于1的文件
+        """
+        subdirs = []
+        files = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    file_stat = entry.stat(follow_symlinks=False)
+                    if file_stat.st_nlink > 1:
+                        files.append((entry.name, file_stat.st_dev, file_stat.st_ino))
+        return subdirs, files
+
+    def __get_roots(self):
+        """
+        汇总下载目录、媒体库目录及目录同步的源和目的目录，去除嵌套的子目录
+        """
+        paths = []
+        media = Config().get_config('media') or {}
+        for key in ['movie_path', 'tv_path', 'anime_path', 'unknown_path']:
+            media_path = media.get(key)
+            if not media_path:
+                continue
+            if not isinstance(media_path, list):
+                media_path = [media_path]
+            paths += media_path
+        for sync_conf in self.dbhelper.get_config_sync_paths():
+            paths += [sync_conf.SOURCE, sync_conf.DEST, sync_conf.UNKNOWN]
+        for downloader_conf in self.dbhelper.get_downloaders():
+            try:
+                download_dirs = json.loads(downloader_conf.DOWNLOAD_DIR or "[]")
+            except Exception as err:
+                ExceptionUtils.exception_traceback(err)
+                continue
+            for attr in download_dirs:
+                paths.append(attr.get("container_path") or attr.get("save_path"))
+        roots = []
+        for path in sorted(set(os.path.normpath(path) for path in paths if path and os.path.isdir(path))):
+            if not any(PathUtils.is_path_in_path(root, path) for root in roots):
+                roots.append(path)
+        return roots
+
+    def __build_index(self, roots, build_seq):
+        """
+        遍历根目录建立索引，修改时间与上次保存一致的目录沿用保存的结果
+        """
+        try:
+            self.__build_dirs(roots, build_seq)
+        finally:
+            with lock:
+                if build_seq == self._build_seq:
+                    self._building = False
+
+    def __build_dirs(self, roots, build_seq):
+        start_time = time.time()
+        saved_dirs = self.__load_dirs()
+        dirs = {}
+        inode_paths = {}
+        path_inodes = {}
+        scan_count = 0
+        for root in roots:
+            log.info(f"【HardLink】开始建立硬链接索引：{root}")
+            stack = [root]
+            while stack:
+                if build_seq != self._build_seq:
+                    return
+                path = stack.pop()
+                try:
+                    mtime = os.stat(path, follow_symlinks=False).st_mtime_ns
+                    saved = saved_dirs.get(path)
+                    if saved and saved[0] == mtime:
+                        _, subdirs, files = saved
+                    else:
+                        subdirs, files = self.__scan_dir(path)
+                        scan_count += 1
+                except OSError as err:
+                    log.debug(f"【HardLink】目录无法访问：{err}")
+                    continue
+                dirs[path] = (mtime, subdirs, files)
+                stack.extend(os.path.join(path, name) for name in subdirs)
+                for name, st_dev, st_ino in files:
+                    file_path = os.path.join(path, name)
+                    inode_paths.setdefault((st_dev, st_ino), set()).add(file_path)
+                    path_inodes[file_path] = (st_dev, st_ino)
+        with lock:
+            if build_seq != self._build_seq:
+                return
+            # 遍历期间增量登记的文件合并进索引
+            for path, inode in self._path_inodes.items():
+                inode_paths.setdefault(inode, set()).add(path)
+                path_inodes[path] = inode
+            self._inode_paths = inode_paths
+            self._path_inodes = path_inodes
+            self._ready = True
+        self.__save_dirs(dirs)
+        log.info(f"【HardLink】硬链接索引建立完成，共 {len(path_inodes)} 个文件，"
+                 f"重新遍历 {scan_count}/{len(dirs)} 个目录，耗时 {round(time.time() - start_time)} 秒")
+
+    def __is_indexed_path(self, path):
+        """
+        判断路径是否在索引的根目录下
+        """
+        return any(PathUtils.is_path_in_path(root, path) for root in self._roots)
+
+    def __remove_path(self, path):
+        inode = self._path_inodes.pop(path, None)
+        if not inode:
+            return
+        paths = self._inode_paths.get(inode)
+        if paths:
+            paths.discard(path)
+            if not paths:
+                self._inode_paths.pop(inode, None)
+
+    def update_file(self, path):
+        """
+        登记新增或变化的文件，链接数为1的文件不登记
+        """
+        if os.name == "nt" or not path:
+            return
+        path = os.path.normpath(path)
+        try:
+            file_stat = os.stat(path, follow_symlinks=False)
+        except OSError:
+            self.remove_file(path)
+            return
+        with lock:
+            if not self.__is_indexed_path(path):
+                return
+            self.__remove_path(path)
+            if file_stat.st_nlink > 1:
+                inode = (file_stat.st_dev, file_stat.st_ino)
+                self._inode_paths.setdefault(inode, set()).add(path)
+                self._path_inodes[path] = inode
+
+    def remove_file(self, path):
+        """
+        删除文件的登记
+        """
+        if not path:
+            return
+        with lock:
+            self.__remove_path(os.path.normpath(path))
+
+    def move_file(self, src_path, dest_path):
+        """
+        文件移动后更新登记
+        """
+        self.remove_file(src_path)
+        self.update_file(dest_path)
+
+    def add_link(self, src_path, dest_path):
+        """
+        创建硬链接后同时登记源文件和链接文件
+        """
+        self.update_file(src_path)
+        self.update_file(dest_path)
+
+    def get_links(self, file):
+        """
+        查询文件在索引中的所有硬链接路径（不含自身），
+        索引未建立完成或链接数多于索引中的路径（如链接在索引根目录之外）时返回None
+        """
+        if not self._ready or not file:
+            return None
+        file = os.path.normpath(file)
+        try:
+            file_stat = os.stat(file)
+        except OSError:
+            return []
+        if file_stat.st_nlink <= 1:
+            return []
+        inode = (file_stat.st_dev, file_stat.st_ino)
+        with lock:
+            paths = set(self._inode_paths.get(inode) or [])
+        links = []
+        for path in paths:
+            if path == file:
+                continue
+            # 校验登记的路径是否仍然指向同一文件，已失效的移除
+            try:
+                link_stat = os.stat(path, follow_symlinks=False)
+                if (link_stat.st_dev, link_stat.st_ino) == inode:
+                    links.append(path)
+                    continue
+            except OSError:
+                pass
+            self.remove_file(path)
+        # 索引中的链接不完整，由调用方使用系统命令查找
+        if len(links) + 1 < file_stat.st_nlink:
+            return None
+        return sorted(links)
+
+    def find_hardlinks(self, file, fdir=None):
+        """
+        查找文件的所有硬链接，返回格式与SystemUtils.find_hardlinks一致，
+        查找目录为索引根目录的上级目录时只返回索引根目录中的结果，
+        查找目录与索引无关或索引未建立完成时使用系统命令查找
+        """
+        if not fdir:
+            fdir = os.path.dirname(file)
+        fdir = os.path.normpath(fdir)
+        if os.name == "nt" \
+                or not self._ready \
+                or not any(PathUtils.is_path_in_path(root, fdir)
+                           or PathUtils.is_path_in_path(fdir, root) for root in self._roots):
+            return SystemUtils().find_hardlinks(file=file, fdir=fdir)
+        links = self.get_links(file)
+        if links is None:
+            return SystemUtils().find_hardlinks(file=file, fdir=fdir)
+        ret_files = []
+        for link_file in links:
+            if not PathUtils.is_path_in_path(fdir, link_file):
+                continue
+            ret_files.append({
+                "file": link_file,
+                "filename": os.path.basename(link_file),
+                "filepath": os.path.dirname(link_file)
+            })
+        return ret_files
@@ -1,10 +1,12 @@
 import os
 import pickle
-import random
 import time
 from enum import Enum
 from threading import RLock
 
+from cachetools import LRUCache
+
+from app.db import MetaDb
 from app.utils import ExceptionUtils
 from app.utils.commons import singleton
 from config import Config
@@ -13,6 +15,10 @@ lock = RLock()
 
 CACHE_EXPIRE_TIMESTAMP_STR = "cache_expire_timestamp"
 EXPIRE_TIMESTAMP = 7 * 24 * 3600
+# 命中缓存时续期的最小间隔，避免每次命中都产生写入
+EXPIRE_REFRESH_INTERVAL = 24 * 3600
+# 内存中保留的缓存条目数
+META_MEMORY_SIZE = 10000
 
 
 @singleton
@@ -25,9 +31,12 @@ class MetaHelper(object):
         "type": MediaType
     }
     """
-    _meta_data = {}
+    # 已加载到内存的条目
+    _meta_data = None
+    # 待写入存储的新增或变更条目
+    _unsaved_data = {}
 
-    _meta_path = None
+    _meta_db = None
     _tmdb_cache_expire = False
 
     def __init__(self):
@@ -37,33 +46,34 @@ class MetaHelper(object):
         laboratory = Config().get_config('laboratory')
         if laboratory:
             self._tmdb_cache_expire = laboratory.get("tmdb_cache_expire")
-        self._meta_path = os.path.join(Config().get_config_path(), 'tmdb.dat')
-        self._meta_data = self.__load_meta_data(self._meta_path)
+        self._meta_db = MetaDb()
+        with lock:
+            self._meta_data = LRUCache(maxsize=META_MEMORY_SIZE)
+            self._unsaved_data = {}
+        self.__import_meta_data(os.path.join(Config().get_config_path(), 'tmdb.dat'))
 
     def clear_meta_data(self):
         """
         清空所有TMDB缓存
         """
         with lock:
-            self._meta_data = {}
-
-    def get_meta_data_path(self):
-        """
-        返回TMDB缓存文件路径
-        """
-        return self._meta_path
+            self._meta_data.clear()
+            self._unsaved_data = {}
+            self._meta_db.empty()
 
     def get_meta_data_by_key(self, key):
         """
         根据KEY值获取缓存值
         """
         with lock:
-            info: dict = self._meta_data.get(key)
+            info: dict = self.__get_meta_data(key)
             if info:
                 expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire or int(time.time()) < expire:
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                    self.update_meta_data({key: info})
+                now = int(time.time())
+                if not expire or now < expire:
+                    if not expire or expire - now < EXPIRE_TIMESTAMP - EXPIRE_REFRESH_INTERVAL:
+                        info[CACHE_EXPIRE_TIMESTAMP_STR] = now + EXPIRE_TIMESTAMP
+                        self.__set_meta_data(key, info)
                 elif expire and self._tmdb_cache_expire:
                     self.delete_meta_data(key)
             return info or {}
@@ -82,6 +92,8 @@ class MetaHelper(object):
             begin_pos = (page - 1) * num
 
         with lock:
+            self.save_meta_data()
+            total, metas = self._meta_db.search(search=search, offset=begin_pos, limit=num)
             search_metas = [(k, {
                 "id": v.get("id"),
                 "title": v.get("title"),
@@ -90,8 +102,8 @@ class MetaHelper(object):
                 "poster_path": v.get("poster_path"),
                 "backdrop_path": v.get("backdrop_path")
             },  str(k).replace("[电影]", "").replace("[电视剧]", "").replace("[未知]", "").replace("-None", ""))
-                for k, v in self._meta_data.items() if search.lower() in k.lower() and v.get("id") != 0]
-            return len(search_metas), search_metas[begin_pos: begin_pos + num]
+                for k, v in metas if v]
+            return total, search_metas
 
     def delete_meta_data(self, key):
         """
@@ -100,25 +112,30 @@ class MetaHelper(object):
         @return: 被删除的缓存内容
         """
         with lock:
-            return self._meta_data.pop(key, None)
+            info = self.__get_meta_data(key)
+            self._meta_data.pop(key, None)
+            self._unsaved_data.pop(key, None)
+            if info:
+                self._meta_db.delete(key)
+            return info
 
     def delete_meta_data_by_tmdbid(self, tmdbid):
         """
         清空对应TMDBID的所有缓存记录，以强制更新TMDB中最新的数据
         """
-        for key in list(self._meta_data):
-            if str(self._meta_data.get(key, {}).get("id")) == str(tmdbid):
-                with lock:
-                    self._meta_data.pop(key)
+        with lock:
+            for data in [self._meta_data, self._unsaved_data]:
+                for key in [k for k, v in data.items() if str(v.get("id")) == str(tmdbid)]:
+                    data.pop(key, None)
+            self._meta_db.delete_by_tmdbid(tmdbid)
 
     def delete_unknown_meta(self):
         """
-        清除未识别的缓存记录，以便重新搜索TMDB
+        清除未识别的缓存记录，以便重新搜索TMDB，未识别记录只存在于内存中
         """
-        for key in list(self._meta_data):
-            if str(self._meta_data.get(key, {}).get("id")) == '0':
-                with lock:
-                    self._meta_data.pop(key)
+        with lock:
+            for key in [k for k, v in self._meta_data.items() if str(v.get("id")) == '0']:
+                self._meta_data.pop(key, None)
 
     def modify_meta_data(self, key, title):
         """
@@ -128,25 +145,55 @@ class MetaHelper(object):
         @return: 被修改后缓存内容
         """
         with lock:
-            if self._meta_data.get(key):
-                self._meta_data[key]['title'] = title
-                self._meta_data[key][CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-            return self._meta_data.get(key)
+            info = self.__get_meta_data(key)
+            if info:
+                info['title'] = title
+                info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
+                self.__set_meta_data(key, info)
+            return info
 
-    @staticmethod
-    def __load_meta_data(path):
+    def __import_meta_data(self, path):
         """
-        从文件中加载缓存
+        从旧版本的tmdb.dat文件中导入缓存，导入后文件重命名为tmdb.dat.bak
         """
+        if not os.path.exists(path):
+            return
         try:
-            if os.path.exists(path):
-                with open(path, 'rb') as f:
-                    data = pickle.load(f)
-                return data
-            return {}
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+            meta_data = {}
+            for key, info in (data or {}).items():
+                if not info or str(info.get("id")) == '0':
+                    continue
+                if not info.get(CACHE_EXPIRE_TIMESTAMP_STR):
+                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
+                meta_data[key] = info
+            if self._meta_db.upsert(meta_data, CACHE_EXPIRE_TIMESTAMP_STR):
+                os.replace(path, f"{path}.bak")
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
-            return {}
+
+    def __get_meta_data(self, key):
+        """
+        按KEY获取缓存，内存中没有时从存储中加载
+        """
+        if not key:
+            return None
+        info = self._unsaved_data.get(key) or self._meta_data.get(key)
+        if info:
+            return info
+        info = self._meta_db.get(key)
+        if info:
+            self._meta_data[key] = info
+        return info
+
+    def __set_meta_data(self, key, info):
+        """
+        写入内存并标记待保存，未识别的条目不持久化
+        """
+        self._meta_data[key] = info
+        if str(info.get("id")) != '0':
+            self._unsaved_data[key] = info
 
     def update_meta_data(self, meta_data):
         """
@@ -156,65 +203,27 @@ class MetaHelper(object):
             return
         with lock:
             for key, item in meta_data.items():
-                if not self._meta_data.get(key):
+                if not self.__get_meta_data(key):
                     item[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                    self._meta_data[key] = item
+                    self.__set_meta_data(key, item)
 
-    def save_meta_data(self, force=False):
+    def save_meta_data(self):
         """
-        保存缓存数据到文件
+        将新增或变更的缓存条目写入存储，并清理过期条目
         """
-        meta_data = self.__load_meta_data(self._meta_path)
-        new_meta_data = {k: v for k, v in self._meta_data.items() if str(v.get("id")) != '0'}
-
-        if not force \
-                and not self._random_sample(new_meta_data) \
-                and meta_data.keys() == new_meta_data.keys():
-            return
-
-        with open(self._meta_path, 'wb') as f:
-            pickle.dump(new_meta_data, f, pickle.HIGHEST_PROTOCOL)
-
-    def _random_sample(self, new_meta_data):
-        """
-        采样分析是否需要保存
-        """
-        ret = False
-        if len(new_meta_data) < 25:
-            keys = list(new_meta_data.keys())
-            for k in keys:
-                info = new_meta_data.get(k)
-                expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire:
-                    ret = True
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                elif int(time.time()) >= expire:
-                    ret = True
-                    if self._tmdb_cache_expire:
-                        new_meta_data.pop(k)
-        else:
-            count = 0
-            keys = random.sample(new_meta_data.keys(), 25)
-            for k in keys:
-                info = new_meta_data.get(k)
-                expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire:
-                    ret = True
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                elif int(time.time()) >= expire:
-                    ret = True
-                    if self._tmdb_cache_expire:
-                        new_meta_data.pop(k)
-                        count += 1
-            if count >= 5:
-                ret |= self._random_sample(new_meta_data)
-        return ret
+        with lock:
+            if self._unsaved_data:
+                if self._meta_db.upsert(self._unsaved_data, CACHE_EXPIRE_TIMESTAMP_STR):
+                    self._unsaved_data = {}
+            if self._tmdb_cache_expire:
+                self._meta_db.delete_expired(int(time.time()))
 
     def get_cache_title(self, key):
         """
         获取缓存的标题
         """
-        cache_media_info = self._meta_data.get(key)
+        with lock:
+            cache_media_info = self.__get_meta_data(key)
         if not cache_media_info or not cache_media_info.get("id"):
             return None
         return cache_media_info.get("title")
@@ -223,7 +232,9 @@ class MetaHelper(object):
         """
         重新设置缓存标题
         """
-        cache_media_info = self._meta_data.get(key)
-        if not cache_media_info:
-            return
-        self._meta_data[key]['title'] = cn_title
+        with lock:
+            cache_media_info = self.__get_meta_data(key)
+            if not cache_media_info:
+                return
+            cache_media_info['title'] = cn_title
+            self.__set_meta_data(key, cache_media_info)
@@ -1,14 +1,55 @@
-import xml.dom.minidom
+import re
+from email.utils import parsedate_to_datetime
+from io import BytesIO
+
+from lxml import etree
 
 from app.db import MainDb, DbPersist
 from app.db.models import RSSTORRENTS
-from app.utils import RssTitleUtils, StringUtils, RequestUtils, ExceptionUtils, DomUtils
-from config import Config
+from app.utils import RssTitleUtils, StringUtils, RequestUtils, ExceptionUtils
+from config import Config, DB_IN_QUERY_SIZE
+
+# 需要对标题做特殊处理的站点
+RSS_SPECIAL_TITLE_SITES = {
+    'pt.keepfrds.com': RssTitleUtils.keepfriends_title
+}
+
+# RSS链接过期时站点返回的内容
+RSS_EXPIRED_MSG = [
+    "RSS 链接已过期, 您需要获得一个新的!",
+    "RSS Link has expired, You need to get a new one!"
+]
+
+_XML_DECLARATION_RE = re.compile(r"^\s*<\?xml[^>]*\?>")
+# 按限定名（含前缀）查找第一个子孙节点，与minidom的getElementsByTagName一致，默认命名空间下的节点同样匹配
+_FIRST_DESCENDANT_XPATH = etree.XPath("(descendant::*[name()=$name])[1]")
 
 
 class RssHelper:
     _db = MainDb()
 
+    @staticmethod
+    def get_rss_res(url, proxy=False, etag=None, last_modified=None, timeout=None):
+        """
+        下载RSS，传入上次的ETag/Last-Modified时发起条件请求，未变化时站点返回304
+        :param url: RSS地址
+        :param proxy: 是否使用代理
+        :param etag: 上次响应的ETag
+        :param last_modified: 上次响应的Last-Modified
+        :param timeout: 超时时间
+        :return: 响应对象
+        """
+        headers = {
+            "User-Agent": Config().get_ua()
+        }
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return RequestUtils(headers=headers,
+                            proxies=Config().get_proxies() if proxy else None,
+                            timeout=timeout).get_res(url)
+
     @staticmethod
     def parse_rssxml(url, proxy=False):
         """
@@ -17,100 +58,153 @@ class RssHelper:
         :param proxy: 是否使用代理
         :return: 种子信息列表，如为None代表Rss过期
         """
-        _special_title_sites = {
-            'pt.keepfrds.com': RssTitleUtils.keepfriends_title
-        }
-
-        _rss_expired_msg = [
-            "RSS 链接已过期, 您需要获得一个新的!",
-            "RSS Link has expired, You need to get a new one!"
-        ]
-
-        # 开始处理
-        ret_array = []
         if not url:
             return []
-        site_domain = StringUtils.get_url_domain(url)
         try:
-            ret = RequestUtils(proxies=Config().get_proxies() if proxy else None).get_res(url)
+            ret = RssHelper.get_rss_res(url, proxy=proxy)
             if not ret:
                 return []
             ret.encoding = ret.apparent_encoding
         except Exception as e2:
             ExceptionUtils.exception_traceback(e2)
             return []
-        if ret:
-            ret_xml = ret.text
-            try:
-                # 解析XML
-                dom_tree = xml.dom.minidom.parseString(ret_xml)
-                rootNode = dom_tree.documentElement
-                items = rootNode.getElementsByTagName("item")
-                for item in items:
-                    try:
-                        # 标题
-                        title = DomUtils.tag_value(item, "title", default="")
-                        if not title:
-                            continue
-                        # 标题特殊处理
-                        if site_domain and site_domain in _special_title_sites:
-                            title = _special_title_sites.get(site_domain)(title)
-                        # 描述
-                        description = DomUtils.tag_value(item, "description", default="")
-                        # 种子页面
-                        link = DomUtils.tag_value(item, "link", default="")
-                        # 种子链接
-                        enclosure = DomUtils.tag_value(item, "enclosure", "url", default="")
-                        if not enclosure and not link:
-                            continue
-                        # 部分RSS只有link没有enclosure
-                        if not enclosure and link:
-                            enclosure = link
-                            link = None
-                        # 大小
-                        size = DomUtils.tag_value(item, "enclosure", "length", default=0)
-                        if size and str(size).isdigit():
-                            size = int(size)
-                        else:
-                            size = 0
-                        # 发布日期
-                        pubdate = DomUtils.tag_value(item, "pubDate", default="")
-                        if pubdate:
-                            # 转换为时间
-                            pubdate = StringUtils.get_time_stamp(pubdate)
-                        # 返回对象
-                        tmp_dict = {'title': title,
-                                    'enclosure': enclosure,
-                                    'size': size,
-                                    'description': description,
-                                    'link': link,
-                                    'pubdate': pubdate}
-                        ret_array.append(tmp_dict)
-                    except Exception as e1:
-                        ExceptionUtils.exception_traceback(e1)
+        return RssHelper.parse_rss_content(url, ret.text)
+
+    @staticmethod
+    def parse_rss_content(url, ret_xml):
+        """
+        解析RSS内容，获取RSS中的种子信息
+        :param url: RSS地址
+        :param ret_xml: RSS内容
+        :return: 种子信息列表，如为None代表Rss过期
+        """
+        if not ret_xml:
+            return []
+        # RSS过期 观众RSS 链接已过期，您需要获得一个新的！  pthome RSS Link has expired, You need to get a new one!
+        if ret_xml.strip() in RSS_EXPIRED_MSG:
+            return None
+        return list(RssHelper.iter_rss_items(url, ret_xml))
+
+    @staticmethod
+    def iter_rss_items(url, ret_xml):
+        """
+        流式解析RSS内容，逐条返回种子信息，已处理的节点会被释放
+        :param url: RSS地址
+        :param ret_xml: RSS内容
+        :return: 种子信息生成器
+        """
+        if not ret_xml:
+            return
+        site_domain = StringUtils.get_url_domain(url)
+        title_handler = RSS_SPECIAL_TITLE_SITES.get(site_domain) if site_domain else None
+        if isinstance(ret_xml, str):
+            # 已解码的内容去掉XML声明中的编码后按UTF-8解析
+            ret_xml = _XML_DECLARATION_RE.sub("", ret_xml, count=1).encode("utf-8")
+        try:
+            # 不加载DTD、不解析实体、不访问网络，避免站点通过外部实体读取本地文件
+            for _, item in etree.iterparse(BytesIO(ret_xml),
+                                           events=("end",),
+                                           huge_tree=True,
+                                           load_dtd=False,
+                                           resolve_entities=False,
+                                           no_network=True):
+                if not isinstance(item.tag, str) \
+                        or item.prefix \
+                        or etree.QName(item).localname != "item":
+                    continue
+                try:
+                    # 标题
+                    title = RssHelper.__tag_value(item, "title", default="")
+                    if not title:
                         continue
-            except Exception as e2:
-                # RSS过期 观众RSS 链接已过期，您需要获得一个新的！  pthome RSS Link has expired, You need to get a new one!
-                if ret_xml in _rss_expired_msg:
-                    return None
-                ExceptionUtils.exception_traceback(e2)
-        return ret_array
+                    # 标题特殊处理
+                    if title_handler:
+                        title = title_handler(title)
+                    # 描述
+                    description = RssHelper.__tag_value(item, "description", default="")
+                    # 种子页面
+                    link = RssHelper.__tag_value(item, "link", default="")
+                    # 种子链接
+                    enclosure = RssHelper.__tag_value(item, "enclosure", "url", default="")
+                    if not enclosure and not link:
+                        continue
+                    # 部分RSS只有link没有enclosure
+                    if not enclosure and link:
+                        enclosure = link
+                        link = None
+                    # 大小
+                    size = RssHelper.__tag_value(item, "enclosure", "length", default=0)
+                    if size and str(size).isdigit():
+                        size = int(size)
+                    else:
+                        size = 0
+                    # 发布日期
+                    pubdate = RssHelper.__tag_value(item, "pubDate", default="")
+                    if pubdate:
+                        # 转换为时间
+                        pubdate = RssHelper.__parse_pubdate(pubdate)
+                    # 返回对象
+                    yield {'title': title,
+                           'enclosure': enclosure,
+                           'size': size,
+                           'description': description,
+                           'link': link,
+                           'pubdate': pubdate}
+                except Exception as e1:
+                    ExceptionUtils.exception_traceback(e1)
+                    continue
+                finally:
+                    # 释放已处理的节点
+                    item.clear()
+                    while item.getprevious() is not None:
+                        del item.getparent()[0]
+        except Exception as e2:
+            ExceptionUtils.exception_traceback(e2)
+
+    @staticmethod
+    def __parse_pubdate(pubdate):
+        """
+        解析发布时间，RSS中一般为RFC 822格式，优先用标准库解析，无时区等情况再使用通用解析
+        """
+        try:
+            date = parsedate_to_datetime(pubdate)
+            if date and date.tzinfo:
+                return date
+        except (TypeError, ValueError):
+            pass
+        return StringUtils.get_time_stamp(pubdate)
+
+    @staticmethod
+    def __tag_value(item, tag_name, attname="", default=None):
+        """
+        解析种子节点下第一个同名子孙节点的值或属性，与DomUtils.tag_value一致
+        """
+        tags = _FIRST_DESCENDANT_XPATH(item, name=tag_name)
+        if not tags:
+            return default
+        tag = tags[0]
+        if attname:
+            return tag.get(attname) or default
+        return tag.text or default
 
     @DbPersist(_db)
     def insert_rss_torrents(self, media_info):
         """
         将RSS的记录插入数据库
+        :param media_info: 单个媒体信息或媒体信息列表，列表在同一个事务中插入
         """
-        self._db.insert(
+        if not isinstance(media_info, list):
+            media_info = [media_info]
+        self._db.insert([
             RSSTORRENTS(
-                TORRENT_NAME=media_info.org_string,
-                ENCLOSURE=media_info.enclosure,
-                TYPE=media_info.type.value,
-                TITLE=media_info.title,
-                YEAR=media_info.year,
-                SEASON=media_info.get_season_string(),
-                EPISODE=media_info.get_episode_string()
-            ))
+                TORRENT_NAME=media.org_string,
+                ENCLOSURE=media.enclosure,
+                TYPE=media.type.value,
+                TITLE=media.title,
+                YEAR=media.year,
+                SEASON=media.get_season_string(),
+                EPISODE=media.get_episode_string()
+            ) for media in media_info])
 
     def is_rssd_by_enclosure(self, enclosure):
         """
@@ -123,6 +217,21 @@ class RssHelper:
         else:
             return False
 
+    def get_rssd_enclosures(self, enclosures):
+        """
+        批量查询RSS是否处理过，根据下载链接
+        :param enclosures: 下载链接列表
+        :return: 已处理过的下载链接集合
+        """
+        enclosures = list({enclosure for enclosure in enclosures or [] if enclosure})
+        rssd_enclosures = set()
+        for i in range(0, len(enclosures), DB_IN_QUERY_SIZE):
+            rssd_enclosures.update(
+                item.ENCLOSURE for item in self._db.query(RSSTORRENTS.ENCLOSURE).filter(
+                    RSSTORRENTS.ENCLOSURE.in_(enclosures[i:i + DB_IN_QUERY_SIZE])
+                ).all())
+        return rssd_enclosures
+
     def is_rssd_by_simple(self, torrent_name, enclosure):
         """
         查询RSS是否处理过，根据名称
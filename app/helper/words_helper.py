@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import regex as re
 import cn2an
 
@@ -6,11 +8,21 @@ from app.utils.commons import singleton
 from app.utils.exception_utils import ExceptionUtils
 
 
+@lru_cache(maxsize=1024)
+def _compile_word_re(pattern):
+    """
+    编译识别词中的正则，同一表达式只编译一次
+    """
+    return re.compile(r'%s' % pattern)
+
+
 @singleton
 class WordsHelper:
     dbhelper = None
     # 识别词
     words_info = []
+    # 识别词版本，识别词变化时递增，用于识别结果缓存失效
+    generation = 0
 
     def __init__(self):
         self.init_config()
@@ -18,6 +30,7 @@ class WordsHelper:
     def init_config(self):
         self.dbhelper = DbHelper()
         self.words_info = self.dbhelper.get_custom_words(enabled=1)
+        self.generation += 1
 
     def process(self, title):
         # 错误信息
@@ -93,10 +106,11 @@ class WordsHelper:
     @staticmethod
     def replace_regex(title, replaced, replace) -> (str, str, bool):
         try:
-            if not re.findall(r'%s' % replaced, title):
+            replaced_re = _compile_word_re(replaced)
+            if not replaced_re.findall(title):
                 return title, "", False
             else:
-                return re.sub(r'%s' % replaced, r'%s' % replace, title), "", True
+                return replaced_re.sub(r'%s' % replace, title), "", True
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
             return title, str(err), False
@@ -115,11 +129,11 @@ class WordsHelper:
     @staticmethod
     def episode_offset(title, front, back, offset) -> (str, str, bool):
         try:
-            if back and not re.findall(r'%s' % back, title):
+            if back and not _compile_word_re(back).findall(title):
                 return title, "", False
-            if front and not re.findall(r'%s' % front, title):
+            if front and not _compile_word_re(front).findall(title):
                 return title, "", False
-            offset_word_info_re = re.compile(r'(?<=%s.*?)[0-9一二三四五六七八九十]+(?=.*?%s)' % (front, back))
+            offset_word_info_re = _compile_word_re(r'(?<=%s.*?)[0-9一二三四五六七八九十]+(?=.*?%s)' % (front, back))
             episode_nums_str = re.findall(offset_word_info_re, title)
             if not episode_nums_str:
                 return title, "", False
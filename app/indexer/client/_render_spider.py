@@ -1,9 +1,7 @@
 # coding: utf-8
-import copy
 import time
 from urllib.parse import quote
 
-from pyquery import PyQuery
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as es
 from selenium.webdriver.support.wait import WebDriverWait
@@ -127,9 +125,7 @@ class RenderSpider(object):
         if not torrents_selector:
             return False, []
         # 解析HTML文本
-        html_doc = PyQuery(html_text)
-        for torn in html_doc(torrents_selector):
-            self.torrents_info_array.append(copy.deepcopy(self.torrentspider.Getinfo(PyQuery(torn))))
-            if len(self.torrents_info_array) >= int(self.result_num):
-                break
+        self.torrentspider.result_num = self.result_num
+        self.torrentspider.parse_html(html_text)
+        self.torrents_info_array = self.torrentspider.torrents_info_array
         return False, self.torrents_info_array
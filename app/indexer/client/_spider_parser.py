@@ -0,0 +1,418 @@
+import datetime
+import re
+import threading
+from copy import deepcopy
+
+from jinja2 import Template
+from lxml import etree
+from pyquery import PyQuery
+from pyquery.cssselectpatch import JQueryTranslator
+from pyquery.text import extract_text
+
+import log
+from app.utils import StringUtils
+from app.utils.exception_utils import ExceptionUtils
+
+
+class SpiderSelector(object):
+    """
+    预编译的单个字段选择器，与PyQuery按CSS选择的结果一致
+    """
+    # 与PyQuery相同的CSS转XPath规则
+    _translator = JQueryTranslator(xhtml=False)
+
+    def __init__(self, selector, css=None):
+        """
+        :param selector: 字段配置
+        :param css: CSS选择器，为空时取配置中的selector
+        """
+        self.selector = selector or {}
+        self.attribute = self.selector.get('attribute')
+        self.filters = SpiderFilters(self.selector.get('filters'))
+        self._xpath = self.__compile(self.selector.get('selector', '') if css is None else css)
+        # 需移除的元素，选择时先复制元素再移除
+        self._removes = [self.__compile(v) for v in self.selector.get('remove', '').split(', ')] \
+            if "remove" in self.selector else []
+
+    @classmethod
+    def __compile(cls, css):
+        """
+        CSS选择器编译为XPath，编译失败时在选择时抛出异常，与原逐行解析的出错处理一致
+        """
+        if not css:
+            return None
+        try:
+            return etree.XPath(cls._translator.css_to_xpath(css.replace('[@', '['),
+                                                            prefix='descendant-or-self::'))
+        except Exception as err:
+            return err
+
+    @staticmethod
+    def __evaluate(xpath, element):
+        if xpath is None:
+            return []
+        if isinstance(xpath, Exception):
+            raise xpath
+        return xpath(element)
+
+    def exists(self, torrent):
+        """
+        是否存在匹配元素
+        """
+        return len(self.__evaluate(self._xpath, torrent)) > 0
+
+    def select(self, torrent):
+        """
+        选择元素，配置了remove时返回移除后的元素副本
+        """
+        elements = self.__evaluate(self._xpath, torrent)
+        if not elements or not self._removes:
+            return elements
+        elements = [deepcopy(element) for element in elements]
+        for xpath in self._removes:
+            removes = []
+            for element in elements:
+                removes.extend(self.__evaluate(xpath, element))
+            PyQuery(removes).remove()
+        return elements
+
+    def items(self, elements, source=None):
+        """
+        取元素属性或文本
+        :param source: 按该选择器配置的attribute取值，为空时使用自身配置
+        """
+        if not elements:
+            return []
+        attribute = (source or self).attribute
+        if attribute:
+            return [element.get(attribute) for element in elements]
+        return [PyQuery(element).html() if element.tag == 'textarea' else extract_text(element)
+                for element in elements]
+
+    def index(self, items):
+        """
+        按contents、index配置取值
+        """
+        if not items:
+            return items
+        if "contents" in self.selector \
+                and len(items) > int(self.selector.get("contents")):
+            items = items[0].split("\n")[self.selector.get("contents")]
+        elif "index" in self.selector \
+                and len(items) > int(self.selector.get("index")):
+            items = items[int(self.selector.get("index"))]
+        elif isinstance(items, list):
+            items = items[0]
+        return items
+
+    def value(self, torrent, source=None):
+        """
+        选择元素并取值
+        """
+        return self.index(self.items(self.select(torrent), source))
+
+
+class SpiderFilters(object):
+    """
+    预编译的字段过滤规则
+    """
+
+    def __init__(self, filters):
+        self._filters = []
+        if not filters or not isinstance(filters, list):
+            return
+        for filter_item in filters:
+            method_name = filter_item.get("name")
+            args = filter_item.get("args")
+            pattern = None
+            if method_name == "re_search" and isinstance(args, list):
+                try:
+                    pattern = re.compile(r"%s" % args[0])
+                except Exception:
+                    # 正则有误时在处理时报错
+                    pass
+            self._filters.append((method_name, args, pattern))
+
+    def apply(self, text):
+        """
+        对文本进行处理
+        """
+        if not text or not self._filters:
+            return text
+        if not isinstance(text, str):
+            text = str(text)
+        for method_name, args, pattern in self._filters:
+            if not text:
+                break
+            try:
+                if method_name == "re_search" and isinstance(args, list):
+                    text = (pattern or re.compile(r"%s" % args[0])).search(text).group(args[-1])
+                elif method_name == "split" and isinstance(args, list):
+                    text = text.split(r"%s" % args[0])[args[-1]]
+                elif method_name == "replace" and isinstance(args, list):
+                    text = text.replace(r"%s" % args[0], r"%s" % args[-1])
+                elif method_name == "dateparse" and isinstance(args, str):
+                    text = datetime.datetime.strptime(text, r"%s" % args)
+                elif method_name == "strip":
+                    text = text.strip()
+                elif method_name == "appendleft":
+                    text = f"{args}{text}"
+            except Exception as err:
+                ExceptionUtils.exception_traceback(err)
+        return text.strip()
+
+
+class SpiderParser(object):
+    """
+    按站点种子列表及字段配置预编译的页面解析器，按索引器ID缓存
+    """
+    # 已编译的解析器
+    _parsers = {}
+    _parsers_lock = threading.Lock()
+
+    def __init__(self, torrents_list, fields):
+        self.torrents_list = torrents_list or {}
+        self.fields = fields or {}
+        self._list = SpiderSelector(None, css=self.torrents_list.get('selector', ''))
+        self._selectors = {}
+        self._templates = {}
+        self._steps = []
+        self.__compile()
+
+    @classmethod
+    def get_parser(cls, indexerid, torrents_list, fields):
+        """
+        获取索引器的解析器，站点配置变化时重新编译
+        :param indexerid: 索引器ID
+        :param torrents_list: 种子列表配置
+        :param fields: 种子字段配置
+        """
+        with cls._parsers_lock:
+            parser = cls._parsers.get(indexerid)
+            if not parser \
+                    or parser.torrents_list != (torrents_list or {}) \
+                    or parser.fields != (fields or {}):
+                parser = cls(torrents_list, fields)
+                cls._parsers[indexerid] = parser
+            return parser
+
+    def __selector(self, name, css=None):
+        """
+        编译字段选择器
+        """
+        if name not in self._selectors:
+            self._selectors[name] = SpiderSelector(self.fields.get(name, {}), css=css)
+        return self._selectors[name]
+
+    def __template(self, name):
+        """
+        编译字段模板
+        """
+        if name not in self._templates:
+            self._templates[name] = Template(self.fields.get(name, {}).get('text'))
+        return self._templates[name]
+
+    def __compile(self):
+        """
+        按原字段顺序生成解析步骤，未配置的字段不解析
+        """
+        fields = self.fields
+        if 'title' in fields:
+            selector = fields.get('title', {})
+            self.__selector('title')
+            if 'selector' not in selector and 'text' in selector:
+                self.__template('title')
+                for name in ['title_default', 'title_optional']:
+                    if name in fields:
+                        self.__selector(name)
+            self._steps.append(self.__get_title)
+        if 'description' in fields:
+            selector = fields.get('description', {})
+            self.__selector('description', css=selector.get('selector', selector.get('selectors', '')))
+            if "selector" not in selector and "selectors" not in selector and "text" in selector:
+                self.__template('description')
+                for name in ['tags', 'subject', 'description_free_forever', 'description_normal']:
+                    if name in fields:
+                        self.__selector(name)
+            self._steps.append(self.__get_description)
+        for name, step in [('details', self.__get_details),
+                           ('download', self.__get_download),
+                           ('grabs', self.__get_grabs),
+                           ('leechers', self.__get_leechers),
+                           ('seeders', self.__get_seeders),
+                           ('size', self.__get_size),
+                           ('imdbid', self.__get_imdbid)]:
+            if name in fields:
+                selector = fields.get(name, {})
+                # 字段中仅大小兼容selectors配置
+                css = selector.get('selector', selector.get("selectors", '')) if name == 'size' else None
+                self.__selector(name, css=css)
+                self._steps.append(step)
+        for name, step in [('downloadvolumefactor', self.__get_downloadvolumefactor),
+                           ('uploadvolumefactor', self.__get_uploadvolumefactor)]:
+            selector = fields.get(name, {})
+            if not selector:
+                continue
+            if 'case' in selector:
+                self._selectors[name] = [(SpiderSelector(None, css=case), value)
+                                         for case, value in selector.get('case', {}).items()]
+            else:
+                self.__selector(name)
+            self._steps.append(step)
+        for name, step in [('date_added', self.__get_pubdate),
+                           ('date_elapsed', self.__get_elapsed_date),
+                           ('labels', self.__get_labels)]:
+            if name in fields:
+                self.__selector(name)
+                self._steps.append(step)
+
+    def parse(self, html_text, indexerid=None, indexername=None, domain=None, result_num=100):
+        """
+        解析站点页面文本
+        :param html_text: 页面文本
+        :param indexerid: 索引器ID
+        :param indexername: 索引器名称，用于日志
+        :param domain: 站点域名，用于补全链接
+        :param result_num: 最多解析条数
+        :return: 种子信息列表
+        """
+        torrents = []
+        for root in PyQuery(html_text):
+            for torrent in self._list.select(root):
+                torrents.append(self.parse_torrent(torrent, indexerid, indexername, domain))
+                if len(torrents) >= int(result_num):
+                    return torrents
+        return torrents
+
+    def parse_torrent(self, torrent, indexerid=None, indexername=None, domain=None):
+        """
+        解析单条种子数据
+        """
+        torrent_info = {'indexer': indexerid}
+        try:
+            for step in self._steps:
+                step(torrent, torrent_info, domain)
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            log.error("【Spider】%s 搜索出现错误：%s" % (indexername, str(err)))
+        return torrent_info
+
+    def __get_title(self, torrent, torrent_info, domain):
+        selector = self._selectors['title']
+        if 'selector' in selector.selector:
+            torrent_info['title'] = selector.value(torrent)
+        elif 'text' in selector.selector:
+            render_dict = {}
+            if 'title_default' in self._selectors:
+                # 标题默认值按title字段的配置取属性或文本
+                render_dict['title_default'] = self._selectors['title_default'].value(torrent, source=selector)
+            if 'title_optional' in self._selectors:
+                render_dict['title_optional'] = self._selectors['title_optional'].value(torrent)
+            torrent_info['title'] = self._templates['title'].render(fields=render_dict)
+        torrent_info['title'] = selector.filters.apply(torrent_info.get('title'))
+
+    def __get_description(self, torrent, torrent_info, domain):
+        selector = self._selectors['description']
+        if "selector" in selector.selector \
+                or "selectors" in selector.selector:
+            elements = selector.select(torrent)
+            if elements:
+                torrent_info['description'] = selector.index(selector.items(elements))
+        elif "text" in selector.selector:
+            render_dict = {}
+            for name in ['tags', 'subject', 'description_free_forever', 'description_normal']:
+                if name in self._selectors:
+                    render_dict[name] = self._selectors[name].value(torrent)
+            torrent_info['description'] = self._templates['description'].render(fields=render_dict)
+        torrent_info['description'] = selector.filters.apply(torrent_info.get('description'))
+
+    def __get_details(self, torrent, torrent_info, domain):
+        selector = self._selectors['details']
+        detail_link = selector.filters.apply(selector.value(torrent))
+        if detail_link:
+            if not detail_link.startswith("http"):
+                if detail_link.startswith("//"):
+                    torrent_info['page_url'] = domain.split(":")[0] + ":" + detail_link
+                elif detail_link.startswith("/"):
+                    torrent_info['page_url'] = domain + detail_link[1:]
+                else:
+                    torrent_info['page_url'] = domain + detail_link
+            else:
+                torrent_info['page_url'] = detail_link
+
+    def __get_download(self, torrent, torrent_info, domain):
+        selector = self._selectors['download']
+        download_link = selector.filters.apply(selector.value(torrent))
+        if download_link:
+            if not download_link.startswith("http") and not download_link.startswith("magnet"):
+                torrent_info['enclosure'] = domain + download_link[1:] if download_link.startswith(
+                    "/") else domain + download_link
+            else:
+                torrent_info['enclosure'] = download_link
+
+    def __get_imdbid(self, torrent, torrent_info, domain):
+        selector = self._selectors['imdbid']
+        torrent_info['imdbid'] = selector.value(torrent)
+        torrent_info['imdbid'] = selector.filters.apply(torrent_info.get('imdbid'))
+
+    def __get_size(self, torrent, torrent_info, domain):
+        selector = self._selectors['size']
+        item = selector.value(torrent)
+        if item:
+            torrent_info['size'] = StringUtils.num_filesize(item.replace("\n", "").strip())
+            torrent_info['size'] = selector.filters.apply(torrent_info.get('size'))
+            torrent_info['size'] = StringUtils.num_filesize(torrent_info.get('size'))
+
+    def __get_peers(self, name, torrent, torrent_info, key):
+        selector = self._selectors[name]
+        item = selector.value(torrent)
+        if item:
+            torrent_info[key] = item.split("/")[0]
+            torrent_info[key] = selector.filters.apply(torrent_info.get(key))
+        else:
+            torrent_info[key] = 0
+
+    def __get_leechers(self, torrent, torrent_info, domain):
+        self.__get_peers('leechers', torrent, torrent_info, 'peers')
+
+    def __get_seeders(self, torrent, torrent_info, domain):
+        self.__get_peers('seeders', torrent, torrent_info, 'seeders')
+
+    def __get_grabs(self, torrent, torrent_info, domain):
+        self.__get_peers('grabs', torrent, torrent_info, 'grabs')
+
+    def __get_pubdate(self, torrent, torrent_info, domain):
+        selector = self._selectors['date_added']
+        torrent_info['pubdate'] = selector.value(torrent)
+        torrent_info['pubdate'] = selector.filters.apply(torrent_info.get('pubdate'))
+
+    def __get_elapsed_date(self, torrent, torrent_info, domain):
+        selector = self._selectors['date_elapsed']
+        torrent_info['date_elapsed'] = selector.value(torrent)
+        torrent_info['date_elapsed'] = selector.filters.apply(torrent_info.get('date_elapsed'))
+
+    def __get_volumefactor(self, name, torrent, torrent_info):
+        torrent_info[name] = 1
+        selector = self._selectors[name]
+        if isinstance(selector, list):
+            for case, value in selector:
+                if case.exists(torrent):
+                    torrent_info[name] = value
+                    break
+        elif "selector" in selector.selector:
+            item = selector.value(torrent)
+            if item:
+                volumefactor = re.search(r'(\d+\.?\d*)', item)
+                if volumefactor:
+                    torrent_info[name] = int(volumefactor.group(1))
+
+    def __get_downloadvolumefactor(self, torrent, torrent_info, domain):
+        self.__get_volumefactor('downloadvolumefactor', torrent, torrent_info)
+
+    def __get_uploadvolumefactor(self, torrent, torrent_info, domain):
+        self.__get_volumefactor('uploadvolumefactor', torrent, torrent_info)
+
+    def __get_labels(self, torrent, torrent_info, domain):
+        items = self._selectors['labels'].items(self._selectors['labels'].select(torrent))
+        if items:
+            torrent_info['labels'] = "|".join(items)
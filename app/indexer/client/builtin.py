@@ -1,6 +1,5 @@
 import copy
 import datetime
-import time
 
 import log
 from app.conf import SystemConfig
@@ -12,6 +11,7 @@ from app.indexer.client._tnode import TNodeSpider
 from app.indexer.client._mt_spider import MTSpider
 from app.indexer.client._torrentleech import TorrentLeech
 from app.indexer.client._plugins import PluginsSpider
+from app.indexer.search_cache import SearchCache
 from app.sites import Sites
 from app.utils import StringUtils
 from app.utils.types import SearchType, IndexerType, ProgressKey, SystemConfigKey
@@ -35,6 +35,7 @@ class BuiltinIndexer(_IIndexClient):
     user = None
     chromehelper = None
     systemconfig = None
+    searchcache = None
 
     def __init__(self, config=None):
         super().__init__()
@@ -48,6 +49,7 @@ class BuiltinIndexer(_IIndexClient):
         self.user = ProUser()
         self.chromehelper = ChromeHelper()
         self.systemconfig = SystemConfig()
+        self.searchcache = SearchCache()
         self._show_more_sites = Config().get_config("laboratory").get('show_more_sites')
 
     @classmethod
@@ -150,10 +152,6 @@ class BuiltinIndexer(_IIndexClient):
         """
         if not indexer or not key_word:
             return None
-        # 站点流控
-        if self.sites.check_ratelimit(indexer.siteid):
-            self.progress.update(ptype=ProgressKey.Search, text=f"{indexer.name} 触发站点流控，跳过 ...")
-            return []
         # fix 共用同一个dict时会导致某个站点的更新全局全效
         if filter_args is None:
             _filter_args = {}
@@ -177,38 +175,48 @@ class BuiltinIndexer(_IIndexClient):
         if indexer.language == "en" and StringUtils.is_chinese(search_word):
             log.warn(f"【{self.client_name}】{indexer.name} 无法使用中文名搜索")
             return []
-        # 开始索引
-        result_array = []
-        try:
-            if 'm-team' in indexer.domain:
-                error_flag, result_array = MTSpider(indexer).search(keyword=search_word)
-            elif indexer.parser == "TNodeSpider":
-                error_flag, result_array = TNodeSpider(indexer).search(keyword=search_word)
-            elif indexer.parser == "RenderSpider":
-                error_flag, result_array = RenderSpider(indexer).search(
-                    keyword=search_word,
-                    mtype=match_media.type if match_media and match_media.tmdb_info else None)
-            elif indexer.parser == "TorrentLeech":
-                error_flag, result_array = TorrentLeech(indexer).search(keyword=search_word)
-            else:
-                if PluginsSpider().status(indexer=indexer):
-                    error_flag, result_array = PluginsSpider().search(keyword=search_word, indexer=indexer)
+        mtype = match_media.type if match_media and match_media.tmdb_info else None
+        # 有效期内的相同搜索直接使用缓存的站点结果，不再请求站点
+        result_array = self.searchcache.get(indexer, search_word, mtype=mtype)
+        if result_array is not None:
+            log.info(f"【{self.client_name}】{indexer.name} 使用缓存的搜索结果")
+        else:
+            # 站点流控
+            if self.sites.check_ratelimit(indexer.siteid):
+                self.progress.update(ptype=ProgressKey.Search, text=f"{indexer.name} 触发站点流控，跳过 ...")
+                return []
+            # 开始索引
+            result_array = []
+            try:
+                if 'm-team' in indexer.domain:
+                    error_flag, result_array = MTSpider(indexer).search(keyword=search_word)
+                elif indexer.parser == "TNodeSpider":
+                    error_flag, result_array = TNodeSpider(indexer).search(keyword=search_word)
+                elif indexer.parser == "RenderSpider":
+                    error_flag, result_array = RenderSpider(indexer).search(keyword=search_word, mtype=mtype)
+                elif indexer.parser == "TorrentLeech":
+                    error_flag, result_array = TorrentLeech(indexer).search(keyword=search_word)
                 else:
-                    error_flag, result_array = self.__spider_search(
-                        keyword=search_word,
-                        indexer=indexer,
-                        mtype=match_media.type if match_media and match_media.tmdb_info else None)
-        except Exception as err:
-            error_flag = True
-            print(str(err))
+                    if PluginsSpider().status(indexer=indexer):
+                        error_flag, result_array = PluginsSpider().search(keyword=search_word, indexer=indexer)
+                    else:
+                        error_flag, result_array = self.__spider_search(keyword=search_word,
+                                                                        indexer=indexer,
+                                                                        mtype=mtype)
+            except Exception as err:
+                error_flag = True
+                print(str(err))
 
-        # 索引花费的时间
-        seconds = round((datetime.datetime.now() - start_time).seconds, 1)
-        # 索引统计
-        self.dbhelper.insert_indexer_statistics(indexer=indexer.name,
-                                                itype=self.client_id,
-                                                seconds=seconds,
-                                                result='N' if error_flag else 'Y')
+            # 索引花费的时间
+            seconds = round((datetime.datetime.now() - start_time).seconds, 1)
+            # 索引统计
+            self.dbhelper.insert_indexer_statistics(indexer=indexer.name,
+                                                    itype=self.client_id,
+                                                    seconds=seconds,
+                                                    result='N' if error_flag else 'Y')
+            # 出错时不缓存，下次重新请求站点
+            if not error_flag:
+                self.searchcache.set(indexer, search_word, result_array, mtype=mtype)
         # 返回结果
         if len(result_array) == 0:
             log.warn(f"【{self.client_name}】{indexer.name} 未搜索到数据")
@@ -287,19 +295,7 @@ class BuiltinIndexer(_IIndexClient):
                         keyword=keyword,
                         page=page,
                         mtype=mtype)
-        spider.start()
-        # 循环判断是否获取到数据
-        sleep_count = 0
-        while not spider.is_complete:
-            sleep_count += 1
-            time.sleep(1)
-            if sleep_count > timeout:
-                break
-        # 是否发生错误
-        result_flag = spider.is_error
-        # 种子列表
-        result_array = spider.torrents_info_array.copy()
-        # 重置状态
-        spider.torrents_info_array.clear()
+        # 在当前搜索线程中直接请求并解析，无需启动爬虫线程轮询等待
+        result_flag, result_array = spider.fetch(timeout=timeout)
 
         return result_flag, result_array
@@ -1,13 +1,59 @@
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 
 import log
 from app.helper import ProgressHelper, SubmoduleHelper, DbHelper
+from app.indexer.search_cache import SearchCache
 from app.utils import ExceptionUtils, StringUtils
 from app.utils.commons import singleton
 from app.utils.types import SearchType, IndexerType, ProgressKey
 from app.sites import Sites
-from config import Config
+from config import Config, SEARCH_MAX_WORKERS, SEARCH_SITE_CONCURRENCY, SEARCH_TIMEOUT
+
+# 所有搜索共用的线程池
+_search_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="IndexerSearch")
+# 每个站点正在进行的搜索数，及并发数已满时排队中的搜索，排队的搜索不占用线程池
+_site_running = {}
+_site_waiting = {}
+_site_lock = threading.Lock()
+
+
+def _submit_site_search(site_id, future, func, *args):
+    """
+    提交站点搜索，同一站点同时进行的搜索数不超过SEARCH_SITE_CONCURRENCY，
+    已满时排队，由该站点正在执行搜索的线程完成后接着执行
+    :param future: 搜索结果，取消后不再执行
+    """
+    with _site_lock:
+        running = _site_running.get(site_id, 0)
+        if running >= SEARCH_SITE_CONCURRENCY:
+            _site_waiting.setdefault(site_id, deque()).append((future, func, args))
+            return
+        _site_running[site_id] = running + 1
+    _search_executor.submit(_run_site_search, site_id, future, func, args)
+
+
+def _run_site_search(site_id, future, func, args):
+    """
+    执行站点搜索，完成后继续执行该站点排队中的搜索，没有排队的搜索时释放并发数
+    """
+    while True:
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+        with _site_lock:
+            waiting = _site_waiting.get(site_id)
+            if not waiting:
+                _site_waiting.pop(site_id, None)
+                _site_running[site_id] -= 1
+                return
+            future, func, args = waiting.popleft()
+
 
 @singleton
 class Indexer(object):
@@ -126,7 +172,8 @@ class Indexer(object):
                           key_word: [str, list],
                           filter_args: dict,
                           match_media=None,
-                          in_from: SearchType = None):
+                          in_from: SearchType = None,
+                          callback=None):
         """
         根据关键字调用 Index API 搜索
         :param key_word: 搜索的关键字，不能为空
@@ -135,10 +182,33 @@ class Indexer(object):
                             sp_state: 为UL DL，* 代表不关心，
         :param match_media: 需要匹配的媒体信息
         :param in_from: 搜索渠道
+        :param callback: 每个站点搜索完成时的回调，参数为站点和该站点过滤后的结果
         :return: 命中的资源媒体信息列表
         """
+        ret_array = []
+        for indexer, result in self.iter_search_by_keyword(key_word=key_word,
+                                                           filter_args=filter_args,
+                                                           match_media=match_media,
+                                                           in_from=in_from):
+            ret_array.extend(result)
+            if callback:
+                try:
+                    callback(indexer, result)
+                except Exception as e:
+                    ExceptionUtils.exception_traceback(e)
+        return ret_array
+
+    def iter_search_by_keyword(self,
+                               key_word: [str, list],
+                               filter_args: dict,
+                               match_media=None,
+                               in_from: SearchType = None):
+        """
+        根据关键字并行搜索所有站点，每个站点搜索完成即返回 (站点, 过滤后的结果)，
+        超过SEARCH_TIMEOUT仍未返回的站点不再等待
+        """
         if not key_word:
-            return []
+            return
 
         indexers = self.get_indexers(check=True)
         """
@@ -153,51 +223,90 @@ class Indexer(object):
         # FIXME: 需要根据filters里site是否None，如果不为None，需要找出指定的indexer进行搜索匹配 @hsuyelin@163.com
         if not indexers:
             log.error("没有配置索引器，无法搜索！")
-            return []
+            return
         # 计算耗时
         start_time = datetime.datetime.now()
+        deadline = time.time() + SEARCH_TIMEOUT
         if filter_args and filter_args.get("site"):
             log.info(f"【{self._client_type.value}】开始搜索 %s，站点：%s ..." % (key_word, filter_args.get("site")))
             self.progress.update(ptype=ProgressKey.Search,
                                  text="开始搜索 %s，站点：%s ..." % (key_word, filter_args.get("site")))
         else:
-            log.info(f"【{self._client_type.value}】开始并行搜索 %s，线程数：%s ..." % (key_word, len(indexers)))
+            log.info(f"【{self._client_type.value}】开始并行搜索 %s，站点数：%s ..." % (key_word, len(indexers)))
             self.progress.update(ptype=ProgressKey.Search,
-                                 text="开始并行搜索 %s，线程数：%s ..." % (key_word, len(indexers)))
-        # 多线程
-        executor = ThreadPoolExecutor(max_workers=len(indexers))
-        all_task = []
+                                 text="开始并行搜索 %s，站点数：%s ..." % (key_word, len(indexers)))
+        # 按站点排队后提交到全局共用的线程池
+        all_task = {}
         for index in indexers:
             order_seq = 100 - int(index.pri)
-            task = executor.submit(self._client.search,
-                                   order_seq,
-                                   index,
+            task = Future()
+            all_task[task] = index
+            _submit_site_search(index.id,
+                                task,
+                                self.__search_indexer,
+                                deadline,
+                                order_seq,
+                                index,
+                                key_word,
+                                filter_args,
+                                match_media,
+                                in_from)
+        result_count = 0
+        finish_count = 0
+        try:
+            for future in as_completed(all_task, timeout=max(deadline - time.time(), 0)):
+                finish_count += 1
+                self.progress.update(ptype=ProgressKey.Search,
+                                     value=round(100 * (finish_count / len(all_task))))
+                try:
+                    result = future.result()
+                except Exception as e:
+                    ExceptionUtils.exception_traceback(e)
+                    continue
+                if result:
+                    result_count += len(result)
+                    yield all_task[future], result
+        except FuturesTimeoutError:
+            timeout_sites = [all_task[task].name for task in all_task if not task.done()]
+            log.warn(f"【{self._client_type.value}】搜索超过 {SEARCH_TIMEOUT} 秒，"
+                     f"不再等待以下站点：{'、'.join(timeout_sites)}")
+        finally:
+            # 超时或调用方不再读取结果时，取消尚未开始的站点搜索
+            for task in all_task:
+                task.cancel()
+            # 计算耗时，调用方提前结束读取时同样输出
+            end_time = datetime.datetime.now()
+            log.info(f"【{self._client_type.value}】所有站点搜索完成，有效资源数：%s，总耗时 %s 秒"
+                     % (result_count, (end_time - start_time).seconds))
+            self.progress.update(ptype=ProgressKey.Search,
+                                 text="所有站点搜索完成，有效资源数：%s，总耗时 %s 秒"
+                                      % (result_count, (end_time - start_time).seconds),
+                                 value=100)
+
+    def __search_indexer(self, deadline, order_seq, indexer, key_word, filter_args, match_media, in_from):
+        """
+        搜索单个站点
+        """
+        # 排队时已超时的不再搜索
+        if time.time() >= deadline:
+            log.warn(f"【{self._client_type.value}】{indexer.name} 排队等待超时，不再搜索")
+            return []
+        return self._client.search(order_seq,
+                                   indexer,
                                    key_word,
                                    filter_args,
                                    match_media,
                                    in_from)
-            all_task.append(task)
-        ret_array = []
-        finish_count = 0
-        for future in as_completed(all_task):
-            result = future.result()
-            finish_count += 1
-            self.progress.update(ptype=ProgressKey.Search,
-                                 value=round(100 * (finish_count / len(all_task))))
-            if result:
-                ret_array = ret_array + result
-        # 计算耗时
-        end_time = datetime.datetime.now()
-        log.info(f"【{self._client_type.value}】所有站点搜索完成，有效资源数：%s，总耗时 %s 秒"
-                 % (len(ret_array), (end_time - start_time).seconds))
-        self.progress.update(ptype=ProgressKey.Search,
-                             text="所有站点搜索完成，有效资源数：%s，总耗时 %s 秒"
-                                  % (len(ret_array), (end_time - start_time).seconds),
-                             value=100)
-        return ret_array
 
     def get_indexer_statistics(self):
         """
         获取索引器统计信息
         """
         return self.dbhelper.get_indexer_statistics()
+
+    @staticmethod
+    def get_search_cache_stats():
+        """
+        获取各索引器搜索结果缓存的命中统计
+        """
+        return SearchCache().get_stats()
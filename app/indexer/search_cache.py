@@ -0,0 +1,76 @@
+import re
+import threading
+
+from cachetools import TTLCache
+
+from app.utils.commons import singleton
+from config import SEARCH_CACHE_TTL, SEARCH_CACHE_SIZE
+
+lock = threading.Lock()
+
+
+@singleton
+class SearchCache(object):
+    """
+    站点搜索结果缓存，按索引器、关键字、页码、媒体类型缓存站点返回的未过滤结果，
+    不同的过滤条件共用同一份站点结果
+    """
+    _results = None
+    # 索引器名称 -> [命中数, 未命中数]
+    _stats = {}
+
+    def __init__(self):
+        self.init_config()
+
+    def init_config(self):
+        with lock:
+            self._results = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+            self._stats = {}
+
+    @staticmethod
+    def __get_key(indexer, keyword, page=None, mtype=None):
+        """
+        缓存键，关键字忽略大小写及多余空格
+        """
+        keyword = re.sub(r"\s+", " ", str(keyword or "")).strip().lower()
+        return indexer.id, keyword, int(page or 0), mtype.value if mtype else None
+
+    def get(self, indexer, keyword, page=None, mtype=None):
+        """
+        查询缓存的站点结果
+        :return: 站点结果列表，未命中时返回None
+        """
+        key = self.__get_key(indexer, keyword, page, mtype)
+        with lock:
+            result_array = self._results.get(key)
+            stat = self._stats.setdefault(indexer.name, [0, 0])
+            if result_array is None:
+                stat[1] += 1
+                return None
+            stat[0] += 1
+        # 过滤时不修改结果，只复制列表
+        return list(result_array)
+
+    def set(self, indexer, keyword, result_array, page=None, mtype=None):
+        """
+        缓存站点结果
+        """
+        key = self.__get_key(indexer, keyword, page, mtype)
+        with lock:
+            self._results[key] = list(result_array or [])
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with lock:
+            self._results.clear()
+
+    def get_stats(self):
+        """
+        各索引器的缓存命中统计
+        :return: {索引器名称: {"hits": 命中数, "misses": 未命中数}}
+        """
+        with lock:
+            return {name: {"hits": hits, "misses": misses}
+                    for name, (hits, misses) in self._stats.items()}
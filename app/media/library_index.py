@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+
+from cachetools import LRUCache
+
+from app.media.meta import MetaInfo, get_meta_generation
+from app.utils import PathUtils
+from app.utils.commons import singleton
+from config import LIBRARY_INDEX_MAX_DIRS, LIBRARY_INDEX_CHECK_INTERVAL
+
+lock = threading.RLock()
+
+
+class LibraryDir(object):
+    """
+    媒体库中一个目录的缓存内容
+    """
+    __slots__ = ("mtime_ns", "checked_at", "files", "dirs", "episodes")
+
+    def __init__(self, mtime_ns, files, dirs):
+        self.mtime_ns = mtime_ns
+        self.checked_at = time.time()
+        # 文件名集合，目录不存在时为None
+        self.files = files
+        # 子目录名集合
+        self.dirs = dirs
+        # 文件名 -> (识别配置版本, (名称, 季列表, 集列表))
+        self.episodes = {}
+
+
+@singleton
+class LibraryIndex(object):
+    """
+    媒体库目录索引，按需缓存媒体库中各目录的文件列表及剧集文件的识别结果，
+    查询时通过目录的修改时间判断缓存是否失效，文件转移及目录监控时主动失效
+    """
+    _dirs = None
+
+    def __init__(self):
+        self.init_config()
+
+    def init_config(self):
+        with lock:
+            self._dirs = LRUCache(maxsize=LIBRARY_INDEX_MAX_DIRS)
+
+    def __get_dir(self, path):
+        """
+        获取目录的缓存内容，目录修改时间变化时重新读取
+        """
+        path = os.path.normpath(path)
+        with lock:
+            lib_dir = self._dirs.get(path)
+        now = time.time()
+        if lib_dir and now - lib_dir.checked_at < LIBRARY_INDEX_CHECK_INTERVAL:
+            return lib_dir
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if lib_dir and lib_dir.mtime_ns == mtime_ns:
+            lib_dir.checked_at = now
+            return lib_dir
+        files, dirs = None, None
+        if mtime_ns is not None:
+            files, dirs = set(), set()
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            # 与os.walk一致，不进入链接的目录
+                            if not entry.is_symlink():
+                                dirs.add(entry.name)
+                        else:
+                            files.add(entry.name)
+            except OSError:
+                files, dirs = None, None
+        lib_dir = LibraryDir(mtime_ns=mtime_ns, files=files, dirs=dirs)
+        with lock:
+            self._dirs[path] = lib_dir
+        return lib_dir
+
+    def invalidate(self, path):
+        """
+        使路径及其所有上级目录的缓存失效
+        """
+        if not path:
+            return
+        path = os.path.normpath(path)
+        with lock:
+            while True:
+                self._dirs.pop(path, None)
+                parent = os.path.dirname(path)
+                if not parent or parent == path:
+                    break
+                path = parent
+
+    def is_dir_exists(self, path):
+        """
+        判断目录是否存在
+        """
+        return self.__get_dir(path).files is not None
+
+    def get_exists_file(self, file_path, exts):
+        """
+        查询不带后缀的文件路径在任一后缀下是否存在，存在时返回带后缀的文件路径
+        """
+        lib_dir = self.__get_dir(os.path.dirname(file_path))
+        if not lib_dir.files:
+            return None
+        file_name = os.path.basename(file_path)
+        for ext in exts:
+            if f"{file_name}{ext}" in lib_dir.files:
+                return f"{file_path}{ext}"
+        return None
+
+    def __iter_dir_files(self, in_path, exts):
+        """
+        从缓存的目录内容中逐个返回目录下（含子目录）指定后缀的文件，规则与PathUtils.iter_dir_files一致，
+        每个目录按各自的修改时间判断是否需要重新读取
+        :return: (所在目录的缓存内容, 文件路径)
+        """
+        if not in_path:
+            return
+        in_path = os.path.normpath(in_path)
+        # 根目录本身不能处理时，其下所有文件都不能处理
+        if PathUtils.is_invalid_path(os.path.join(in_path, "")):
+            return
+        stack = [in_path]
+        while stack:
+            path = stack.pop()
+            lib_dir = self.__get_dir(path)
+            if lib_dir.files is None:
+                continue
+            for file in sorted(lib_dir.files):
+                if exts and os.path.splitext(file)[-1].lower() not in exts:
+                    continue
+                file_path = os.path.join(path, file)
+                if PathUtils.is_invalid_path(file_path):
+                    continue
+                yield lib_dir, file_path
+            stack += [os.path.join(path, sub_dir) for sub_dir in sorted(lib_dir.dirs, reverse=True)
+                      if not PathUtils.is_invalid_path(os.path.join(path, sub_dir, ""))]
+
+    def get_dir_files(self, in_path, exts):
+        """
+        获得目录下（含子目录）指定后缀的文件列表，使用缓存的目录内容
+        """
+        return [file_path for _, file_path in self.__iter_dir_files(in_path, exts)]
+
+    def get_exists_episodes(self, season_dir, title, season, exts):
+        """
+        查询季目录下已存在的集，目录内容及文件的识别结果按目录缓存，识别配置变化后重新识别
+        :param season_dir: 季目录
+        :param title: 媒体名称，与文件识别出的名称一致才计入
+        :param season: 季号
+        :param exts: 媒体文件后缀
+        :return: 已存在的集号集合
+        """
+        exists_episodes = set()
+        seasons = set(season) if isinstance(season, list) else {int(season)}
+        generation = get_meta_generation()
+        for lib_dir, file in self.__iter_dir_files(season_dir, exts):
+            file_name = os.path.basename(file)
+            with lock:
+                cached = lib_dir.episodes.get(file_name)
+            if cached and cached[0] == generation:
+                episode_info = cached[1]
+            else:
+                file_meta_info = MetaInfo(file_name, filePath=file)
+                episode_info = (file_meta_info.get_name(),
+                                file_meta_info.get_season_list(),
+                                file_meta_info.get_episode_list())
+                with lock:
+                    lib_dir.episodes[file_name] = (generation, episode_info)
+            name, season_list, episode_list = episode_info
+            if not season_list or not episode_list:
+                continue
+            if name != title:
+                continue
+            if not seasons.issubset(season_list):
+                continue
+            exists_episodes.update(episode_list)
+        return exists_episodes
@@ -2,7 +2,10 @@ import difflib
 import os
 import random
 import re
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from functools import lru_cache
 
 import zhconv
@@ -16,7 +19,7 @@ from app.media.tmdbv3api import TMDb, Search, Movie, TV, Person, Find, TMDbExcep
 from app.utils import PathUtils, EpisodeFormat, RequestUtils, NumberUtils, StringUtils, cacheman
 from app.utils.types import MediaType, MatchMode
 from config import Config, KEYWORD_BLACKLIST, KEYWORD_SEARCH_WEIGHT_3, KEYWORD_SEARCH_WEIGHT_2, KEYWORD_SEARCH_WEIGHT_1, \
-    KEYWORD_STR_SIMILARITY_THRESHOLD, KEYWORD_DIFF_SCORE_THRESHOLD
+    KEYWORD_STR_SIMILARITY_THRESHOLD, KEYWORD_DIFF_SCORE_THRESHOLD, TMDB_BATCH_WORKERS
 
 
 class Media:
@@ -100,17 +103,14 @@ class Media:
         else:
             self._rmt_match_mode = MatchMode.NORMAL
 
-    def __set_language(self, language):
+    def __language(self, language):
         """
-        设置语言
+        在当前线程内临时使用指定语言查询TMDB，退出时恢复，为空时使用全局语言
         :param language: zh/en
         """
         if not self.tmdb:
-            return
-        if language:
-            self.tmdb.language = language
-        else:
-            self.tmdb.language = self._default_language
+            return nullcontext()
+        return self.tmdb.thread_language(language)
 
     @staticmethod
     def __compare_tmdb_names(file_name, tmdb_names):
@@ -249,7 +249,7 @@ class Media:
         except Exception as e:
             log.error(f"【Meta】连接TMDB出错：{str(e)}")
             return None
-        log.debug(f"【Meta】API返回：{str(self.search.total_results)}")
+        log.debug(f"【Meta】API返回：{str(movies.total_results)}")
         if len(movies) == 0:
             log.debug(f"【Meta】{file_media_name} 未找到相关电影信息!")
             return {}
@@ -308,7 +308,7 @@ class Media:
         except Exception as e:
             log.error(f"【Meta】连接TMDB出错：{str(e)}")
             return None
-        log.debug(f"【Meta】API返回：{str(self.search.total_results)}")
+        log.debug(f"【Meta】API返回：{str(tvs.total_results)}")
         if len(tvs) == 0:
             log.debug(f"【Meta】{file_media_name} 未找到相关剧集信息!")
             return {}
@@ -407,14 +407,14 @@ class Media:
         :return: 匹配的媒体信息
         """
         try:
-            multis = self.search.multi({"query": file_media_name}) or []
+            multis = self.search.multi({"query": file_media_name})
         except TMDbException as err:
             log.error(f"【Meta】连接TMDB出错：{str(err)}")
             return None
         except Exception as e:
             log.error(f"【Meta】连接TMDB出错：{str(e)}")
             return None
-        log.debug(f"【Meta】API返回：{str(self.search.total_results)}")
+        log.debug(f"【Meta】API返回：{str(multis.total_results)}")
         if len(multis) == 0:
             log.debug(f"【Meta】{file_media_name} 未找到相关媒体息!")
             return {}
@@ -581,23 +581,23 @@ class Media:
             log.error("【Meta】TMDB API Key 未设置！")
             return None
         # 设置语言
-        self.__set_language(language)
-        if mtype == MediaType.MOVIE:
-            tmdb_info = self.__get_tmdb_movie_detail(tmdbid, append_to_response)
-            if tmdb_info:
-                tmdb_info['media_type'] = MediaType.MOVIE
-        else:
-            tmdb_info = self.__get_tmdb_tv_detail(tmdbid, append_to_response)
+        with self.__language(language):
+            if mtype == MediaType.MOVIE:
+                tmdb_info = self.__get_tmdb_movie_detail(tmdbid, append_to_response)
+                if tmdb_info:
+                    tmdb_info['media_type'] = MediaType.MOVIE
+            else:
+                tmdb_info = self.__get_tmdb_tv_detail(tmdbid, append_to_response)
+                if tmdb_info:
+                    tmdb_info['media_type'] = MediaType.TV
             if tmdb_info:
-                tmdb_info['media_type'] = MediaType.TV
-        if tmdb_info:
-            # 转换genreid
-            tmdb_info['genre_ids'] = self.__get_genre_ids_from_detail(tmdb_info.get('genres'))
-            # 转换中文标题
-            if chinese:
-                tmdb_info = self.__update_tmdbinfo_cn_title(tmdb_info)
+                # 转换genreid
+                tmdb_info['genre_ids'] = self.__get_genre_ids_from_detail(tmdb_info.get('genres'))
+                # 转换中文标题
+                if chinese:
+                    tmdb_info = self.__update_tmdbinfo_cn_title(tmdb_info)
 
-        return tmdb_info
+            return tmdb_info
 
     def __update_tmdbinfo_cn_title(self, tmdb_info):
         """
@@ -627,22 +627,22 @@ class Media:
         if not title:
             return []
         # 设置语言
-        self.__set_language(language)
-        if not mtype and not year:
-            results = self.__search_multi_tmdbinfos(title)
-        else:
-            if not mtype:
-                results = list(
-                    set(self.__search_movie_tmdbinfos(title, year)).union(set(self.__search_tv_tmdbinfos(title, year))))
-                # 组合结果的情况下要排序
-                results = sorted(results,
-                                 key=lambda x: x.get("release_date") or x.get("first_air_date") or "0000-00-00",
-                                 reverse=True)
-            elif mtype == MediaType.MOVIE:
-                results = self.__search_movie_tmdbinfos(title, year)
+        with self.__language(language):
+            if not mtype and not year:
+                results = self.__search_multi_tmdbinfos(title)
             else:
-                results = self.__search_tv_tmdbinfos(title, year)
-        return results[(page - 1) * 20:page * 20]
+                if not mtype:
+                    results = list(
+                        set(self.__search_movie_tmdbinfos(title, year)).union(set(self.__search_tv_tmdbinfos(title, year))))
+                    # 组合结果的情况下要排序
+                    results = sorted(results,
+                                     key=lambda x: x.get("release_date") or x.get("first_air_date") or "0000-00-00",
+                                     reverse=True)
+                elif mtype == MediaType.MOVIE:
+                    results = self.__search_movie_tmdbinfos(title, year)
+                else:
+                    results = self.__search_tv_tmdbinfos(title, year)
+            return results[(page - 1) * 20:page * 20]
 
     def __search_multi_tmdbinfos(self, title):
         """
@@ -735,98 +735,98 @@ class Media:
         if not title:
             return None
         # 设置语言
-        self.__set_language(language)
-        # 识别
-        meta_info = MetaInfo(title, subtitle=subtitle)
-        if not meta_info.get_name() or not meta_info.type:
-            log.warn("【Rmt】%s 未识别出有效信息！" % meta_info.org_string)
-            return None
-        if mtype:
-            meta_info.type = mtype
-        media_key = self.__make_cache_key(meta_info)
-        if not cache or not self.meta.get_meta_data_by_key(media_key):
-            # 缓存没有或者强制不使用缓存
-            if meta_info.type != MediaType.TV and not meta_info.year:
-                file_media_info = self.__search_multi_tmdb(file_media_name=meta_info.get_name())
-            else:
-                if meta_info.type == MediaType.TV:
-                    # 确定是电视
-                    file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                         first_media_year=meta_info.year,
-                                                         search_type=meta_info.type,
-                                                         media_year=meta_info.year,
-                                                         season_number=meta_info.begin_season
-                                                         )
-                    if not file_media_info and meta_info.year and self._rmt_match_mode == MatchMode.NORMAL and not strict:
-                        # 非严格模式下去掉年份再查一次
-                        file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                             search_type=meta_info.type
-                                                             )
+        with self.__language(language):
+            # 识别
+            meta_info = MetaInfo(title, subtitle=subtitle)
+            if not meta_info.get_name() or not meta_info.type:
+                log.warn("【Rmt】%s 未识别出有效信息！" % meta_info.org_string)
+                return None
+            if mtype:
+                meta_info.type = mtype
+            media_key = self.__make_cache_key(meta_info)
+            if not cache or not self.meta.get_meta_data_by_key(media_key):
+                # 缓存没有或者强制不使用缓存
+                if meta_info.type != MediaType.TV and not meta_info.year:
+                    file_media_info = self.__search_multi_tmdb(file_media_name=meta_info.get_name())
                 else:
-                    # 有年份先按电影查
-                    file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                         first_media_year=meta_info.year,
-                                                         search_type=MediaType.MOVIE
-                                                         )
-                    # 没有再按电视剧查
-                    if not file_media_info:
+                    if meta_info.type == MediaType.TV:
+                        # 确定是电视
                         file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
                                                              first_media_year=meta_info.year,
-                                                             search_type=MediaType.TV
+                                                             search_type=meta_info.type,
+                                                             media_year=meta_info.year,
+                                                             season_number=meta_info.begin_season
                                                              )
-                    if not file_media_info and self._rmt_match_mode == MatchMode.NORMAL and not strict:
-                        # 非严格模式下去掉年份和类型再查一次
-                        file_media_info = self.__search_multi_tmdb(file_media_name=meta_info.get_name())
-            if not file_media_info and self._search_tmdbweb:
-                # 从网站查询
-                file_media_info = self.__search_tmdb_web(file_media_name=meta_info.get_name(),
-                                                         mtype=meta_info.type)
-            if not file_media_info and self._chatgpt_enable:
-                # 通过ChatGPT查询
-                mtype, seaons, episodes, file_media_info = self.__search_chatgpt(file_name=title,
-                                                                                 mtype=meta_info.type)
-                # 修正类型和集数
-                meta_info.type = mtype
-                if not meta_info.get_season_string():
-                    meta_info.set_season(seaons)
-                if not meta_info.get_episode_string():
-                    meta_info.set_episode(episodes)
-            if not file_media_info and self._search_keyword:
-                # 关键字猜测
-                cache_name = cacheman["tmdb_supply"].get(meta_info.get_name())
-                is_movie = False
-                if not cache_name:
-                    cache_name, is_movie = self.__search_engine(meta_info.get_name())
-                    cacheman["tmdb_supply"].set(meta_info.get_name(), cache_name)
-                if cache_name:
-                    log.info("【Meta】开始辅助查询：%s ..." % cache_name)
-                    if is_movie:
-                        file_media_info = self.__search_tmdb(file_media_name=cache_name, search_type=MediaType.MOVIE)
+                        if not file_media_info and meta_info.year and self._rmt_match_mode == MatchMode.NORMAL and not strict:
+                            # 非严格模式下去掉年份再查一次
+                            file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                                 search_type=meta_info.type
+                                                                 )
                     else:
-                        file_media_info = self.__search_multi_tmdb(file_media_name=cache_name)
-            # 补充全量信息
-            if file_media_info and not file_media_info.get("genres"):
-                file_media_info = self.get_tmdb_info(mtype=file_media_info.get("media_type"),
-                                                     tmdbid=file_media_info.get("id"),
-                                                     chinese=chinese,
-                                                     append_to_response=append_to_response)
-            # 保存到缓存
-            if file_media_info is not None:
-                self.__insert_media_cache(media_key=media_key,
-                                          file_media_info=file_media_info)
-        else:
-            # 使用缓存信息
-            cache_info = self.meta.get_meta_data_by_key(media_key)
-            if cache_info.get("id"):
-                file_media_info = self.get_tmdb_info(mtype=cache_info.get("type"),
-                                                     tmdbid=cache_info.get("id"),
-                                                     chinese=chinese,
-                                                     append_to_response=append_to_response)
+                        # 有年份先按电影查
+                        file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                             first_media_year=meta_info.year,
+                                                             search_type=MediaType.MOVIE
+                                                             )
+                        # 没有再按电视剧查
+                        if not file_media_info:
+                            file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                                 first_media_year=meta_info.year,
+                                                                 search_type=MediaType.TV
+                                                                 )
+                        if not file_media_info and self._rmt_match_mode == MatchMode.NORMAL and not strict:
+                            # 非严格模式下去掉年份和类型再查一次
+                            file_media_info = self.__search_multi_tmdb(file_media_name=meta_info.get_name())
+                if not file_media_info and self._search_tmdbweb:
+                    # 从网站查询
+                    file_media_info = self.__search_tmdb_web(file_media_name=meta_info.get_name(),
+                                                             mtype=meta_info.type)
+                if not file_media_info and self._chatgpt_enable:
+                    # 通过ChatGPT查询
+                    mtype, seaons, episodes, file_media_info = self.__search_chatgpt(file_name=title,
+                                                                                     mtype=meta_info.type)
+                    # 修正类型和集数
+                    meta_info.type = mtype
+                    if not meta_info.get_season_string():
+                        meta_info.set_season(seaons)
+                    if not meta_info.get_episode_string():
+                        meta_info.set_episode(episodes)
+                if not file_media_info and self._search_keyword:
+                    # 关键字猜测
+                    cache_name = cacheman["tmdb_supply"].get(meta_info.get_name())
+                    is_movie = False
+                    if not cache_name:
+                        cache_name, is_movie = self.__search_engine(meta_info.get_name())
+                        cacheman["tmdb_supply"].set(meta_info.get_name(), cache_name)
+                    if cache_name:
+                        log.info("【Meta】开始辅助查询：%s ..." % cache_name)
+                        if is_movie:
+                            file_media_info = self.__search_tmdb(file_media_name=cache_name, search_type=MediaType.MOVIE)
+                        else:
+                            file_media_info = self.__search_multi_tmdb(file_media_name=cache_name)
+                # 补充全量信息
+                if file_media_info and not file_media_info.get("genres"):
+                    file_media_info = self.get_tmdb_info(mtype=file_media_info.get("media_type"),
+                                                         tmdbid=file_media_info.get("id"),
+                                                         chinese=chinese,
+                                                         append_to_response=append_to_response)
+                # 保存到缓存
+                if file_media_info is not None:
+                    self.__insert_media_cache(media_key=media_key,
+                                              file_media_info=file_media_info)
             else:
-                file_media_info = None
-        # 赋值TMDB信息并返回
-        meta_info.set_tmdb_info(file_media_info)
-        return meta_info
+                # 使用缓存信息
+                cache_info = self.meta.get_meta_data_by_key(media_key)
+                if cache_info.get("id"):
+                    file_media_info = self.get_tmdb_info(mtype=cache_info.get("type"),
+                                                         tmdbid=cache_info.get("id"),
+                                                         chinese=chinese,
+                                                         append_to_response=append_to_response)
+                else:
+                    file_media_info = None
+            # 赋值TMDB信息并返回
+            meta_info.set_tmdb_info(file_media_info)
+            return meta_info
 
     def __insert_media_cache(self, media_key, file_media_info):
         """
@@ -863,7 +863,8 @@ class Media:
                                 episode_format: EpisodeFormat = None,
                                 language=None,
                                 chinese=True,
-                                append_to_response=None):
+                                append_to_response=None,
+                                max_workers=TMDB_BATCH_WORKERS):
         """
         根据文件清单，搜刮TMDB信息，用于文件名称的识别
         :param file_list: 文件清单，如果是列表也可以是单个文件，也可以是一个目录
@@ -874,6 +875,7 @@ class Media:
         :param language: 语言
         :param chinese: 原标题为英文时是否从别名中搜索中文名称
         :param append_to_response: 附加信息
+        :param max_workers: 并发查询TMDB的线程数，同一缓存key的文件只会查询一次
         :return: 带有TMDB信息的每个文件对应的MetaInfo对象字典
         """
         # 存储文件路径与媒体的对应关系
@@ -881,139 +883,203 @@ class Media:
             log.error("【Meta】TMDB API Key 未设置！")
             return {}
         # 设置语言
-        self.__set_language(language)
-        # 返回结果
-        return_media_infos = {}
-        # 不是list的转为list
-        if not isinstance(file_list, list):
-            file_list = [file_list]
-        # 遍历每个文件，看得出来的名称是不是不一样，不一样的先搜索媒体信息
-        for file_path in file_list:
-            try:
-                if not os.path.exists(file_path):
-                    log.warn("【Meta】%s 不存在" % file_path)
-                    continue
-                # 解析媒体名称
-                # 先用自己的名称
-                file_name = os.path.basename(file_path)
-                parent_name = os.path.basename(os.path.dirname(file_path))
-                parent_parent_name = os.path.basename(PathUtils.get_parent_paths(file_path, 2))
-                # 过滤掉蓝光原盘目录下的子文件
-                if not os.path.isdir(file_path) \
-                        and PathUtils.get_bluray_dir(file_path):
-                    log.info("【Meta】%s 跳过蓝光原盘文件：" % file_path)
-                    continue
-                # 没有自带TMDB信息
-                if not tmdb_info:
-                    # 识别名称
-                    meta_info = MetaInfo(title=file_name, filePath=file_path)
-                    # 识别不到则使用上级的名称
-                    if not meta_info.get_name() or not meta_info.year:
-                        parent_info = MetaInfo(parent_name)
-                        if not parent_info.get_name() or not parent_info.year:
-                            parent_parent_info = MetaInfo(parent_parent_name)
-                            parent_info.type = parent_parent_info.type if parent_parent_info.type and parent_info.type != MediaType.TV else parent_info.type
-                            parent_info.cn_name = parent_parent_info.cn_name if parent_parent_info.cn_name else parent_info.cn_name
-                            parent_info.en_name = parent_parent_info.en_name if parent_parent_info.en_name else parent_info.en_name
-                            parent_info.year = parent_parent_info.year if parent_parent_info.year else parent_info.year
-                            parent_info.begin_season = NumberUtils.max_ele(parent_info.begin_season,
-                                                                           parent_parent_info.begin_season)
-                        if not meta_info.get_name():
-                            meta_info.cn_name = parent_info.cn_name
-                            meta_info.en_name = parent_info.en_name
-                        if not meta_info.year:
-                            meta_info.year = parent_info.year
-                        if parent_info.type and parent_info.type == MediaType.TV \
-                                and meta_info.type != MediaType.TV:
-                            meta_info.type = parent_info.type
-                        if meta_info.type == MediaType.TV:
-                            meta_info.begin_season = NumberUtils.max_ele(parent_info.begin_season,
-                                                                         meta_info.begin_season)
-                    if not meta_info.get_name() or not meta_info.type:
-                        log.warn("【Rmt】%s 未识别出有效信息！" % meta_info.org_string)
+        with self.__language(language):
+            # 返回结果
+            return_media_infos = {}
+            # 不是list的转为list
+            if not isinstance(file_list, list):
+                file_list = [file_list]
+            # 按缓存key分组的待识别文件
+            media_groups = {}
+            # 遍历每个文件，看得出来的名称是不是不一样，不一样的先搜索媒体信息
+            for file_path in file_list:
+                try:
+                    if not os.path.exists(file_path):
+                        log.warn("【Meta】%s 不存在" % file_path)
                         continue
-                    # 区配缓存及TMDB
-                    media_key = self.__make_cache_key(meta_info)
-                    if not self.meta.get_meta_data_by_key(media_key):
-                        # 没有缓存数据
-                        file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                             first_media_year=meta_info.year,
-                                                             search_type=meta_info.type,
-                                                             media_year=meta_info.year,
-                                                             season_number=meta_info.begin_season)
-                        if not file_media_info:
-                            if self._rmt_match_mode == MatchMode.NORMAL:
-                                # 去掉年份再查一次，有可能是年份错误
-                                file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                                     search_type=meta_info.type)
-                        if not file_media_info and self._chatgpt_enable:
-                            # 从ChatGPT查询
-                            mtype, seaons, episodes, file_media_info = self.__search_chatgpt(file_name=file_path,
-                                                                                             mtype=meta_info.type)
-                            # 修正类型和集数
-                            meta_info.type = mtype
-                            if not meta_info.get_season_string():
-                                meta_info.set_season(seaons)
-                            if not meta_info.get_episode_string():
-                                meta_info.set_episode(episodes)
-                        if not file_media_info and self._search_keyword:
-                            cache_name = cacheman["tmdb_supply"].get(meta_info.get_name())
-                            is_movie = False
-                            if not cache_name:
-                                cache_name, is_movie = self.__search_engine(meta_info.get_name())
-                                cacheman["tmdb_supply"].set(meta_info.get_name(), cache_name)
-                            if cache_name:
-                                log.info("【Meta】开始辅助查询：%s ..." % cache_name)
-                                if is_movie:
-                                    file_media_info = self.__search_tmdb(file_media_name=cache_name,
-                                                                         search_type=MediaType.MOVIE)
-                                else:
-                                    file_media_info = self.__search_multi_tmdb(file_media_name=cache_name)
-                        # 补全TMDB信息
-                        if file_media_info and not file_media_info.get("genres"):
-                            file_media_info = self.get_tmdb_info(mtype=file_media_info.get("media_type"),
-                                                                 tmdbid=file_media_info.get("id"),
-                                                                 chinese=chinese,
-                                                                 append_to_response=append_to_response)
-                        # 保存到缓存
-                        if file_media_info is not None:
-                            self.__insert_media_cache(media_key=media_key,
-                                                      file_media_info=file_media_info)
+                    # 解析媒体名称
+                    # 先用自己的名称
+                    file_name = os.path.basename(file_path)
+                    # 过滤掉蓝光原盘目录下的子文件
+                    if not os.path.isdir(file_path) \
+                            and PathUtils.get_bluray_dir(file_path):
+                        log.info("【Meta】%s 跳过蓝光原盘文件：" % file_path)
+                        continue
+                    # 没有自带TMDB信息
+                    if not tmdb_info:
+                        # 识别名称
+                        meta_info = self.__get_file_meta_info(file_path)
+                        if not meta_info.get_name() or not meta_info.type:
+                            log.warn("【Rmt】%s 未识别出有效信息！" % meta_info.org_string)
+                            continue
+                        # 先占位保持返回顺序，识别完成后赋值
+                        return_media_infos[file_path] = meta_info
+                        media_groups.setdefault(self.__make_cache_key(meta_info), []).append((file_path, meta_info))
+                    # 自带TMDB信息
                     else:
-                        # 使用缓存信息
-                        cache_info = self.meta.get_meta_data_by_key(media_key)
-                        if cache_info.get("id"):
-                            file_media_info = self.get_tmdb_info(mtype=cache_info.get("type"),
-                                                                 tmdbid=cache_info.get("id"),
-                                                                 chinese=chinese,
-                                                                 append_to_response=append_to_response)
-                        else:
-                            # 缓存为未识别
-                            file_media_info = None
+                        meta_info = MetaInfo(title=file_name, mtype=media_type, filePath=file_path)
+                        meta_info.set_tmdb_info(tmdb_info)
+                        if season and meta_info.type != MediaType.MOVIE:
+                            meta_info.begin_season = int(season)
+                        if episode_format:
+                            begin_ep, end_ep, part = episode_format.split_episode(file_name)
+                            if begin_ep is not None:
+                                meta_info.begin_episode = begin_ep
+                                meta_info.part = part
+                            if end_ep is not None:
+                                meta_info.end_episode = end_ep
+                        # 加入缓存
+                        self.save_rename_cache(file_name, tmdb_info)
+                        # 按文件路程存储
+                        return_media_infos[file_path] = meta_info
+                except Exception as err:
+                    print(str(err))
+                    log.error("【Rmt】发生错误：%s - %s" % (str(err), traceback.format_exc()))
+            if not media_groups:
+                return return_media_infos
+            # 区配缓存及TMDB，不同缓存key的文件并发查询，同一key内的文件按顺序处理，首个文件查询后其余文件命中缓存
+            start_time = time.time()
+            failed_files = []
+            if max_workers and max_workers > 1 and len(media_groups) > 1:
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(media_groups))) as executor:
+                    for failed in executor.map(lambda group: self.__set_files_tmdb_info(group,
+                                                                                        language,
+                                                                                        chinese,
+                                                                                        append_to_response),
+                                               media_groups.values()):
+                        failed_files.extend(failed)
+            else:
+                for group in media_groups.values():
+                    failed_files.extend(self.__set_files_tmdb_info(group, language, chinese, append_to_response))
+            for file_path in failed_files:
+                return_media_infos.pop(file_path, None)
+            # 统计吞吐量
+            file_count = sum(len(group) for group in media_groups.values())
+            cost_time = time.time() - start_time
+            if file_count > 1:
+                log.info("【Meta】识别完成：%s 个文件，%s 个媒体，耗时 %.2f 秒，%.2f 个文件/秒" % (
+                    file_count, len(media_groups), cost_time, file_count / cost_time if cost_time else file_count))
+            # 循环结束
+            return return_media_infos
+
+    @staticmethod
+    def __get_file_meta_info(file_path):
+        """
+        识别文件名称，识别不到则使用上级目录的名称补充
+        """
+        file_name = os.path.basename(file_path)
+        parent_name = os.path.basename(os.path.dirname(file_path))
+        parent_parent_name = os.path.basename(PathUtils.get_parent_paths(file_path, 2))
+        meta_info = MetaInfo(title=file_name, filePath=file_path)
+        # 识别不到则使用上级的名称
+        if not meta_info.get_name() or not meta_info.year:
+            parent_info = MetaInfo(parent_name)
+            if not parent_info.get_name() or not parent_info.year:
+                parent_parent_info = MetaInfo(parent_parent_name)
+                parent_info.type = parent_parent_info.type if parent_parent_info.type and parent_info.type != MediaType.TV else parent_info.type
+                parent_info.cn_name = parent_parent_info.cn_name if parent_parent_info.cn_name else parent_info.cn_name
+                parent_info.en_name = parent_parent_info.en_name if parent_parent_info.en_name else parent_info.en_name
+                parent_info.year = parent_parent_info.year if parent_parent_info.year else parent_info.year
+                parent_info.begin_season = NumberUtils.max_ele(parent_info.begin_season,
+                                                               parent_parent_info.begin_season)
+            if not meta_info.get_name():
+                meta_info.cn_name = parent_info.cn_name
+                meta_info.en_name = parent_info.en_name
+            if not meta_info.year:
+                meta_info.year = parent_info.year
+            if parent_info.type and parent_info.type == MediaType.TV \
+                    and meta_info.type != MediaType.TV:
+                meta_info.type = parent_info.type
+            if meta_info.type == MediaType.TV:
+                meta_info.begin_season = NumberUtils.max_ele(parent_info.begin_season,
+                                                             meta_info.begin_season)
+        return meta_info
+
+    def __set_files_tmdb_info(self, files, language=None, chinese=True, append_to_response=None):
+        """
+        按顺序为同一缓存key下的文件赋值TMDB信息
+        :param files: [(文件路径, MetaInfo)]
+        :return: 处理出错的文件路径
+        """
+        # 语言按线程设置，工作线程中需重新设置
+        with self.__language(language):
+            failed_files = []
+            for file_path, meta_info in files:
+                try:
+                    file_media_info = self.__get_file_tmdb_info(file_path=file_path,
+                                                                meta_info=meta_info,
+                                                                chinese=chinese,
+                                                                append_to_response=append_to_response)
                     # 赋值TMDB信息
                     meta_info.set_tmdb_info(file_media_info)
-                # 自带TMDB信息
-                else:
-                    meta_info = MetaInfo(title=file_name, mtype=media_type, filePath=file_path)
-                    meta_info.set_tmdb_info(tmdb_info)
-                    if season and meta_info.type != MediaType.MOVIE:
-                        meta_info.begin_season = int(season)
-                    if episode_format:
-                        begin_ep, end_ep, part = episode_format.split_episode(file_name)
-                        if begin_ep is not None:
-                            meta_info.begin_episode = begin_ep
-                            meta_info.part = part
-                        if end_ep is not None:
-                            meta_info.end_episode = end_ep
-                    # 加入缓存
-                    self.save_rename_cache(file_name, tmdb_info)
-                # 按文件路程存储
-                return_media_infos[file_path] = meta_info
-            except Exception as err:
-                print(str(err))
-                log.error("【Rmt】发生错误：%s - %s" % (str(err), traceback.format_exc()))
-        # 循环结束
-        return return_media_infos
+                except Exception as err:
+                    print(str(err))
+                    log.error("【Rmt】发生错误：%s - %s" % (str(err), traceback.format_exc()))
+                    failed_files.append(file_path)
+            return failed_files
+
+    def __get_file_tmdb_info(self, file_path, meta_info, chinese=True, append_to_response=None):
+        """
+        区配缓存及TMDB，查询文件对应的TMDB信息
+        """
+        media_key = self.__make_cache_key(meta_info)
+        if not self.meta.get_meta_data_by_key(media_key):
+            # 没有缓存数据
+            file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                 first_media_year=meta_info.year,
+                                                 search_type=meta_info.type,
+                                                 media_year=meta_info.year,
+                                                 season_number=meta_info.begin_season)
+            if not file_media_info:
+                if self._rmt_match_mode == MatchMode.NORMAL:
+                    # 去掉年份再查一次，有可能是年份错误
+                    file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                         search_type=meta_info.type)
+            if not file_media_info and self._chatgpt_enable:
+                # 从ChatGPT查询
+                mtype, seaons, episodes, file_media_info = self.__search_chatgpt(file_name=file_path,
+                                                                                 mtype=meta_info.type)
+                # 修正类型和集数
+                meta_info.type = mtype
+                if not meta_info.get_season_string():
+                    meta_info.set_season(seaons)
+                if not meta_info.get_episode_string():
+                    meta_info.set_episode(episodes)
+            if not file_media_info and self._search_keyword:
+                cache_name = cacheman["tmdb_supply"].get(meta_info.get_name())
+                is_movie = False
+                if not cache_name:
+                    cache_name, is_movie = self.__search_engine(meta_info.get_name())
+                    cacheman["tmdb_supply"].set(meta_info.get_name(), cache_name)
+                if cache_name:
+                    log.info("【Meta】开始辅助查询：%s ..." % cache_name)
+                    if is_movie:
+                        file_media_info = self.__search_tmdb(file_media_name=cache_name,
+                                                             search_type=MediaType.MOVIE)
+                    else:
+                        file_media_info = self.__search_multi_tmdb(file_media_name=cache_name)
+            # 补全TMDB信息
+            if file_media_info and not file_media_info.get("genres"):
+                file_media_info = self.get_tmdb_info(mtype=file_media_info.get("media_type"),
+                                                     tmdbid=file_media_info.get("id"),
+                                                     chinese=chinese,
+                                                     append_to_response=append_to_response)
+            # 保存到缓存
+            if file_media_info is not None:
+                self.__insert_media_cache(media_key=media_key,
+                                          file_media_info=file_media_info)
+        else:
+            # 使用缓存信息
+            cache_info = self.meta.get_meta_data_by_key(media_key)
+            if cache_info.get("id"):
+                file_media_info = self.get_tmdb_info(mtype=cache_info.get("type"),
+                                                     tmdbid=cache_info.get("id"),
+                                                     chinese=chinese,
+                                                     append_to_response=append_to_response)
+            else:
+                # 缓存为未识别
+                file_media_info = None
+        return file_media_info
 
     def __dict_tmdbpersons(self, infos, chinese=True):
         """
@@ -1941,16 +2007,16 @@ class Media:
         if media_info.type == MediaType.MOVIE:
             return None
         # 设置语言
-        self.__set_language(language)
-        if media_info.tmdb_id:
-            if not media_info.begin_episode:
-                return None
-            episodes = self.get_tmdb_season_episodes(tmdbid=media_info.tmdb_id,
-                                                     season=int(media_info.get_season_seq()))
-            for episode in episodes:
-                if episode.get("episode_number") == media_info.begin_episode:
-                    return episode.get("name")
-        return None
+        with self.__language(language):
+            if media_info.tmdb_id:
+                if not media_info.begin_episode:
+                    return None
+                episodes = self.get_tmdb_season_episodes(tmdbid=media_info.tmdb_id,
+                                                         season=int(media_info.get_season_seq()))
+                for episode in episodes:
+                    if episode.get("episode_number") == media_info.begin_episode:
+                        return episode.get("name")
+            return None
 
     def get_movie_similar(self, tmdbid, page=1):
         """
@@ -1,7 +1,17 @@
+from functools import lru_cache
+
 import regex as re
 from app.utils.commons import singleton
 
 
+@lru_cache(maxsize=16)
+def _compile_customization_re(customization):
+    """
+    编译自定义占位符的匹配正则，同一配置只编译一次
+    """
+    return re.compile(r"%s" % customization)
+
+
 @singleton
 class CustomizationMatcher(object):
     """
@@ -9,6 +19,8 @@ class CustomizationMatcher(object):
     """
     customization = None
     custom_separator = None
+    # 自定义配置版本，更新时递增，用于识别结果缓存失效
+    generation = 0
 
     def __init__(self):
         self.customization = None
@@ -23,10 +35,10 @@ class CustomizationMatcher(object):
             return ""
         if not self.customization:
             return ""
-        customization_re = re.compile(r"%s" % self.customization)
+        customization_re = _compile_customization_re(self.customization)
         # 处理重复多次的情况，保留先后顺序（按添加自定义占位符的顺序）
         unique_customization = {}
-        for item in re.findall(customization_re, title):
+        for item in customization_re.findall(title):
             if not isinstance(item, tuple):
                 item = (item,)
             for i in range(len(item)):
@@ -42,3 +54,4 @@ class CustomizationMatcher(object):
         """
         self.customization = customization
         self.custom_separator = separator
+        self.generation += 1
@@ -1,16 +1,40 @@
+import copy
 import os.path
+import threading
+
 import regex as re
+from cachetools import LRUCache
 
 import log
 from app.helper import WordsHelper
+from app.media.meta.customization import CustomizationMatcher
 from app.media.meta.metaanime import MetaAnime
 from app.media.meta.metavideo import MetaVideo
 from app.media.meta.metavideov2 import MetaVideoV2
+from app.media.meta.release_groups import ReleaseGroupsMatcher
 from app.utils.types import MediaType
 from app.utils import StringUtils
-from config import Config, RMT_MEDIAEXT
+from config import Config, RMT_MEDIAEXT, META_PARSE_CACHE_SIZE
 from app.helper import FfmpegHelper
 
+# 识别结果缓存，缓存的对象不直接返回，每次返回副本
+_meta_cache = LRUCache(maxsize=META_PARSE_CACHE_SIZE)
+_meta_cache_lock = threading.Lock()
+
+_anime_title_re = re.compile(r'【[+0-9XVPI-]+】\s*【', re.IGNORECASE)
+_anime_episode_re = re.compile(r'\s+-\s+[\dv]{1,4}\s+', re.IGNORECASE)
+_anime_not_re = re.compile(r"S\d{2}\s*-\s*S\d{2}|S\d{2}|\s+S\d{1,2}|EP?\d{2,4}\s*-\s*EP?\d{2,4}|EP?\d{2,4}|\s+EP?\d{1,4}",
+                           re.IGNORECASE)
+_anime_bracket_re = re.compile(r'\[[+0-9XVPI-]+]\s*\[', re.IGNORECASE)
+
+
+def get_meta_generation():
+    """
+    识别配置的版本，自定义识别词、制作组或自定义占位符变化后改变，用于判断缓存的识别结果是否失效
+    """
+    return WordsHelper().generation, ReleaseGroupsMatcher().generation, CustomizationMatcher().generation
+
+
 def MetaInfo(title,
              subtitle=None,
              mtype=None,
@@ -22,17 +46,78 @@ def MetaInfo(title,
              imdb_id=None):
     """
     媒体整理入口，根据名称和副标题，判断是哪种类型的识别，返回对应对象
+    相同参数及识别配置下的识别结果会被缓存，返回的均为独立副本
     :param title: 标题、种子名、文件名
     :param subtitle: 副标题、描述
     :param mtype: 指定识别类型，为空则自动识别类型
     :return: MetaAnime、MetaVideo
     """
-
-    # 使用ffmpeg获取视频元数据状态
     media = Config().get_config('media')
     ffmpeg_video_meta_enable = False
     if media:
         ffmpeg_video_meta_enable = media.get('ffmpeg_video_meta', False) or False
+    laboratory = Config().get_config('laboratory')
+    recognize_enhance_enable = False
+    if laboratory:
+        recognize_enhance_enable = laboratory.get('recognize_enhance_enable', False) or False
+    # 需要读取文件元数据时结果依赖文件内容，不缓存
+    if ffmpeg_video_meta_enable and filePath:
+        return __parse_meta_info(title, subtitle, mtype, filePath, media_type, cn_name, en_name, tmdb_id, imdb_id,
+                                 ffmpeg_video_meta_enable, recognize_enhance_enable)
+    cache_key = (title, subtitle, mtype, filePath, media_type, cn_name, en_name, tmdb_id, imdb_id,
+                 recognize_enhance_enable, get_meta_generation())
+    with _meta_cache_lock:
+        meta_info = _meta_cache.get(cache_key)
+    if meta_info is None:
+        meta_info = __parse_meta_info(title, subtitle, mtype, filePath, media_type, cn_name, en_name, tmdb_id, imdb_id,
+                                      ffmpeg_video_meta_enable, recognize_enhance_enable)
+        with _meta_cache_lock:
+            _meta_cache[cache_key] = meta_info
+    return __copy_meta_info(meta_info)
+
+
+def MetaInfoBatch(titles, mtype=None):
+    """
+    批量识别名称，相同名称只识别一次
+    :param titles: 标题列表，元素为标题或(标题, 副标题)
+    :param mtype: 指定识别类型，为空则自动识别类型
+    :return: 与titles一一对应的识别结果列表
+    """
+    meta_infos = []
+    for item in titles or []:
+        if isinstance(item, (tuple, list)):
+            title, subtitle = item[0], item[1] if len(item) > 1 else None
+        else:
+            title, subtitle = item, None
+        meta_infos.append(MetaInfo(title=title, subtitle=subtitle, mtype=mtype))
+    return meta_infos
+
+
+def __copy_meta_info(meta_info):
+    """
+    复制识别结果，列表、字典等可变属性单独复制，单例等对象引用保持共享
+    """
+    new_meta = copy.copy(meta_info)
+    for key, value in meta_info.__dict__.items():
+        if isinstance(value, (list, dict, set)):
+            setattr(new_meta, key, copy.deepcopy(value))
+    return new_meta
+
+
+def __parse_meta_info(title,
+                      subtitle,
+                      mtype,
+                      filePath,
+                      media_type,
+                      cn_name,
+                      en_name,
+                      tmdb_id,
+                      imdb_id,
+                      ffmpeg_video_meta_enable,
+                      recognize_enhance_enable):
+    """
+    根据名称和副标题识别媒体信息
+    """
     # 记录原始名称
     org_title = title
     # 应用自定义识别词，获取识别词处理后名称
@@ -52,11 +137,6 @@ def MetaInfo(title,
     else:
         fileflag = False
 
-    laboratory = Config().get_config('laboratory')
-    recognize_enhance_enable = False
-    if laboratory:
-        recognize_enhance_enable = laboratory.get('recognize_enhance_enable', False) or False
-
     if recognize_enhance_enable:
          meta_info = MetaVideoV2(rev_title, subtitle, fileflag, filePath, media_type, cn_name, en_name, tmdb_id, imdb_id)
     else:
@@ -84,14 +164,13 @@ def is_anime(name):
     """
     if not name:
         return False
-    if re.search(r'【[+0-9XVPI-]+】\s*【', name, re.IGNORECASE):
+    if _anime_title_re.search(name):
         return True
-    if re.search(r'\s+-\s+[\dv]{1,4}\s+', name, re.IGNORECASE):
+    if _anime_episode_re.search(name):
         return True
-    if re.search(r"S\d{2}\s*-\s*S\d{2}|S\d{2}|\s+S\d{1,2}|EP?\d{2,4}\s*-\s*EP?\d{2,4}|EP?\d{2,4}|\s+EP?\d{1,4}", name,
-                 re.IGNORECASE):
+    if _anime_not_re.search(name):
         return False
-    if re.search(r'\[[+0-9XVPI-]+]\s*\[', name, re.IGNORECASE):
+    if _anime_bracket_re.search(name):
         return True
     return False
 
@@ -1,7 +1,17 @@
+from functools import lru_cache
+
 import regex as re
 from app.utils.commons import singleton
 
 
+@lru_cache(maxsize=64)
+def _compile_groups_re(groups):
+    """
+    编译制作组/字幕组的匹配正则，同一组合只编译一次
+    """
+    return re.compile(r"(?<=[-@\[￡【&])(?:%s)(?=[@.\s\]\[】&])" % groups, re.I)
+
+
 @singleton
 class ReleaseGroupsMatcher(object):
     """
@@ -10,6 +20,8 @@ class ReleaseGroupsMatcher(object):
     __release_groups = None
     custom_release_groups = None
     custom_separator = None
+    # 自定义配置版本，更新时递增，用于识别结果缓存失效
+    generation = 0
     RELEASE_GROUPS = {
         "0ff": ['FF(?:(?:A|WE)B|CD|E(?:DU|B)|TV)'],
         "1pt": [],
@@ -94,10 +106,10 @@ class ReleaseGroupsMatcher(object):
             else:
                 groups = self.__release_groups
         title = f"{title} "
-        groups_re = re.compile(r"(?<=[-@\[￡【&])(?:%s)(?=[@.\s\]\[】&])" % groups, re.I)
+        groups_re = _compile_groups_re(groups)
         # 处理一个制作组识别多次的情况，保留顺序
         unique_groups = []
-        for item in re.findall(groups_re, title):
+        for item in groups_re.findall(title):
             if item not in unique_groups:
                 unique_groups.append(item)
         separator = self.custom_separator or "@"
@@ -109,3 +121,4 @@ class ReleaseGroupsMatcher(object):
         """
         self.custom_release_groups = release_groups
         self.custom_separator = separator
+        self.generation += 1
@@ -82,3 +82,15 @@ class AsObj:
 
     def values(self):
         return self.__dict__.values()
+
+
+class PagedList(list):
+    """
+    带分页信息的查询结果列表
+    """
+
+    def __init__(self, items=None, page=None, total_results=None, total_pages=None):
+        super().__init__(items or [])
+        self.page = page
+        self.total_results = total_results
+        self.total_pages = total_pages
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class RequestCache(object):
+    """
+    线程安全的LRU请求缓存，条目在读取时才判断是否过期
+    """
+
+    def __init__(self, maxsize=512, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key):
+        """
+        读取缓存，未命中或已过期时返回None，返回值为缓存内容的副本
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._misses += 1
+                return None
+            value, expire_time = item
+            if expire_time < time.time():
+                self._data.pop(key, None)
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, key, value, ttl=None):
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+        """
+        with self._lock:
+            self._data[key] = (value, time.time() + (ttl or self.ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        缓存统计信息
+        """
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations
+            }
@@ -24,8 +24,8 @@ class Search(TMDb):
         :param params:
         :return:
         """
-        self.__update_language(params)
-        return self._get_obj(self._call(self._urls["companies"], urlencode(params)))
+        with self.thread_language(self.__get_query_language(params)):
+            return self._get_obj(self._call(self._urls["companies"], urlencode(params)))
 
     def collections(self, params):
         """
@@ -33,8 +33,8 @@ class Search(TMDb):
         :param params:
         :return:
         """
-        self.__update_language(params)
-        return self._get_obj(self._call(self._urls["collections"], urlencode(params)))
+        with self.thread_language(self.__get_query_language(params)):
+            return self._get_obj(self._call(self._urls["collections"], urlencode(params)))
 
     def keywords(self, params):
         """
@@ -42,8 +42,8 @@ class Search(TMDb):
         :param params:
         :return:
         """
-        self.__update_language(params)
-        return self._get_obj(self._call(self._urls["keywords"], urlencode(params)))
+        with self.thread_language(self.__get_query_language(params)):
+            return self._get_obj(self._call(self._urls["keywords"], urlencode(params)))
 
     def movies(self, params):
         """
@@ -51,8 +51,8 @@ class Search(TMDb):
         :param params:
         :return:
         """
-        self.__update_language(params)
-        return self._get_obj(self._call(self._urls["movies"], urlencode(params)))
+        with self.thread_language(self.__get_query_language(params)):
+            return self._get_obj(self._call(self._urls["movies"], urlencode(params)))
 
     def multi(self, params):
         """
@@ -60,8 +60,8 @@ class Search(TMDb):
         :param params:
         :return:
         """
-        self.__update_language(params)
-        return self._get_obj(self._call(self._urls["multi"], urlencode(params)))
+        with self.thread_language(self.__get_query_language(params)):
+            return self._get_obj(self._call(self._urls["multi"], urlencode(params)))
 
     def people(self, params):
         """
@@ -69,8 +69,8 @@ class Search(TMDb):
         :param params:
         :return:
         """
-        self.__update_language(params)
-        return self._get_obj(self._call(self._urls["people"], urlencode(params)))
+        with self.thread_language(self.__get_query_language(params)):
+            return self._get_obj(self._call(self._urls["people"], urlencode(params)))
 
     def tv_shows(self, params):
         """
@@ -78,14 +78,16 @@ class Search(TMDb):
         :param params:
         :return:
         """
-        self.__update_language(params)
-        return self._get_obj(self._call(self._urls["tv_shows"], urlencode(params)))
+        with self.thread_language(self.__get_query_language(params)):
+            return self._get_obj(self._call(self._urls["tv_shows"], urlencode(params)))
 
-    def __update_language(self, params):
+    def __get_query_language(self, params):
+        """
+        按查询词是否为中文确定查询语言，无查询词时使用当前语言
+        """
         if not isinstance(params, dict):
-            return
+            return self.language
         query = params.get("query", "") or ""
         if not StringUtils.is_string_and_not_empty(query):
-            return
-        is_chinese = StringUtils.is_chinese(query)
-        self.language = "zh" if is_chinese else "en"
+            return self.language
+        return "zh" if StringUtils.is_chinese(query) else "en"
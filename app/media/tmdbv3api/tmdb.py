@@ -2,15 +2,17 @@
 
 import logging
 import os
+import threading
 import time
-from functools import lru_cache
+from contextlib import contextmanager
 
 import requests
 import requests.exceptions
+from requests.adapters import HTTPAdapter
 
-from .as_obj import AsObj
+from .as_obj import AsObj, PagedList
+from .cache import RequestCache
 from .exceptions import TMDbException
-from app.utils.commons import ttl_lru
 
 logger = logging.getLogger(__name__)
 
@@ -25,9 +27,20 @@ class TMDb(object):
     TMDB_DOMAIN = "TMDB_DOMAIN"
     TMDB_INCLUDE_ADULT = "TMDB_INCLUDE_ADULT"
     REQUEST_CACHE_MAXSIZE = 512
+    REQUEST_CACHE_TTL = 60 * 60 * 6
+    # 404等不存在的结果只短时间缓存
+    REQUEST_NEGATIVE_CACHE_TTL = 60 * 10
+    REQUEST_POOL_MAXSIZE = 20
+
+    # 所有实例共享的请求缓存及连接池
+    _request_cache = RequestCache(maxsize=REQUEST_CACHE_MAXSIZE, ttl=REQUEST_CACHE_TTL)
+    _shared_session = None
+    _session_lock = threading.Lock()
+    # 线程内的语言设置，优先于全局语言
+    _local = threading.local()
 
     def __init__(self, obj_cached=True, session=None):
-        self._session = requests.Session() if session is None else session
+        self._session = self.__get_shared_session() if session is None else session
         self._remaining = 40
         self._reset = None
         self.obj_cached = obj_cached
@@ -36,18 +49,6 @@ class TMDb(object):
         if not os.environ.get(self.TMDB_DOMAIN):
             os.environ[self.TMDB_DOMAIN] = "https://api.themoviedb.org/3"
 
-    @property
-    def page(self):
-        return os.environ["page"]
-
-    @property
-    def total_results(self):
-        return os.environ["total_results"]
-
-    @property
-    def total_pages(self):
-        return os.environ["total_pages"]
-
     @property
     def api_key(self):
         return os.environ.get(self.TMDB_API_KEY)
@@ -83,12 +84,24 @@ class TMDb(object):
 
     @property
     def language(self):
-        return os.environ.get(self.TMDB_LANGUAGE)
+        return getattr(self._local, "language", None) or os.environ.get(self.TMDB_LANGUAGE)
 
     @language.setter
     def language(self, language):
         os.environ[self.TMDB_LANGUAGE] = language
 
+    @contextmanager
+    def thread_language(self, language):
+        """
+        在当前线程内临时使用指定语言查询，退出时恢复原来的设置，为空时使用全局语言
+        """
+        previous = getattr(self._local, "language", None)
+        self._local.language = language
+        try:
+            yield
+        finally:
+            self._local.language = previous
+
     @property
     def include_adult(self):
         if os.environ.get(self.TMDB_INCLUDE_ADULT) == "True" or os.environ.get(self.TMDB_INCLUDE_ADULT) == True:
@@ -140,20 +153,28 @@ class TMDb(object):
         if all_details is True or key is None:
             return AsObj(**result)
         else:
-            return [AsObj(**res) for res in result[key]]
-
-    @staticmethod
-    @lru_cache(maxsize=REQUEST_CACHE_MAXSIZE)
-    def cached_request(method, url, data, proxies):
-        return requests.request(method, url, data=data, proxies=eval(proxies), verify=False, timeout=10)
-
-    @staticmethod
-    @ttl_lru(seconds=60 * 60 * 6, maxsize=REQUEST_CACHE_MAXSIZE)
-    def ttl_cached_request(method, url, data, proxies):
-        return requests.request(method, url, data=data, proxies=eval(proxies), verify=False, timeout=10)
+            return PagedList([AsObj(**res) for res in result[key]],
+                             page=result.get("page"),
+                             total_results=result.get("total_results"),
+                             total_pages=result.get("total_pages"))
+
+    @classmethod
+    def __get_shared_session(cls):
+        with cls._session_lock:
+            if cls._shared_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=cls.REQUEST_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                cls._shared_session = session
+            return cls._shared_session
 
     def cache_clear(self):
-        return self.cached_request.cache_clear()
+        return self._request_cache.clear()
+
+    @classmethod
+    def cache_stats(cls):
+        return cls._request_cache.stats()
 
     def _call(
             self, action, append_to_response, call_cached=True, method="GET", data=None
@@ -170,46 +191,46 @@ class TMDb(object):
             self.language,
         )
 
-        if self.cache and self.obj_cached and call_cached and method != "POST":
-            req = self.ttl_cached_request(method, url, data, self.proxies)
-        else:
-            req = self._session.request(method, url, data=data, proxies=eval(self.proxies), timeout=10, verify=False)
-
-        headers = req.headers
+        use_cache = self.cache and self.obj_cached and call_cached and method != "POST"
+        cache_key = (method, url, data)
+        json = self._request_cache.get(cache_key) if use_cache else None
 
-        if "X-RateLimit-Remaining" in headers:
-            self._remaining = int(headers["X-RateLimit-Remaining"])
+        if json is None:
+            req = self._session.request(method, url, data=data, proxies=eval(self.proxies), timeout=10, verify=False)
 
-        if "X-RateLimit-Reset" in headers:
-            self._reset = int(headers["X-RateLimit-Reset"])
+            headers = req.headers
 
-        if self._remaining < 1:
-            current_time = int(time.time())
-            sleep_time = self._reset - current_time
+            if "X-RateLimit-Remaining" in headers:
+                self._remaining = int(headers["X-RateLimit-Remaining"])
 
-            if self.wait_on_rate_limit:
-                logger.warning("Rate limit reached. Sleeping for: %d" % sleep_time)
-                time.sleep(abs(sleep_time))
-                self._call(action, append_to_response, call_cached, method, data)
-            else:
-                raise TMDbException(
-                    "Rate limit reached. Try again in %d seconds." % sleep_time
-                )
+            if "X-RateLimit-Reset" in headers:
+                self._reset = int(headers["X-RateLimit-Reset"])
 
-        json = req.json()
+            if self._remaining < 1:
+                current_time = int(time.time())
+                sleep_time = self._reset - current_time
 
-        if "page" in json:
-            os.environ["page"] = str(json["page"])
+                if self.wait_on_rate_limit:
+                    logger.warning("Rate limit reached. Sleeping for: %d" % sleep_time)
+                    time.sleep(abs(sleep_time))
+                    return self._call(action, append_to_response, call_cached, method, data)
+                else:
+                    raise TMDbException(
+                        "Rate limit reached. Try again in %d seconds." % sleep_time
+                    )
 
-        if "total_results" in json:
-            os.environ["total_results"] = str(json["total_results"])
+            json = req.json()
 
-        if "total_pages" in json:
-            os.environ["total_pages"] = str(json["total_pages"])
+            # 只缓存成功的结果，404短时间缓存，5xx及429不缓存
+            if use_cache:
+                if req.status_code == 404:
+                    self._request_cache.set(cache_key, json, ttl=self.REQUEST_NEGATIVE_CACHE_TTL)
+                elif req.ok:
+                    self._request_cache.set(cache_key, json)
 
         if self.debug:
             logger.info(json)
-            logger.info(self.cached_request.cache_info())
+            logger.info(self.cache_stats())
 
         if "errors" in json:
             raise TMDbException(json["errors"])
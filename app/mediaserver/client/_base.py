@@ -139,6 +139,22 @@ class _IMediaClient(metaclass=ABCMeta):
         """
         pass
 
+    def get_sync_items(self, parent):
+        """
+        获取媒体库中需同步的所有媒体，媒体的etag在媒体信息或剧集有变化时改变
+        :param parent: 媒体库ID
+        :return: 媒体列表，获取失败时返回None
+        """
+        return [item for item in self.get_items(parent) if item]
+
+    def get_sync_tv_episodes(self, item_id):
+        """
+        获取需同步的剧集的所有集信息
+        :param item_id: 剧集ID
+        :return: 集信息列表，获取失败时返回None
+        """
+        return self.get_tv_episodes(item_id=item_id)
+
     @abstractmethod
     def get_play_url(self, item_id):
         """
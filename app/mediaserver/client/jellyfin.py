@@ -5,7 +5,7 @@ import log
 from app.mediaserver.client._base import _IMediaClient
 from app.utils import RequestUtils, SystemUtils, ExceptionUtils, IpUtils
 from app.utils.types import MediaServerType, MediaType
-from config import Config
+from config import Config, MEDIASYNC_PAGE_SIZE
 
 
 class Jellyfin(_IMediaClient):
@@ -23,6 +23,11 @@ class Jellyfin(_IMediaClient):
     _host = None
     _play_host = None
     _user = None
+    # 同步媒体库时查询的字段
+    _item_fields = ["ProviderIds", "OriginalTitle", "ProductionYear", "Path", "ParentId",
+                    "Etag", "DateLastSaved", "DateLastMediaAdded", "RecursiveItemCount"]
+    # 媒体信息或剧集有变化时会改变的字段
+    _etag_fields = ["Etag", "DateLastSaved", "DateLastMediaAdded", "RecursiveItemCount"]
 
     def __init__(self, config=None):
         if config:
@@ -522,34 +527,83 @@ class Jellyfin(_IMediaClient):
             yield {}
         if not self._host or not self._apikey:
             yield {}
-        req_url = "%sUsers/%s/Items?parentId=%s&api_key=%s" % (self._host, self._user, parent, self._apikey)
         try:
-            res = RequestUtils().get_res(req_url)
-            if res and res.status_code == 200:
-                results = res.json().get("Items") or []
-                for result in results:
-                    if not result:
-                        continue
-                    if result.get("Type") in ["Movie", "Series"]:
-                        item_info = self.get_iteminfo(result.get("Id"))
-                        yield {"id": result.get("Id"),
-                               "library": item_info.get("ParentId"),
-                               "type": item_info.get("Type"),
-                               "title": item_info.get("Name"),
-                               "originalTitle": item_info.get("OriginalTitle"),
-                               "year": item_info.get("ProductionYear"),
-                               "tmdbid": item_info.get("ProviderIds", {}).get("Tmdb"),
-                               "imdbid": item_info.get("ProviderIds", {}).get("Imdb"),
-                               "path": item_info.get("Path"),
-                               "json": str(item_info)}
-                    elif "Folder" in result.get("Type"):
-                        for item in self.get_items(result.get("Id")):
-                            yield item
+            for item in self.__get_library_items(parent):
+                yield item
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
             log.error(f"【{self.client_name}】连接Users/Items出错：" + str(e))
         yield {}
 
+    def get_sync_items(self, parent):
+        """
+        获取媒体库中需同步的所有媒体，获取失败时返回None
+        """
+        if not parent or not self._host or not self._apikey:
+            return None
+        try:
+            return list(self.__get_library_items(parent))
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            log.error(f"【{self.client_name}】连接Users/Items出错：" + str(e))
+            return None
+
+    def get_sync_tv_episodes(self, item_id):
+        """
+        获取需同步的剧集的所有集信息，请求失败时返回None，以便下次同步时重试
+        """
+        if not item_id or not self._host or not self._apikey or not self._user:
+            return None
+        req_url = "%sShows/%s/Episodes?userId=%s&isMissing=false&api_key=%s" % (
+            self._host, item_id, self._user, self._apikey)
+        try:
+            res = RequestUtils().get_res(req_url)
+            if res is None or res.status_code != 200:
+                log.warn(f"【{self.client_name}】获取剧集 {item_id} 的集信息失败：{res.status_code if res is not None else '无法连接'}")
+                return None
+            return [{
+                "season_num": res_item.get("ParentIndexNumber") or 0,
+                "episode_num": res_item.get("IndexNumber") or 0
+            } for res_item in res.json().get("Items") or []]
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            log.error(f"【{self.client_name}】连接Shows/Id/Episodes出错：" + str(e))
+            return None
+
+    def __get_library_items(self, parent):
+        """
+        分页获取媒体库下所有目录中的电影和电视剧，请求失败时抛出异常
+        """
+        start_index = 0
+        while True:
+            req_url = "%sUsers/%s/Items?parentId=%s&recursive=true&includeItemTypes=Movie,Series" \
+                      "&fields=%s&startIndex=%s&limit=%s&api_key=%s" % (
+                          self._host, self._user, parent, ",".join(self._item_fields),
+                          start_index, MEDIASYNC_PAGE_SIZE, self._apikey)
+            res = RequestUtils().get_res(req_url)
+            if res is None or res.status_code != 200:
+                raise Exception("获取媒体库 %s 的媒体失败：%s" % (parent, res.status_code if res is not None else "无法连接"))
+            res_json = res.json()
+            results = res_json.get("Items") or []
+            for result in results:
+                if not result:
+                    continue
+                provider_ids = result.get("ProviderIds") or {}
+                yield {"id": result.get("Id"),
+                       "library": result.get("ParentId"),
+                       "type": result.get("Type"),
+                       "title": result.get("Name"),
+                       "originalTitle": result.get("OriginalTitle"),
+                       "year": result.get("ProductionYear"),
+                       "tmdbid": provider_ids.get("Tmdb"),
+                       "imdbid": provider_ids.get("Imdb"),
+                       "path": result.get("Path"),
+                       "etag": "|".join([str(result.get(key) or "") for key in self._etag_fields]),
+                       "json": str(result)}
+            start_index += len(results)
+            if not results or start_index >= (res_json.get("TotalRecordCount") or 0):
+                break
+
     def get_play_url(self, item_id):
         """
         拼装媒体播放链接
@@ -442,29 +442,64 @@ class Plex(_IMediaClient):
         if not self._plex:
             yield {}
         try:
-            section = self._plex.library.sectionByID(parent)
-            if section:
-                for item in section.all():
-                    if not item:
-                        continue
-                    ids = self.__get_ids(item.guids)
-                    path = None
-                    if item.locations:
-                        path = item.locations[0]
-                    yield {"id": item.key,
-                           "library": item.librarySectionID,
-                           "type": item.type,
-                           "title": item.title,
-                           "originalTitle": item.originalTitle,
-                           "year": item.year,
-                           "tmdbid": ids['tmdb_id'],
-                           "imdbid": ids['imdb_id'],
-                           "tvdbid": ids['tvdb_id'],
-                           "path": path}
+            for item in self.__get_library_items(parent):
+                yield item
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
         yield {}
 
+    def get_sync_items(self, parent):
+        """
+        获取媒体库中需同步的所有媒体，获取失败时返回None
+        """
+        if not parent or not self._plex:
+            return None
+        try:
+            return list(self.__get_library_items(parent))
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            return None
+
+    def get_sync_tv_episodes(self, item_id):
+        """
+        获取需同步的剧集的所有集信息，请求失败时返回None，以便下次同步时重试
+        """
+        if not item_id or not self._plex:
+            return None
+        try:
+            return [{"season_num": episode.seasonNumber,
+                     "episode_num": episode.index} for episode in self._plex.fetchItem(item_id).episodes()]
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            return None
+
+    def __get_library_items(self, parent):
+        """
+        获取媒体库中的所有媒体，请求失败时抛出异常
+        """
+        section = self._plex.library.sectionByID(parent)
+        if not section:
+            return
+        for item in section.all():
+            if not item:
+                continue
+            ids = self.__get_ids(item.guids)
+            path = None
+            if item.locations:
+                path = item.locations[0]
+            yield {"id": item.key,
+                   "library": item.librarySectionID,
+                   "type": item.type,
+                   "title": item.title,
+                   "originalTitle": item.originalTitle,
+                   "year": item.year,
+                   "tmdbid": ids['tmdb_id'],
+                   "imdbid": ids['imdb_id'],
+                   "tvdbid": ids['tvdb_id'],
+                   "path": path,
+                   # 剧集增减集时updatedAt不一定变化，同时比较总集数
+                   "etag": "%s|%s" % (item.updatedAt, getattr(item, "leafCount", ""))}
+
     @staticmethod
     def __get_ids(guids):
         guid_mapping = {
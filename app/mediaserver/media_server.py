@@ -1,5 +1,6 @@
 import json
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import log
 from app.conf import SystemConfig
@@ -10,7 +11,7 @@ from app.message import Message
 from app.utils import ExceptionUtils
 from app.utils.commons import singleton
 from app.utils.types import MediaServerType, MovieTypes, SystemConfigKey, ProgressKey
-from config import Config
+from config import Config, MEDIASYNC_WORKERS
 
 lock = threading.Lock()
 server_lock = threading.Lock()
@@ -216,7 +217,8 @@ class MediaServer:
 
     def sync_mediaserver(self):
         """
-        同步媒体库所有数据到本地数据库
+        增量同步媒体库数据到本地数据库：只查询新增或有变化的剧集的集信息，
+        所有变化在一个事务中写入，同步过程中仍可查询到原来的数据
         """
         if not self.server:
             return
@@ -227,52 +229,75 @@ class MediaServer:
             self.progress.update(ptype=ProgressKey.MediaSync, text="请稍候...")
             # 获取需同步的媒体库
             librarys = self.systemconfig.get(SystemConfigKey.SyncLibrary) or []
-            # 汇总统计
-            medias_count = self.get_medias_count()
-            total_media_count = medias_count.get("MovieCount") + medias_count.get("SeriesCount")
-            total_count = 0
-            movie_count = 0
-            tv_count = 0
-            # 清空登记薄
-            self.mediadb.empty(server_type=self._server_type)
+            # 已同步媒体的etag
+            sync_etags = self.mediadb.get_etags(server_type=self._server_type)
+            sync_items = {}
+            # 是否所有媒体库都获取成功，有失败的不删除原有数据
+            all_success = True
             for library in self.get_libraries():
                 if str(library.get("id")) not in librarys:
                     continue
                 # 获取媒体库所有项目
                 self.progress.update(ptype=ProgressKey.MediaSync,
                                      text="正在获取 %s 数据..." % (library.get("name")))
-                for item in self.get_items(library.get("id")):
-                    if not item:
-                        continue
-                    # 更新进度
-                    seasoninfo = []
-                    total_count += 1
-                    if item.get("type") in ['Movie', 'movie']:
-                        movie_count += 1
-                    elif item.get("type") in ['Series', 'show']:
-                        tv_count += 1
-                        # 查询剧集信息
-                        seasoninfo = self.get_tv_episodes(item.get("id"))
-                    self.progress.update(ptype=ProgressKey.MediaSync,
-                                         text="正在同步 %s，已完成：%s / %s ..." % (
-                                             library.get("name"), total_count, total_media_count),
-                                         value=round(100 * total_count / total_media_count, 1))
-                    # 插入数据
-                    self.mediadb.insert(server_type=self._server_type,
-                                        iteminfo=item,
-                                        seasoninfo=seasoninfo)
-
-            # 更新总体同步情况
-            self.mediadb.statistics(server_type=self._server_type,
-                                    total_count=total_count,
-                                    movie_count=movie_count,
-                                    tv_count=tv_count)
+                items = self.server.get_sync_items(library.get("id"))
+                if items is None:
+                    all_success = False
+                    log.warn("【MediaServer】%s 数据获取失败，本次同步不删除已同步的数据" % library.get("name"))
+                    continue
+                for item in items:
+                    if item and item.get("id"):
+                        sync_items[str(item.get("id"))] = item
+            movie_count = len([item for item in sync_items.values() if item.get("type") in ['Movie', 'movie']])
+            tv_count = len([item for item in sync_items.values() if item.get("type") in ['Series', 'show']])
+            # 新增或有变化的媒体
+            changed_items = [item for item_id, item in sync_items.items()
+                             if not item.get("etag") or sync_etags.get(item_id) != item.get("etag")]
+            # 查询剧集信息，失败的保留原数据，下次同步时重试
+            update_items = []
+            tv_items = []
+            for item in changed_items:
+                if item.get("type") in ['Series', 'show']:
+                    tv_items.append(item)
+                else:
+                    update_items.append((item, []))
+            if tv_items:
+                with ThreadPoolExecutor(max_workers=MEDIASYNC_WORKERS) as executor:
+                    for finished, (item, seasoninfo) in enumerate(
+                            executor.map(lambda x: (x, self.__get_sync_tv_episodes(x.get("id"))), tv_items), 1):
+                        self.progress.update(ptype=ProgressKey.MediaSync,
+                                             text="正在同步剧集信息，已完成：%s / %s ..." % (finished, len(tv_items)),
+                                             value=round(100 * finished / len(tv_items), 1))
+                        if seasoninfo is None:
+                            continue
+                        update_items.append((item, seasoninfo))
+            delete_ids = [item_id for item_id in sync_etags if item_id not in sync_items] if all_success else []
+            # 写入数据并更新总体同步情况，有媒体库获取失败时不更新统计
+            self.mediadb.sync(server_type=self._server_type,
+                              items=update_items,
+                              delete_ids=delete_ids,
+                              total_count=len(sync_items) if all_success else None,
+                              movie_count=movie_count,
+                              tv_count=tv_count)
             # 结束进度条
             self.progress.update(ptype=ProgressKey.MediaSync,
                                  value=100,
-                                 text="媒体库数据同步完成，同步数量：%s" % total_count)
+                                 text="媒体库数据同步完成，同步数量：%s" % len(sync_items))
             self.progress.end(ProgressKey.MediaSync)
-            log.info("【MediaServer】媒体库数据同步完成，同步数量：%s" % total_count)
+            log.info("【MediaServer】媒体库数据同步完成，同步数量：%s，新增或更新：%s，删除：%s" % (
+                len(sync_items), len(update_items), len(delete_ids)))
+
+    def __get_sync_tv_episodes(self, item_id):
+        """
+        查询剧集的所有集信息，失败时返回None
+        """
+        if not self.server:
+            return None
+        try:
+            return self.server.get_sync_tv_episodes(item_id)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return None
 
     def check_item_exists(self,
                           mtype,
@@ -158,7 +158,7 @@ class OpenSubtitles(_IPluginModule):
                     # 解压文件
                     shutil.unpack_archive(zip_file, zip_path, format='zip')
                     # 遍历转移文件
-                    for sub_file in PathUtils.get_dir_files(in_path=zip_path, exts=RMT_SUBEXT):
+                    for sub_file in PathUtils.iter_dir_files(in_path=zip_path, exts=RMT_SUBEXT):
                         self.sitehelper.transfer_subtitle(sub_file, Media_File)
                     # 删除临时文件
                     try:
@@ -1,4 +1,6 @@
+import hashlib
 import re
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 
 import log
@@ -13,6 +15,7 @@ from app.subscribe import Subscribe
 from app.utils import ExceptionUtils, Torrent
 from app.utils.commons import singleton
 from app.utils.types import MediaType, SearchType
+from config import RSS_FETCH_WORKERS, RSS_FETCH_TIMEOUT
 
 lock = Lock()
 
@@ -29,6 +32,10 @@ class Rss:
     rsshelper = None
     subscribe = None
     message = None
+    # 各站点RSS的下载状态，按RSS地址存储ETag、Last-Modified、内容摘要、上次的种子及已处理的种子链接
+    _rss_states = {}
+    # 订阅、站点设置及过滤规则的签名，变化后需重新处理所有种子
+    _match_sign = None
 
     def __init__(self):
         self.init_config()
@@ -43,6 +50,16 @@ class Rss:
         self.rsshelper = RssHelper()
         self.subscribe = Subscribe()
         self.message = Message()
+        # 配置重新加载后所有种子都要重新匹配
+        self.__reset_processed()
+
+    def __reset_processed(self):
+        """
+        清空各站点已处理的种子链接
+        """
+        for rss_state in self._rss_states.values():
+            rss_state["processed"] = set()
+        self._match_sign = None
 
     def rssdownload(self):
         """
@@ -96,11 +113,8 @@ class Rss:
             else:
                 check_sites = list(set(check_sites))
 
-            # 匹配到的资源列表
-            rss_download_torrents = []
-            # 缺失的资源详情
-            rss_no_exists = {}
-            # 遍历站点资源
+            # 需要处理的站点
+            rss_sites = []
             for site_info in rss_sites_info:
                 if not site_info:
                     continue
@@ -110,10 +124,33 @@ class Rss:
                 if check_sites and site_name not in check_sites:
                     continue
                 # 站点rss链接
-                rss_url = site_info.get("rssurl")
-                if not rss_url:
+                if not site_info.get("rssurl"):
                     log.info(f"【Rss】{site_name} 未配置rssurl，跳过...")
                     continue
+                rss_sites.append(site_info)
+
+            # 订阅、站点设置或过滤规则有变化时所有种子都要重新匹配
+            match_sign = hashlib.md5(
+                f"{rss_movies}{rss_tvs}{rss_sites}{self.filter.get_rule_infos()}".encode("utf-8")).hexdigest()
+            if match_sign != self._match_sign:
+                self.__reset_processed()
+                self._match_sign = match_sign
+
+            # 并发下载所有站点的RSS
+            rss_site_articles = self.__fetch_rss_sites(rss_sites)
+
+            # 匹配到的资源列表
+            rss_download_torrents = []
+            # 匹配到的种子链接对应的RSS地址，下载成功后才标记为已处理
+            matched_enclosures = {}
+            # 缺失的资源详情
+            rss_no_exists = {}
+            # 遍历站点资源
+            for site_info in rss_sites:
+                # 站点名称
+                site_name = site_info.get("name")
+                # 站点rss链接
+                rss_url = site_info.get("rssurl")
                 # 站点信息
                 site_id = site_info.get("id")
                 site_cookie = site_info.get("cookie")
@@ -131,7 +168,7 @@ class Rss:
                     site_order = 100 - int(site_info.get("pri"))
                 else:
                     site_order = 0
-                rss_acticles = self.rsshelper.parse_rssxml(url=rss_url)
+                rss_acticles = rss_site_articles.get(rss_url)
                 if rss_acticles is None:
                     # RSS链接过期
                     log.error(f"【Rss】站点 {site_name} RSS链接已过期，请重新获取！")
@@ -143,16 +180,25 @@ class Rss:
                 if not rss_acticles:
                     log.warn(f"【Rss】{site_name} 未下载到数据")
                     continue
-                else:
-                    log.info(f"【Rss】{site_name} 获取数据：{len(rss_acticles)}")
+                # 只处理上次之后新出现或未处理完成的种子
+                rss_state = self._rss_states.get(rss_url) or {}
+                processed_enclosures = rss_state.get("processed") or set()
+                new_acticles = [article for article in rss_acticles
+                                if article.get('enclosure') not in processed_enclosures]
+                log.info(f"【Rss】{site_name} 获取数据：{len(rss_acticles)}，新增：{len(new_acticles)}")
+                # 批量查询已订阅过的种子
+                rssd_enclosures = self.rsshelper.get_rssd_enclosures(
+                    [article.get('enclosure') for article in new_acticles])
+                # 本站点待插入的RSS记录，站点处理结束后一次性插入
+                rss_torrents = []
                 # 处理RSS结果
                 res_num = 0
-                for article in rss_acticles:
+                for article in new_acticles:
+                    # 种子链接
+                    enclosure = article.get('enclosure')
                     try:
                         # 种子名
                         title = article.get('title')
-                        # 种子链接
-                        enclosure = article.get('enclosure')
                         # 种子页面
                         page_url = article.get('link')
                         # 种子大小
@@ -160,8 +206,9 @@ class Rss:
                         # 开始处理
                         log.info(f"【Rss】开始处理：{title}")
                         # 检查这个种子是不是下过了
-                        if self.rsshelper.is_rssd_by_enclosure(enclosure):
+                        if not enclosure or enclosure in rssd_enclosures:
                             log.info(f"【Rss】{title} 已成功订阅过")
+                            processed_enclosures.add(enclosure)
                             continue
                         # 识别种子名称，开始搜索TMDB
                         media_info = MetaInfo(title=title)
@@ -177,6 +224,7 @@ class Rss:
                             media_info = self.media.get_media_info(title=title)
                             if not media_info:
                                 log.warn(f"【Rss】{title} 无法识别出媒体信息！")
+                                processed_enclosures.add(enclosure)
                                 continue
                             elif not media_info.tmdb_info:
                                 log.info(f"【Rss】{title} 识别为 {media_info.get_name()} 未匹配到TMDB媒体信息")
@@ -203,6 +251,7 @@ class Rss:
 
                         # 未匹配
                         if not match_flag:
+                            processed_enclosures.add(enclosure)
                             continue
 
                         # 非模糊匹配命中，检查本地情况，检查删除订阅
@@ -212,6 +261,7 @@ class Rss:
                                 media_info.set_tmdb_info(self.media.get_tmdb_info(mtype=media_info.type,
                                                                                   tmdbid=media_info.tmdb_id))
                             if not media_info.tmdb_info:
+                                processed_enclosures.add(enclosure)
                                 continue
                             # 非洗版时检查本地是否存在
                             if not match_info.get("over_edition"):
@@ -266,6 +316,7 @@ class Rss:
                                         ))
                                 # 本地已存在
                                 if exist_flag:
+                                    processed_enclosures.add(enclosure)
                                     continue
                             # 洗版模式
                             else:
@@ -286,13 +337,14 @@ class Rss:
                                         f"【Rss】{media_info.get_title_string()}{media_info.get_season_string()} "
                                         f"正在洗版，跳过低优先级或同优先级资源：{title}"
                                     )
+                                    processed_enclosures.add(enclosure)
                                     continue
                         # 模糊匹配
                         else:
                             # 不做处理，直接下载
                             pass
 
-                        # 站点流控
+                        # 站点流控，下次重新处理
                         if self.sites.check_ratelimit(site_id):
                             continue
 
@@ -306,8 +358,10 @@ class Rss:
                         # 设置下载参数
                         media_info.set_download_info(download_setting=match_info.get("download_setting"),
                                                      save_path=match_info.get("save_path"))
-                        # 插入数据库历史记录
-                        self.rsshelper.insert_rss_torrents(media_info)
+                        # 记录数据库历史记录
+                        rss_torrents.append(media_info)
+                        rssd_enclosures.add(enclosure)
+                        matched_enclosures[enclosure] = rss_url
                         # 加入下载列表
                         if media_info not in rss_download_torrents:
                             rss_download_torrents.append(media_info)
@@ -316,11 +370,82 @@ class Rss:
                         ExceptionUtils.exception_traceback(e)
                         log.error("【Rss】处理RSS发生错误：%s" % str(e))
                         continue
+                # 插入数据库历史记录
+                if rss_torrents:
+                    self.rsshelper.insert_rss_torrents(rss_torrents)
+                # 只保留当前RSS中仍存在的种子链接
+                if rss_url in self._rss_states:
+                    self._rss_states[rss_url]["processed"] = processed_enclosures & {
+                        article.get('enclosure') for article in rss_acticles
+                    }
                 log.info("【Rss】%s 处理结束，匹配到 %s 个有效资源" % (site_name, res_num))
             log.info("【Rss】所有RSS处理结束，共 %s 个有效资源" % len(rss_download_torrents))
             # 开始择优下载
-            self.download_rss_torrent(rss_download_torrents=rss_download_torrents,
-                                      rss_no_exists=rss_no_exists)
+            download_items = self.download_rss_torrent(rss_download_torrents=rss_download_torrents,
+                                                       rss_no_exists=rss_no_exists)
+            # 下载成功的种子标记为已处理，未下载的下次重新处理
+            for item in download_items or []:
+                rss_url = matched_enclosures.get(item.enclosure)
+                if rss_url in self._rss_states:
+                    self._rss_states[rss_url]["processed"].add(item.enclosure)
+
+    def __fetch_rss_sites(self, rss_sites):
+        """
+        并发下载各站点RSS，未变化的RSS不重新解析
+        :param rss_sites: 站点信息列表
+        :return: {RSS地址: 种子信息列表}，种子信息列表为None代表RSS过期
+        """
+        if not rss_sites:
+            return {}
+        rss_urls = {site_info.get("rssurl"): site_info.get("proxy") for site_info in rss_sites}
+        with ThreadPoolExecutor(max_workers=min(RSS_FETCH_WORKERS, len(rss_urls))) as executor:
+            results = dict(zip(rss_urls.keys(),
+                               executor.map(lambda item: self.__fetch_rss(item[0], item[1]), rss_urls.items())))
+        # 更新RSS状态
+        rss_site_articles = {}
+        for rss_url, (articles, rss_state) in results.items():
+            if rss_state:
+                self._rss_states[rss_url] = rss_state
+            rss_site_articles[rss_url] = articles
+        return rss_site_articles
+
+    def __fetch_rss(self, rss_url, proxy=False):
+        """
+        下载单个站点的RSS，使用ETag/Last-Modified条件请求，304或内容摘要未变化时沿用上次的解析结果
+        :return: 种子信息列表, 新的RSS状态
+        """
+        rss_state = self._rss_states.get(rss_url) or {}
+        try:
+            ret = self.rsshelper.get_rss_res(url=rss_url,
+                                             proxy=proxy,
+                                             etag=rss_state.get("etag"),
+                                             last_modified=rss_state.get("last_modified"),
+                                             timeout=RSS_FETCH_TIMEOUT)
+            if not ret:
+                return [], None
+            if ret.status_code == 304 and rss_state.get("articles") is not None:
+                log.debug(f"【Rss】{rss_url} 未更新")
+                return rss_state.get("articles"), None
+            content_hash = hashlib.md5(ret.content).hexdigest()
+            new_state = {
+                "etag": ret.headers.get("ETag"),
+                "last_modified": ret.headers.get("Last-Modified"),
+                "hash": content_hash,
+                "articles": rss_state.get("articles"),
+                "processed": rss_state.get("processed") or set()
+            }
+            if content_hash == rss_state.get("hash") and rss_state.get("articles") is not None:
+                log.debug(f"【Rss】{rss_url} 内容未变化")
+                return rss_state.get("articles"), new_state
+            ret.encoding = ret.apparent_encoding
+            articles = self.rsshelper.parse_rss_content(rss_url, ret.text)
+            if articles is None:
+                return None, None
+            new_state["articles"] = articles
+            return articles, new_state
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return [], None
 
     def check_torrent_rss(self,
                           media_info,
@@ -504,10 +629,11 @@ class Rss:
     def download_rss_torrent(self, rss_download_torrents, rss_no_exists):
         """
         根据缺失情况以及匹配到的结果选择下载种子
+        :return: 下载成功的资源列表
         """
 
         if not rss_download_torrents:
-            return
+            return []
 
         finished_rss_torrents = []
         updated_rss_torrents = []
@@ -576,6 +702,7 @@ class Rss:
             log.info("【Rss】实际下载了 %s 个资源" % len(download_items))
         else:
             log.info("【Rss】未下载到任何资源")
+        return download_items or []
 
     def delete_rss_history(self, rssid):
         """
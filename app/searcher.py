@@ -40,13 +40,15 @@ class Searcher:
                       key_word: [str, list],
                       filter_args: dict,
                       match_media=None,
-                      in_from: SearchType = None):
+                      in_from: SearchType = None,
+                      callback=None):
         """
         根据关键字调用索引器检查媒体
         :param key_word: 搜索的关键字，不能为空
         :param filter_args: 过滤条件
         :param match_media: 区配的媒体信息
         :param in_from: 搜索渠道
+        :param callback: 每个站点搜索完成时的回调，参数为站点和该站点过滤后的结果
         :return: 命中的资源媒体信息列表
         """
         if not key_word:
@@ -63,14 +65,16 @@ class Searcher:
         return self.indexer.search_by_keyword(key_word=key_word,
                                               filter_args=filter_args,
                                               match_media=match_media,
-                                              in_from=in_from)
+                                              in_from=in_from,
+                                              callback=callback)
 
     def search_one_media(self, media_info,
                          in_from: SearchType,
                          no_exists: dict,
                          sites: list = None,
                          filters: dict = None,
-                         user_name=None):
+                         user_name=None,
+                         callback=None):
         """
         只搜索和下载一个资源，用于精确搜索下载，由微信、Telegram或豆瓣调用
         :param media_info: 已识别的媒体信息
@@ -79,6 +83,7 @@ class Searcher:
         :param sites: 搜索哪些站点
         :param filters: 过滤条件，为空则不过滤
         :param user_name: 用户名
+        :param callback: 每个站点搜索完成时的回调，参数为站点和该站点过滤后的结果
         :return: 请求的资源是否全部下载完整，如完整则返回媒体信息
                  请求的资源如果是剧集则返回下载后仍然缺失的季集信息
                  搜索到的结果数量
@@ -145,7 +150,8 @@ class Searcher:
         media_list = self.search_medias(key_word=first_search_name,
                                         filter_args=filter_args,
                                         match_media=media_info,
-                                        in_from=in_from)
+                                        in_from=in_from,
+                                        callback=callback)
         # 使用名称重新搜索
         if len(media_list) == 0 \
                 and second_search_name \
@@ -154,7 +160,8 @@ class Searcher:
             media_list = self.search_medias(key_word=second_search_name,
                                             filter_args=filter_args,
                                             match_media=media_info,
-                                            in_from=in_from)
+                                            in_from=in_from,
+                                            callback=callback)
 
         if len(media_list) == 0:
             log.info("【Searcher】%s 未搜索到任何资源" % second_search_name)
@@ -220,4 +227,13 @@ class Searcher:
         :param title: 搜索标题
         :param ident_flag: 是否标识
         """
-        self.dbhelper.insert_search_results(media_items, title, ident_flag)
\ No newline at end of file
+        self.dbhelper.insert_search_results(media_items, title, ident_flag)
+
+    def replace_search_results(self, media_items: list, title=None, ident_flag=True):
+        """
+        清空并重新插入搜索结果
+        :param media_items: 搜索结果
+        :param title: 搜索标题
+        :param ident_flag: 是否标识
+        """
+        self.dbhelper.replace_search_results(media_items, title, ident_flag)
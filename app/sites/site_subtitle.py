@@ -92,7 +92,7 @@ class SiteSubtitle:
                         # 解压文件
                         shutil.unpack_archive(zip_file, zip_path, format='zip')
                         # 遍历转移文件
-                        for sub_file in PathUtils.get_dir_files(in_path=zip_path, exts=RMT_SUBEXT):
+                        for sub_file in PathUtils.iter_dir_files(in_path=zip_path, exts=RMT_SUBEXT):
                             target_sub_file = os.path.join(download_dir,
                                                            os.path.splitext(os.path.basename(sub_file))[0])
                             log.info(f"【Sites】转移字幕 {sub_file} 到 {target_sub_file}")
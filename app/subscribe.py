@@ -1,4 +1,8 @@
+import datetime
+import heapq
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 
 import log
@@ -13,13 +17,16 @@ from app.message import Message
 from app.plugins import EventManager
 from app.searcher import Searcher
 from app.sites import Sites
-from app.utils import Torrent
+from app.utils import Torrent, ExceptionUtils
 from app.utils.commons import singleton
 from app.utils.types import MediaType, SearchType, EventType, SystemConfigKey, RssType
 from web.backend.web_utils import WebUtils
-from config import Config
+from config import Config, SUBSCRIBE_SEARCH_WORKERS, SUBSCRIBE_SEARCH_SITE_BUDGET, SUBSCRIBE_SEARCH_SKIP_INTERVAL, \
+    SUBSCRIBE_SEARCH_RECENT_DAYS
 
 lock = Lock()
+# 订阅搜索线程池，各订阅的站点搜索仍提交到索引器共用的线程池
+_subscribe_executor = ThreadPoolExecutor(max_workers=SUBSCRIBE_SEARCH_WORKERS, thread_name_prefix="SubscribeSearch")
 
 
 @singleton
@@ -35,8 +42,19 @@ class Subscribe:
     filter = None
     eventmanager = None
     indexer = None
+    _search_queue = None
+    _search_keys = None
+    _search_seq = 0
+    _search_workers = 0
+    _site_budgets = None
 
     def __init__(self):
+        # 待搜索的订阅，按优先级排列的堆
+        self._search_queue = []
+        # 在队列中或正在搜索的订阅
+        self._search_keys = set()
+        # 本轮搜索各站点剩余的配额
+        self._site_budgets = {}
         self.init_config()
 
     def init_config(self):
@@ -464,8 +482,8 @@ class Subscribe:
                 "poster": note_info.get("poster"),
                 "release_date": note_info.get("release_date"),
                 "vote": note_info.get("vote"),
-                "keyword": keyword
-
+                "keyword": keyword,
+                "last_search": rss_movie.LAST_SEARCH
             }
         return ret_dict
 
@@ -544,7 +562,8 @@ class Subscribe:
                 "poster": note_info.get("poster"),
                 "release_date": note_info.get("release_date"),
                 "vote": note_info.get("vote"),
-                "keyword": keyword
+                "keyword": keyword,
+                "last_search": rss_tv.LAST_SEARCH
             }
         return ret_dict
 
@@ -683,15 +702,118 @@ class Subscribe:
     def subscribe_search(self, state="D"):
         """
         RSS订阅队列中状态的任务处理，先进行存量资源搜索，缺失的才标志为RSS状态，由定时服务调用
+        订阅按优先级加入搜索队列，由线程池并发搜索，不等待搜索完成
+        """
+        rss_infos = [(MediaType.MOVIE, rss_info) for rss_info in self.get_subscribe_movies(state=state).values()] \
+            + [(MediaType.TV, rss_info) for rss_info in self.get_subscribe_tvs(state=state).values()]
+        # 定时搜索全部订阅时，近期已搜索过的不再搜索
+        skip_time = None
+        if state == "R":
+            skip_time = time.strftime('%Y-%m-%d %H:%M:%S',
+                                      time.localtime(time.time() - SUBSCRIBE_SEARCH_SKIP_INTERVAL))
+        add_count = 0
+        with lock:
+            # 队列已处理完，开始新一轮搜索，重置站点配额
+            if not self._search_queue and not self._search_workers:
+                self._site_budgets = {}
+            for mtype, rss_info in rss_infos:
+                # 跳过模糊匹配的
+                if rss_info.get("fuzzy_match"):
+                    continue
+                # 已在队列中或正在搜索
+                key = (mtype, rss_info.get("id"))
+                if key in self._search_keys:
+                    continue
+                if skip_time and (rss_info.get("last_search") or "") > skip_time:
+                    continue
+                self._search_seq += 1
+                heapq.heappush(self._search_queue,
+                               (self.__get_search_priority(rss_info), self._search_seq, mtype, rss_info))
+                self._search_keys.add(key)
+                add_count += 1
+            # 启动处理队列的线程，不超过SUBSCRIBE_SEARCH_WORKERS个
+            for _ in range(min(SUBSCRIBE_SEARCH_WORKERS, len(self._search_queue)) - self._search_workers):
+                self._search_workers += 1
+                _subscribe_executor.submit(self.__search_worker)
+            queue_count = len(self._search_queue)
+        if add_count:
+            log.info("【Subscribe】%s 个订阅加入搜索队列，队列中共有 %s 个订阅待搜索" % (add_count, queue_count))
+
+    @staticmethod
+    def __get_search_priority(rss_info):
+        """
+        订阅搜索的优先级，越小越先搜索：新增的订阅最先，其次为近期上映/播出的，尚未上映/播出的最后，
+        同一组内按上次搜索时间从早到晚、上映/播出日期从近到远
         """
         try:
-            lock.acquire()
-            # 处理电影
-            self.subscribe_search_movie(state=state)
-            # 处理电视剧
-            self.subscribe_search_tv(state=state)
-        finally:
-            lock.release()
+            air_date = datetime.datetime.strptime(rss_info.get("release_date"), "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            air_date = None
+        today = datetime.date.today()
+        if not air_date:
+            air_group = 1
+        elif air_date > today:
+            air_group = 2
+        elif (today - air_date).days <= SUBSCRIBE_SEARCH_RECENT_DAYS:
+            air_group = 0
+        else:
+            air_group = 1
+        return (0 if rss_info.get("state") == "D" else 1,
+                air_group,
+                rss_info.get("last_search") or "",
+                -air_date.toordinal() if air_date else 0)
+
+    def __search_worker(self):
+        """
+        依次取出队列中优先级最高的订阅进行搜索，队列为空时退出
+        """
+        while True:
+            with lock:
+                if not self._search_queue:
+                    self._search_workers -= 1
+                    if not self._search_workers:
+                        log.info("【Subscribe】订阅搜索队列已处理完成")
+                    return
+                _, _, mtype, rss_info = heapq.heappop(self._search_queue)
+            rssid = rss_info.get("id")
+            try:
+                # 重新读取订阅，排队期间可能已被删除或修改
+                if mtype == MediaType.MOVIE:
+                    rss_info = self.get_subscribe_movies(rid=rssid).get(str(rssid))
+                else:
+                    rss_info = self.get_subscribe_tvs(rid=rssid).get(str(rssid))
+                if not rss_info:
+                    continue
+                sites = self.__acquire_site_budget(rss_info)
+                if sites is None:
+                    log.info("【Subscribe】%s 的搜索站点本轮配额已用完，顺延到下一轮搜索" % rss_info.get("name"))
+                    continue
+                if mtype == MediaType.MOVIE:
+                    self.__search_movie_subscribe(rss_info=rss_info, sites=sites)
+                else:
+                    self.__search_tv_subscribe(rss_info=rss_info, sites=sites)
+            except Exception as e:
+                ExceptionUtils.exception_traceback(e)
+            finally:
+                with lock:
+                    self._search_keys.discard((mtype, rssid))
+
+    def __acquire_site_budget(self, rss_info):
+        """
+        扣减订阅搜索站点的本轮配额，返回仍有配额的站点，均已用完时返回None，新增的订阅不受配额限制
+        """
+        sites = rss_info.get("search_sites") or self.indexer.get_user_indexer_names()
+        if not sites:
+            return []
+        with lock:
+            if rss_info.get("state") != "D":
+                sites = [site for site in sites
+                         if self._site_budgets.get(site, SUBSCRIBE_SEARCH_SITE_BUDGET) > 0]
+            if not sites:
+                return None
+            for site in sites:
+                self._site_budgets[site] = self._site_budgets.get(site, SUBSCRIBE_SEARCH_SITE_BUDGET) - 1
+        return sites
 
     def subscribe_search_movie(self, rssid=None, state='D'):
         """
@@ -709,75 +831,85 @@ class Subscribe:
             # 跳过模糊匹配的
             if rss_info.get("fuzzy_match"):
                 continue
-            # 搜索站点范围
-            rssid = rss_info.get("id")
-            name = rss_info.get("name")
-            year = rss_info.get("year") or ""
-            tmdbid = rss_info.get("tmdbid")
-            over_edition = rss_info.get("over_edition")
-            keyword = rss_info.get("keyword")
+            self.__search_movie_subscribe(rss_info=rss_info)
 
-            # 开始搜索
-            self.dbhelper.update_rss_movie_state(rssid=rssid, state='S')
+    def __search_movie_subscribe(self, rss_info, sites=None):
+        """
+        搜索单个电影订阅
+        :param rss_info: 订阅信息
+        :param sites: 搜索的站点，为None时使用订阅设置的搜索站点
+        """
+        # 搜索站点范围
+        rssid = rss_info.get("id")
+        name = rss_info.get("name")
+        year = rss_info.get("year") or ""
+        tmdbid = rss_info.get("tmdbid")
+        over_edition = rss_info.get("over_edition")
+        keyword = rss_info.get("keyword")
+        if sites is None:
+            sites = rss_info.get("search_sites")
 
-            try:
-                # 识别
-                media_info = self.__get_media_info(tmdbid, name, year, MediaType.MOVIE)
-                # 未识别到媒体信息
-                if not media_info or not media_info.tmdb_info:
-                    self.dbhelper.update_rss_movie_state(rssid=rssid, state='R')
-                    continue
-                media_info.set_download_info(download_setting=rss_info.get("download_setting"),
-                                             save_path=rss_info.get("save_path"))
-                # 自定义搜索词
-                media_info.keyword = keyword
-                # 非洗版的情况检查是否存在
-                if not over_edition:
-                    # 检查是否存在
-                    exist_flag, no_exists, _ = self.downloader.check_exists_medias(meta_info=media_info)
-                    # 已经存在
-                    if exist_flag:
-                        log.info("【Subscribe】电影 %s 已存在" % media_info.get_title_string())
-                        self.finish_rss_subscribe(rssid=rssid, media=media_info)
-                        continue
-                else:
-                    # 洗版时按缺失来下载
-                    no_exists = {}
-                    # 把洗版标志加入搜索
-                    media_info.over_edition = over_edition
-                    # 将当前的优先级传入搜索
-                    media_info.res_order = self.dbhelper.get_rss_overedition_order(rtype=media_info.type,
-                                                                                   rssid=rssid)
-                # 开始搜索
-                filter_dict = {
-                    "restype": rss_info.get('filter_restype'),
-                    "pix": rss_info.get('filter_pix'),
-                    "team": rss_info.get('filter_team'),
-                    "rule": rss_info.get('filter_rule'),
-                    "include": rss_info.get('filter_include'),
-                    "exclude": rss_info.get('filter_exclude'),
-                    "site": rss_info.get("search_sites")
-                }
-                search_result, _, _, _ = self.searcher.search_one_media(
-                    media_info=media_info,
-                    in_from=SearchType.RSS,
-                    no_exists=no_exists,
-                    sites=rss_info.get("search_sites"),
-                    filters=filter_dict)
-                if search_result:
-                    # 洗版
-                    if over_edition:
-                        self.update_subscribe_over_edition(rtype=search_result.type,
-                                                           rssid=rssid,
-                                                           media=search_result)
-                    else:
-                        self.finish_rss_subscribe(rssid=rssid, media=media_info)
+        # 开始搜索
+        self.dbhelper.update_rss_movie_state(rssid=rssid, state='S')
+        self.dbhelper.update_rss_movie_last_search(rssid=rssid)
+
+        try:
+            # 识别
+            media_info = self.__get_media_info(tmdbid, name, year, MediaType.MOVIE)
+            # 未识别到媒体信息
+            if not media_info or not media_info.tmdb_info:
+                self.dbhelper.update_rss_movie_state(rssid=rssid, state='R')
+                return
+            media_info.set_download_info(download_setting=rss_info.get("download_setting"),
+                                         save_path=rss_info.get("save_path"))
+            # 自定义搜索词
+            media_info.keyword = keyword
+            # 非洗版的情况检查是否存在
+            if not over_edition:
+                # 检查是否存在
+                exist_flag, no_exists, _ = self.downloader.check_exists_medias(meta_info=media_info)
+                # 已经存在
+                if exist_flag:
+                    log.info("【Subscribe】电影 %s 已存在" % media_info.get_title_string())
+                    self.finish_rss_subscribe(rssid=rssid, media=media_info)
+                    return
+            else:
+                # 洗版时按缺失来下载
+                no_exists = {}
+                # 把洗版标志加入搜索
+                media_info.over_edition = over_edition
+                # 将当前的优先级传入搜索
+                media_info.res_order = self.dbhelper.get_rss_overedition_order(rtype=media_info.type,
+                                                                               rssid=rssid)
+            # 开始搜索
+            filter_dict = {
+                "restype": rss_info.get('filter_restype'),
+                "pix": rss_info.get('filter_pix'),
+                "team": rss_info.get('filter_team'),
+                "rule": rss_info.get('filter_rule'),
+                "include": rss_info.get('filter_include'),
+                "exclude": rss_info.get('filter_exclude'),
+                "site": sites
+            }
+            search_result, _, _, _ = self.searcher.search_one_media(
+                media_info=media_info,
+                in_from=SearchType.RSS,
+                no_exists=no_exists,
+                sites=sites,
+                filters=filter_dict)
+            if search_result:
+                # 洗版
+                if over_edition:
+                    self.update_subscribe_over_edition(rtype=search_result.type,
+                                                       rssid=rssid,
+                                                       media=search_result)
                 else:
-                    self.dbhelper.update_rss_movie_state(rssid=rssid, state='R')
-            except Exception as err:
+                    self.finish_rss_subscribe(rssid=rssid, media=media_info)
+            else:
                 self.dbhelper.update_rss_movie_state(rssid=rssid, state='R')
-                log.error(f"【Subscribe】电影 {name} 订阅搜索失败：{str(err)}")
-                continue
+        except Exception as err:
+            self.dbhelper.update_rss_movie_state(rssid=rssid, state='R')
+            log.error(f"【Subscribe】电影 {name} 订阅搜索失败：{str(err)}")
 
     def subscribe_search_tv(self, rssid=None, state="D"):
         """
@@ -791,132 +923,135 @@ class Subscribe:
             rss_tvs = self.get_subscribe_tvs(state=state)
         if rss_tvs:
             log.info("【Subscribe】共有 %s 个电视剧订阅需要检索" % len(rss_tvs))
-        rss_no_exists = {}
         for rid, rss_info in rss_tvs.items():
             # 跳过模糊匹配的
             if rss_info.get("fuzzy_match"):
                 continue
-            rssid = rss_info.get("id")
-            name = rss_info.get("name")
-            year = rss_info.get("year") or ""
-            tmdbid = rss_info.get("tmdbid")
-            over_edition = rss_info.get("over_edition")
-            keyword = rss_info.get("keyword")
+            self.__search_tv_subscribe(rss_info=rss_info)
 
-            # 开始搜索
-            self.dbhelper.update_rss_tv_state(rssid=rssid, state='S')
+    def __search_tv_subscribe(self, rss_info, sites=None):
+        """
+        检索单个电视剧订阅
+        :param rss_info: 订阅信息
+        :param sites: 搜索的站点，为None时使用订阅设置的搜索站点
+        """
+        rssid = rss_info.get("id")
+        name = rss_info.get("name")
+        year = rss_info.get("year") or ""
+        tmdbid = rss_info.get("tmdbid")
+        over_edition = rss_info.get("over_edition")
+        keyword = rss_info.get("keyword")
+        if sites is None:
+            sites = rss_info.get("search_sites")
 
-            try:
-                # 识别
-                media_info = self.__get_media_info(tmdbid, name, year, MediaType.TV)
-                # 未识别到媒体信息
-                if not media_info or not media_info.tmdb_info:
-                    self.dbhelper.update_rss_tv_state(rssid=rssid, state='R')
-                    continue
-                # 取下载设置
-                media_info.set_download_info(download_setting=rss_info.get("download_setting"),
-                                             save_path=rss_info.get("save_path"))
-                # 从登记薄中获取缺失剧集
-                season = 1
-                if rss_info.get("season"):
-                    season = int(str(rss_info.get("season")).replace("S", ""))
-                # 订阅季
-                media_info.begin_season = season
-                # 订阅ID
-                media_info.rssid = rssid
-                # 自定义集数
-                total_ep = rss_info.get("total")
-                current_ep = rss_info.get("current_ep")
-                # 自定义搜索词
-                media_info.keyword = keyword
-                # 表中记录的剩余订阅集数
-                episodes = self.get_subscribe_tv_episodes(rss_info.get("id"))
-                if episodes is None:
-                    episodes = []
-                    if current_ep:
-                        episodes = list(range(current_ep, total_ep + 1))
-                    rss_no_exists[media_info.tmdb_id] = [
-                        {
-                            "season": season,
-                            "episodes": episodes,
-                            "total_episodes": total_ep
-                        }
-                    ]
-                else:
-                    rss_no_exists[media_info.tmdb_id] = [
-                        {
-                            "season": season,
-                            "episodes": episodes,
-                            "total_episodes": total_ep
-                        }
-                    ]
-                # 非洗版时检查本地媒体库情况
-                if not over_edition:
-                    exist_flag, library_no_exists, _ = self.downloader.check_exists_medias(
-                        meta_info=media_info,
-                        total_ep={season: total_ep})
-                    # 当前剧集已存在，跳过
-                    if exist_flag:
-                        # 已全部存在
-                        if not library_no_exists \
-                                or not library_no_exists.get(media_info.tmdb_id):
-                            log.info("【Subscribe】电视剧 %s 订阅剧集已全部存在" % (
-                                media_info.get_title_string()))
-                            # 完成订阅
-                            self.finish_rss_subscribe(rssid=rss_info.get("id"),
-                                                      media=media_info)
-                        continue
-                    # 取交集做为缺失集
-                    rss_no_exists = Torrent.get_intersection_episodes(target=rss_no_exists,
-                                                                      source=library_no_exists,
-                                                                      title=media_info.tmdb_id)
-                    if rss_no_exists.get(media_info.tmdb_id):
-                        log.info("【Subscribe】%s 订阅缺失季集：%s" % (
-                            media_info.get_title_string(),
-                            rss_no_exists.get(media_info.tmdb_id)
-                        ))
-                else:
-                    # 把洗版标志加入检索
-                    media_info.over_edition = over_edition
-                    # 将当前的优先级传入检索
-                    media_info.res_order = self.dbhelper.get_rss_overedition_order(rtype=MediaType.TV,
-                                                                                   rssid=rssid)
-                # 开始检索
-                filter_dict = {
-                    "restype": rss_info.get('filter_restype'),
-                    "pix": rss_info.get('filter_pix'),
-                    "team": rss_info.get('filter_team'),
-                    "rule": rss_info.get('filter_rule'),
-                    "include": rss_info.get('filter_include'),
-                    "exclude": rss_info.get('filter_exclude'),
-                    "site": rss_info.get("search_sites")
-                }
-                search_result, no_exists, _, _ = self.searcher.search_one_media(
-                    media_info=media_info,
-                    in_from=SearchType.RSS,
-                    no_exists=rss_no_exists,
-                    sites=rss_info.get("search_sites"),
-                    filters=filter_dict)
-                if search_result \
-                        or not no_exists \
-                        or not no_exists.get(media_info.tmdb_id):
-                    # 洗版
-                    if over_edition:
-                        self.update_subscribe_over_edition(rtype=media_info.type,
-                                                           rssid=rssid,
-                                                           media=search_result)
-                    else:
-                        # 完成订阅
-                        self.finish_rss_subscribe(rssid=rssid, media=media_info)
-                elif no_exists:
-                    # 更新状态
-                    self.update_subscribe_tv_lack(rssid=rssid,
-                                                  media_info=media_info,
-                                                  seasoninfo=no_exists.get(media_info.tmdb_id))
-            except Exception as err:
-                log.error(f"【Subscribe】电视剧 {name} 订阅搜索失败：{str(err)}")
+        # 开始搜索
+        self.dbhelper.update_rss_tv_state(rssid=rssid, state='S')
+        self.dbhelper.update_rss_tv_last_search(rssid=rssid)
+
+        try:
+            # 识别
+            media_info = self.__get_media_info(tmdbid, name, year, MediaType.TV)
+            # 未识别到媒体信息
+            if not media_info or not media_info.tmdb_info:
                 self.dbhelper.update_rss_tv_state(rssid=rssid, state='R')
-                continue
+                return
+            # 取下载设置
+            media_info.set_download_info(download_setting=rss_info.get("download_setting"),
+                                         save_path=rss_info.get("save_path"))
+            # 从登记薄中获取缺失剧集
+            season = 1
+            if rss_info.get("season"):
+                season = int(str(rss_info.get("season")).replace("S", ""))
+            # 订阅季
+            media_info.begin_season = season
+            # 订阅ID
+            media_info.rssid = rssid
+            # 自定义集数
+            total_ep = rss_info.get("total")
+            current_ep = rss_info.get("current_ep")
+            # 自定义搜索词
+            media_info.keyword = keyword
+            # 表中记录的剩余订阅集数
+            episodes = self.get_subscribe_tv_episodes(rss_info.get("id"))
+            if episodes is None:
+                episodes = []
+                if current_ep:
+                    episodes = list(range(current_ep, total_ep + 1))
+            rss_no_exists = {
+                media_info.tmdb_id: [
+                    {
+                        "season": season,
+                        "episodes": episodes,
+                        "total_episodes": total_ep
+                    }
+                ]
+            }
+            # 非洗版时检查本地媒体库情况
+            if not over_edition:
+                exist_flag, library_no_exists, _ = self.downloader.check_exists_medias(
+                    meta_info=media_info,
+                    total_ep={season: total_ep})
+                # 当前剧集已存在，跳过
+                if exist_flag:
+                    # 已全部存在
+                    if not library_no_exists \
+                            or not library_no_exists.get(media_info.tmdb_id):
+                        log.info("【Subscribe】电视剧 %s 订阅剧集已全部存在" % (
+                            media_info.get_title_string()))
+                        # 完成订阅
+                        self.finish_rss_subscribe(rssid=rss_info.get("id"),
+                                                  media=media_info)
+                    return
+                # 取交集做为缺失集
+                rss_no_exists = Torrent.get_intersection_episodes(target=rss_no_exists,
+                                                                  source=library_no_exists,
+                                                                  title=media_info.tmdb_id)
+                if rss_no_exists.get(media_info.tmdb_id):
+                    log.info("【Subscribe】%s 订阅缺失季集：%s" % (
+                        media_info.get_title_string(),
+                        rss_no_exists.get(media_info.tmdb_id)
+                    ))
+            else:
+                # 把洗版标志加入检索
+                media_info.over_edition = over_edition
+                # 将当前的优先级传入检索
+                media_info.res_order = self.dbhelper.get_rss_overedition_order(rtype=MediaType.TV,
+                                                                               rssid=rssid)
+            # 开始检索
+            filter_dict = {
+                "restype": rss_info.get('filter_restype'),
+                "pix": rss_info.get('filter_pix'),
+                "team": rss_info.get('filter_team'),
+                "rule": rss_info.get('filter_rule'),
+                "include": rss_info.get('filter_include'),
+                "exclude": rss_info.get('filter_exclude'),
+                "site": sites
+            }
+            search_result, no_exists, _, _ = self.searcher.search_one_media(
+                media_info=media_info,
+                in_from=SearchType.RSS,
+                no_exists=rss_no_exists,
+                sites=sites,
+                filters=filter_dict)
+            if search_result \
+                    or not no_exists \
+                    or not no_exists.get(media_info.tmdb_id):
+                # 洗版
+                if over_edition:
+                    self.update_subscribe_over_edition(rtype=media_info.type,
+                                                       rssid=rssid,
+                                                       media=search_result)
+                else:
+                    # 完成订阅
+                    self.finish_rss_subscribe(rssid=rssid, media=media_info)
+            elif no_exists:
+                # 更新状态
+                self.update_subscribe_tv_lack(rssid=rssid,
+                                              media_info=media_info,
+                                              seasoninfo=no_exists.get(media_info.tmdb_id))
+        except Exception as err:
+            log.error(f"【Subscribe】电视剧 {name} 订阅搜索失败：{str(err)}")
+            self.dbhelper.update_rss_tv_state(rssid=rssid, state='R')
 
     def update_rss_state(self, rtype, rssid, state):
         """
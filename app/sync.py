@@ -1,6 +1,10 @@
 import os
+import pickle
 import threading
+import time
 import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
@@ -8,16 +12,98 @@ from watchdog.observers.polling import PollingObserver
 
 import log
 from app.conf import ModuleConf
-from app.filetransfer import FileTransfer
-from app.helper import DbHelper
+from app.filetransfer import FileTransfer, transfer_limiter
+from app.helper import DbHelper, HardlinkHelper
+from app.media import LibraryIndex
 from app.utils import PathUtils, ExceptionUtils
 from app.utils.commons import singleton
 from app.utils.types import SyncType
-from config import RMT_MEDIAEXT
+from config import RMT_MEDIAEXT, SYNC_DEDUPE_MAX_SIZE, SYNC_DEDUPE_EXPIRE, SYNC_QUIET_SECONDS, \
+    SYNC_TRANSFER_WORKERS, Config
 
 lock = threading.Lock()
 
 
+class SyncedFiles(object):
+    """
+    目录监控已处理文件记录，按(路径, 大小, 修改时间)去重，限制条目数及有效期，定期保存到配置目录
+    """
+
+    def __init__(self, path, maxsize=SYNC_DEDUPE_MAX_SIZE, expire=SYNC_DEDUPE_EXPIRE):
+        self._path = path
+        self._maxsize = maxsize
+        self._expire = expire
+        # 路径 -> (大小, 修改时间, 记录时间)，按记录时间先后排列
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.__load()
+
+    def __load(self):
+        if not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, 'rb') as f:
+                files = pickle.load(f)
+            if isinstance(files, OrderedDict):
+                self._files = files
+                self.__prune(time.time())
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+
+    def __prune(self, now):
+        """
+        清理过期及超出数量的记录，记录按时间排列，只需检查头部
+        """
+        while self._files:
+            path, (_, _, seen_time) = next(iter(self._files.items()))
+            if len(self._files) <= self._maxsize and now - seen_time < self._expire:
+                break
+            self._files.popitem(last=False)
+            self._dirty = True
+
+    def check_and_add(self, path):
+        """
+        检查文件是否已处理过，未处理过则登记
+        :return: 未处理过返回True
+        """
+        try:
+            file_stat = os.stat(path)
+            signature = (file_stat.st_size, file_stat.st_mtime_ns)
+        except OSError:
+            signature = (None, None)
+        now = time.time()
+        with self._lock:
+            seen = self._files.get(path)
+            if seen and seen[:2] == signature and now - seen[2] < self._expire:
+                return False
+            self._files[path] = (*signature, now)
+            self._files.move_to_end(path)
+            self._dirty = True
+            self.__prune(now)
+            return True
+
+    def save(self):
+        """
+        有变化时保存记录
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            files = OrderedDict(self._files)
+            self._dirty = False
+        try:
+            tmp_path = f"{self._path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(files, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+
+    def __len__(self):
+        return len(self._files)
+
+
 class FileMonitorHandler(FileSystemEventHandler):
     """
     目录监控响应类
@@ -32,8 +118,12 @@ class FileMonitorHandler(FileSystemEventHandler):
         self.sync.file_change_handler(event, "创建", event.src_path)
 
     def on_moved(self, event):
+        self.sync.file_move_handler(event)
         self.sync.file_change_handler(event, "移动", event.dest_path)
 
+    def on_deleted(self, event):
+        self.sync.file_delete_handler(event)
+
     """
     def on_modified(self, event):
         self.sync.file_change_handler(event, "修改", event.src_path)
@@ -44,13 +134,28 @@ class FileMonitorHandler(FileSystemEventHandler):
 class Sync(object):
     filetransfer = None
     dbhelper = None
+    hardlinkhelper = None
+    libraryindex = None
 
     _sync_path_confs = {}
     _monitor_sync_path_ids = []
     _observer = []
     _sync_paths = []
-    _synced_files = []
+    _synced_files = None
     _need_sync_paths = {}
+    # 转移线程池，已稳定的任务先按转移槽位排队，槽位有空闲时才提交，避免占用线程等待
+    _executor = ThreadPoolExecutor(max_workers=SYNC_TRANSFER_WORKERS)
+    _dispatch_lock = threading.Lock()
+    _ready_tasks = []
+    # 各转移槽位正在执行的任务数
+    _slot_running = {}
+    # 正在转移的目录
+    _running_paths = set()
+    # 监控事件统计：收到、去重忽略、已分发处理
+    _event_stats = {"seen": 0, "deduped": 0, "dispatched": 0}
+    # 转移统计：提交数、完成数、失败数、累计排队时间及执行时间
+    _dispatch_stats = {"submitted": 0, "finished": 0, "failed": 0, "wait_time": 0, "exec_time": 0}
+    _stats_lock = threading.Lock()
 
     def __init__(self):
         self.init_config()
@@ -58,6 +163,10 @@ class Sync(object):
     def init_config(self):
         self.dbhelper = DbHelper()
         self.filetransfer = FileTransfer()
+        self.hardlinkhelper = HardlinkHelper()
+        self.libraryindex = LibraryIndex()
+        if self._synced_files is None:
+            self._synced_files = SyncedFiles(os.path.join(Config().get_config_path(), "sync_files.dat"))
         self._sync_path_confs = {}
         self._monitor_sync_path_ids = []
         for sync_conf in self.dbhelper.get_config_sync_paths():
@@ -117,6 +226,8 @@ class Sync(object):
                     self._monitor_sync_path_ids.append(sid)
             else:
                 log.error(f"【Sync】{monpath} 目录不存在！")
+        # 同步目录变化时更新硬链接索引
+        self.hardlinkhelper.init_config()
         # 启动监控服务
         self.run_service()
 
@@ -170,22 +281,20 @@ class Sync(object):
         :param text: 事件描述
         :param event_path: 事件文件路径
         """
+        # 媒体库目录索引失效
+        self.libraryindex.invalidate(event_path)
         if not event.is_directory:
             # 文件发生变化
             try:
                 if not os.path.exists(event_path):
                     return
                 log.debug("【Sync】文件%s：%s" % (text, event_path))
+                # 更新硬链接索引
+                self.hardlinkhelper.update_file(event_path)
+                self.__count_event("seen")
                 # 判断是否处理过了
-                need_handler_flag = False
-                try:
-                    lock.acquire()
-                    if event_path not in self._synced_files:
-                        self._synced_files.append(event_path)
-                        need_handler_flag = True
-                finally:
-                    lock.release()
-                if not need_handler_flag:
+                if not self._synced_files.check_and_add(event_path):
+                    self.__count_event("deduped")
                     log.debug("【Sync】文件已处理过：%s" % event_path)
                     return
 
@@ -225,6 +334,7 @@ class Sync(object):
                     log.debug(f"【Sync】{event_path} 是回收站或隐藏的文件，不处理 ...")
                     return
 
+                self.__count_event("dispatched")
                 # 应用的同步配置
                 sync_path_conf = self.get_sync_path_conf(sync_id)
                 mon_path = sync_path_conf.get('from')
@@ -249,81 +359,219 @@ class Sync(object):
                         ext = os.path.splitext(name)[-1]
                         if ext.lower() not in RMT_MEDIAEXT:
                             return
-                    # 监控根目录下的文件发生变化时直接发走
-                    if is_root_path:
-                        ret, ret_msg = self.filetransfer.transfer_media(in_from=SyncType.MON,
-                                                                        in_path=event_path,
-                                                                        target_dir=target_path,
-                                                                        unknown_dir=unknown_path,
-                                                                        rmt_mode=sync_mode)
-                        if not ret:
-                            log.warn("【Sync】%s 转移失败：%s" % (event_path, ret_msg))
-                    else:
-                        try:
-                            lock.acquire()
-                            if self._need_sync_paths.get(from_dir):
-                                files = self._need_sync_paths[from_dir].get('files')
-                                if not files:
-                                    files = [event_path]
-                                else:
-                                    if event_path not in files:
-                                        files.append(event_path)
-                                    else:
-                                        return
-                                self._need_sync_paths[from_dir].update({'files': files})
-                            else:
-                                self._need_sync_paths[from_dir] = {'target': target_path,
-                                                                   'unknown': unknown_path,
-                                                                   'syncmod': sync_mode,
-                                                                   'files': [event_path]}
-                        finally:
-                            lock.release()
+                    # 加入待转移队列，监控根目录下的文件单独转移，其它按上级目录聚合
+                    self.__enqueue(key=event_path if is_root_path else from_dir,
+                                   event_path=event_path,
+                                   is_root_path=is_root_path,
+                                   target_path=target_path,
+                                   unknown_path=unknown_path,
+                                   sync_mode=sync_mode)
             except Exception as e:
                 ExceptionUtils.exception_traceback(e)
                 log.error("【Sync】发生错误：%s - %s" % (str(e), traceback.format_exc()))
 
+    def file_move_handler(self, event):
+        """
+        处理文件移动，移除硬链接索引中的原路径
+        :param event: 事件
+        """
+        self.libraryindex.invalidate(event.src_path)
+        if not event.is_directory:
+            self.hardlinkhelper.remove_file(event.src_path)
+
+    def file_delete_handler(self, event):
+        """
+        处理文件删除，移除硬链接索引中的路径
+        :param event: 事件
+        """
+        self.libraryindex.invalidate(event.src_path)
+        if not event.is_directory:
+            self.hardlinkhelper.remove_file(event.src_path)
+
+    def __count_event(self, name):
+        with self._stats_lock:
+            self._event_stats[name] += 1
+
+    def __enqueue(self, key, event_path, is_root_path, target_path, unknown_path, sync_mode):
+        """
+        登记待转移的文件，同一目录的文件聚合后统一转移
+        """
+        now = time.time()
+        with lock:
+            task = self._need_sync_paths.get(key)
+            if not task:
+                self._need_sync_paths[key] = {'target': target_path,
+                                              'unknown': unknown_path,
+                                              'syncmod': sync_mode,
+                                              'root_file': is_root_path,
+                                              'files': [event_path],
+                                              'sizes': {},
+                                              'first_time': now,
+                                              'last_time': now}
+            elif event_path not in task['files']:
+                task['files'].append(event_path)
+                task['last_time'] = now
+
+    @staticmethod
+    def __get_file_sizes(files):
+        """
+        获取文件大小，文件不存在时为None
+        """
+        sizes = {}
+        for file in files:
+            try:
+                sizes[file] = os.path.getsize(file)
+            except OSError:
+                sizes[file] = None
+        return sizes
+
+    def __check_task(self, path, task):
+        """
+        检查待转移任务的文件状态，涉及磁盘操作，不能在全局锁内调用
+        :return: 任务失效时返回None，否则返回转移参数及文件大小
+        """
+        if PathUtils.is_invalid_path(path) or not os.path.exists(path):
+            return None
+        if task.get('root_file'):
+            src_path, files, is_root_path = path, None, False
+        else:
+            bluray_dir = PathUtils.get_bluray_dir(path)
+            if not bluray_dir:
+                src_path, files = path, task.get('files')
+            else:
+                src_path, files = bluray_dir, []
+            # 判断是否根目录
+            is_root_path = False
+            for sid in self._monitor_sync_path_ids:
+                if os.path.normpath(self.get_sync_path_conf(sid).get("from")) == os.path.normpath(src_path):
+                    is_root_path = True
+        target = task.get('target')
+        slots = transfer_limiter.get_slots(src_path,
+                                           os.path.join(target, os.path.basename(src_path)) if target else None,
+                                           task.get('syncmod'))
+        return dict(task,
+                    src_path=src_path,
+                    files=files,
+                    root_path=is_root_path,
+                    slots=slots), self.__get_file_sizes(task.get('files'))
+
     def transfer_mon_files(self):
         """
-        批量转移文件，由定时服务定期调用执行
+        分发已稳定的待转移任务：最近一段时间没有新事件，且文件大小与上次检查时一致，由定时服务定期调用执行
         """
-        try:
-            lock.acquire()
-            finished_paths = []
-            for path in list(self._need_sync_paths):
-                if not PathUtils.is_invalid_path(path) and os.path.exists(path):
-                    log.info("【Sync】开始转移监控目录文件...")
-                    target_info = self._need_sync_paths.get(path)
-                    bluray_dir = PathUtils.get_bluray_dir(path)
-                    if not bluray_dir:
-                        src_path = path
-                        files = target_info.get('files')
-                    else:
-                        src_path = bluray_dir
-                        files = []
-                    if src_path not in finished_paths:
-                        finished_paths.append(src_path)
-                    else:
-                        continue
-                    target_path = target_info.get('target')
-                    unknown_path = target_info.get('unknown')
-                    sync_mode = target_info.get('syncmod')
-                    # 判断是否根目录
-                    is_root_path = False
-                    for sid in self._monitor_sync_path_ids:
-                        if os.path.normpath(self.get_sync_path_conf(sid).get("from")) == os.path.normpath(src_path):
-                            is_root_path = True
-                    ret, ret_msg = self.filetransfer.transfer_media(in_from=SyncType.MON,
-                                                                    in_path=src_path,
-                                                                    files=files,
-                                                                    target_dir=target_path,
-                                                                    unknown_dir=unknown_path,
-                                                                    rmt_mode=sync_mode,
-                                                                    root_path=is_root_path)
-                    if not ret:
-                        log.warn("【Sync】%s转移失败：%s" % (path, ret_msg))
+        now = time.time()
+        with lock:
+            candidates = [(path, dict(task, files=list(task.get('files'))))
+                          for path, task in self._need_sync_paths.items()
+                          if now - task.get('last_time') >= SYNC_QUIET_SECONDS]
+        # 文件状态检查不占用全局锁，避免阻塞事件接收
+        checked = [(path, task, self.__check_task(path, task)) for path, task in candidates]
+        tasks = []
+        with lock:
+            for path, snapshot, result in checked:
+                task = self._need_sync_paths.get(path)
+                # 检查期间有新事件的，下次再检查
+                if not task or task.get('last_time') != snapshot.get('last_time'):
+                    continue
+                if not result:
+                    self._need_sync_paths.pop(path)
+                    continue
+                transfer_task, sizes = result
+                stable = sizes == task.get('sizes')
+                task['sizes'] = sizes
+                # 同一目录正在转移时等待其完成
+                src_path = transfer_task.get('src_path')
+                if not stable or src_path in self._running_paths:
+                    continue
                 self._need_sync_paths.pop(path)
+                self._running_paths.add(src_path)
+                tasks.append(transfer_task)
+            queue_depth = len(self._need_sync_paths)
+        if tasks:
+            log.info(f"【Sync】开始转移监控目录文件，本次 {len(tasks)} 个任务，队列中剩余 {queue_depth} 个")
+            with self._dispatch_lock:
+                self._ready_tasks.extend(tasks)
+            self.__dispatch()
+        # 保存已处理文件记录
+        self._synced_files.save()
+
+    def __dispatch(self):
+        """
+        按转移槽位提交任务到线程池，槽位已满的任务继续排队，在同槽位任务完成后再提交
+        """
+        submit_tasks = []
+        with self._dispatch_lock:
+            for task in list(self._ready_tasks):
+                slots = task.get('slots')
+                if any(self._slot_running.get(key, 0) >= concurrency for key, concurrency in slots):
+                    continue
+                for key, _ in slots:
+                    self._slot_running[key] = self._slot_running.get(key, 0) + 1
+                self._ready_tasks.remove(task)
+                submit_tasks.append(task)
+        for task in submit_tasks:
+            with self._stats_lock:
+                self._dispatch_stats["submitted"] += 1
+            self._executor.submit(self.__run_transfer, task)
+
+    def __run_transfer(self, task):
+        """
+        执行转移任务，完成后释放槽位并提交排队中的任务
+        """
+        src_path = task.get('src_path')
+        try:
+            start_time = time.time()
+            ret, ret_msg = self.filetransfer.transfer_media(in_from=SyncType.MON,
+                                                            in_path=src_path,
+                                                            files=task.get('files'),
+                                                            target_dir=task.get('target'),
+                                                            unknown_dir=task.get('unknown'),
+                                                            rmt_mode=task.get('syncmod'),
+                                                            root_path=task.get('root_path'))
+            end_time = time.time()
+            with self._stats_lock:
+                self._dispatch_stats["finished"] += 1
+                if not ret:
+                    self._dispatch_stats["failed"] += 1
+                self._dispatch_stats["wait_time"] += start_time - task.get('first_time')
+                self._dispatch_stats["exec_time"] += end_time - start_time
+            if not ret:
+                log.warn("【Sync】%s 转移失败：%s" % (src_path, ret_msg))
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            log.error("【Sync】%s 转移出错：%s" % (src_path, str(e)))
         finally:
-            lock.release()
+            with self._dispatch_lock:
+                for key, _ in task.get('slots'):
+                    self._slot_running[key] -= 1
+            with lock:
+                self._running_paths.discard(src_path)
+            self.__dispatch()
+
+    def get_monitor_stats(self):
+        """
+        获取目录监控事件及转移队列统计
+        """
+        with lock:
+            queue_depth = len(self._need_sync_paths)
+            running = len(self._running_paths)
+        with self._dispatch_lock:
+            ready = len(self._ready_tasks)
+        with self._stats_lock:
+            event_stats = dict(self._event_stats)
+            dispatch_stats = dict(self._dispatch_stats)
+        finished = dispatch_stats.pop("finished")
+        wait_time = dispatch_stats.pop("wait_time")
+        exec_time = dispatch_stats.pop("exec_time")
+        return dict(event_stats,
+                    recorded=len(self._synced_files),
+                    queue_depth=queue_depth,
+                    ready=ready,
+                    running=max(running - ready, 0),
+                    finished=finished,
+                    avg_wait_time=round(wait_time / finished, 2) if finished else 0,
+                    avg_exec_time=round(exec_time / finished, 2) if finished else 0,
+                    **dispatch_stats)
 
     def run_service(self):
         """
@@ -372,6 +620,8 @@ class Sync(object):
                 except Exception as e:
                     print(str(e))
         self._observer = []
+        if self._synced_files is not None:
+            self._synced_files.save()
 
     def transfer_sync(self, sid=None):
         """
@@ -392,7 +642,7 @@ class Sync(object):
             sync_mode = ModuleConf.RMT_MODES.get(sync_path_conf.get("syncmod"))
             # 不做识别重命名
             if not rename:
-                for link_file in PathUtils.get_dir_files(mon_path):
+                for link_file in PathUtils.iter_dir_files(mon_path):
                     if '.!qB' in link_file:
                         log.info(f"【Sync】{link_file} 还未下载完毕，不进行同步")
                     else:
@@ -8,45 +8,92 @@ class PathUtils:
         """
         获得目录下的媒体文件列表List ，按后缀、大小、格式过滤
         """
+        return list(PathUtils.iter_dir_files(in_path=in_path,
+                                             exts=exts,
+                                             filesize=filesize,
+                                             episode_format=episode_format))
+
+    @staticmethod
+    def iter_dir_files(in_path, exts="", filesize=0, episode_format=None):
+        """
+        逐个返回目录下的媒体文件，按后缀、大小、格式过滤，结果与get_dir_files一致，
+        遍历时跳过隐藏目录及回收站等不能处理的目录，文件大小使用遍历时取得的信息
+        """
         if not in_path:
-            return []
+            return
         if not os.path.exists(in_path):
-            return []
-        ret_list = []
+            return
         if os.path.isdir(in_path):
-            for root, dirs, files in os.walk(in_path):
-                for file in files:
-                    cur_path = os.path.join(root, file)
-                    # 检查路径是否合法
-                    if PathUtils.is_invalid_path(cur_path):
-                        continue
-                    # 检查格式匹配
-                    if episode_format and not episode_format.match(file):
-                        continue
-                    # 检查后缀
-                    if exts and os.path.splitext(file)[-1].lower() not in exts:
-                        continue
-                    # 检查文件大小
-                    if filesize and os.path.getsize(cur_path) < filesize:
-                        continue
-                    # 命中
-                    if cur_path not in ret_list:
-                        ret_list.append(cur_path)
+            # 根目录本身不能处理时，其下所有文件都不能处理
+            if PathUtils.is_invalid_path(os.path.join(in_path, "")):
+                return
+            stack = [in_path]
+            while stack:
+                root = stack.pop()
+                sub_dirs = []
+                try:
+                    with os.scandir(root) as entries:
+                        for entry in entries:
+                            file = entry.name
+                            if entry.is_dir():
+                                # 与os.walk一致，不进入链接的目录
+                                if not entry.is_symlink() and not PathUtils.__is_invalid_name(file, is_dir=True):
+                                    sub_dirs.append(entry.path)
+                                continue
+                            # 检查路径是否合法
+                            if PathUtils.__is_invalid_name(file):
+                                continue
+                            # 检查格式匹配
+                            if episode_format and not episode_format.match(file):
+                                continue
+                            # 检查后缀
+                            if exts and os.path.splitext(file)[-1].lower() not in exts:
+                                continue
+                            # 检查文件大小
+                            if filesize:
+                                try:
+                                    if entry.stat().st_size < filesize:
+                                        continue
+                                except OSError:
+                                    continue
+                            # 命中
+                            yield entry.path
+                except OSError:
+                    continue
+                # 按目录顺序深度优先遍历
+                stack += reversed(sub_dirs)
         else:
             # 检查路径是否合法
             if PathUtils.is_invalid_path(in_path):
-                return []
+                return
             # 检查后缀
             if exts and os.path.splitext(in_path)[-1].lower() not in exts:
-                return []
+                return
             # 检查格式
             if episode_format and not episode_format.match(os.path.basename(in_path)):
-                return []
+                return
             # 检查文件大小
             if filesize and os.path.getsize(in_path) < filesize:
-                return []
-            ret_list.append(in_path)
-        return ret_list
+                return
+            yield in_path
+
+    @staticmethod
+    def has_dir_files(in_path, exts=""):
+        """
+        判断目录下是否有指定后缀的文件，找到第一个即返回
+        """
+        return next(PathUtils.iter_dir_files(in_path=in_path, exts=exts), None) is not None
+
+    @staticmethod
+    def __is_invalid_name(name, is_dir=False):
+        """
+        判断目录或文件名是否不能处理，与is_invalid_path的规则一致
+        """
+        if name.startswith('.') or name.startswith('@eaDir'):
+            return True
+        if is_dir and name in ['@Recycle', '#recycle']:
+            return True
+        return False
 
     @staticmethod
     def get_dir_level1_files(in_path, exts=""):
@@ -1,4 +1,5 @@
 import datetime
+import errno
 import os
 import platform
 import shutil
@@ -9,7 +10,7 @@ import psutil
 from app.utils.exception_utils import ExceptionUtils
 from app.utils.path_utils import PathUtils
 from app.utils.types import OsType
-from config import Config, WEBDRIVER_PATH
+from config import Config, WEBDRIVER_PATH, COPY_CHUNK_SIZE, COPY_RESUME_CHECK_SIZE, COPY_TMP_SUFFIX
 from math import ceil
 
 class SystemUtils:
@@ -128,32 +129,139 @@ class SystemUtils:
         return download_webdriver_path
 
     @staticmethod
-    def copy(src, dest):
+    def copy(src, dest, progress_callback=None, verify=False):
         """
-        复制
+        复制，先写入目标目录下的临时文件，完成后再重命名，中断后再次复制时从已写入的位置继续
+        :param progress_callback: 进度回调，参数为已复制字节数、总字节数
+        :param verify: 复制完成后是否校验内容
         """
         try:
-            shutil.copy2(os.path.normpath(src), os.path.normpath(dest))
+            SystemUtils.__copy_file(os.path.normpath(src), os.path.normpath(dest), progress_callback, verify)
             return 0, ""
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
             return -1, str(err)
 
     @staticmethod
-    def move(src, dest):
+    def move(src, dest, progress_callback=None, verify=False):
         """
-        移动
+        移动，同一设备内直接重命名，跨设备时先复制再删除源文件
         """
         try:
-            tmp_file = os.path.normpath(os.path.join(os.path.dirname(src),
-                                                     os.path.basename(dest)))
-            shutil.move(os.path.normpath(src), tmp_file)
-            shutil.move(tmp_file, os.path.normpath(dest))
+            src = os.path.normpath(src)
+            dest = os.path.normpath(dest)
+            if os.stat(src).st_dev == os.stat(os.path.dirname(dest)).st_dev:
+                shutil.move(src, dest)
+            else:
+                SystemUtils.__copy_file(src, dest, progress_callback, verify)
+                os.remove(src)
             return 0, ""
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
             return -1, str(err)
 
+    @staticmethod
+    def __copy_file(src, dest, progress_callback=None, verify=False):
+        """
+        复制文件：优先尝试reflink，其次copy_file_range/sendfile在内核中复制，都不支持时按块读写
+        """
+        total = os.path.getsize(src)
+        tmp_file = f"{dest}{COPY_TMP_SUFFIX}"
+        with open(src, 'rb', buffering=0) as src_f, \
+                open(tmp_file, 'r+b' if os.path.exists(tmp_file) else 'wb', buffering=0) as dst_f:
+            offset = SystemUtils.__get_resume_offset(src_f, dst_f, total)
+            dst_f.truncate(offset)
+            if offset == 0 and SystemUtils.__reflink(src_f, dst_f):
+                offset = total
+            kernel_copy = True
+            while offset < total:
+                count = min(COPY_CHUNK_SIZE, total - offset)
+                copied = 0
+                if kernel_copy:
+                    copied = SystemUtils.__kernel_copy(src_f, dst_f, offset, count)
+                    if copied is None:
+                        kernel_copy = False
+                if not kernel_copy:
+                    src_f.seek(offset)
+                    dst_f.seek(offset)
+                    copied = dst_f.write(src_f.read(count))
+                if not copied:
+                    raise IOError(f"{src} 读取到意外的文件结尾")
+                offset += copied
+                if progress_callback:
+                    progress_callback(offset, total)
+            os.fsync(dst_f.fileno())
+        if verify and not SystemUtils.__is_same_content(src, tmp_file):
+            os.remove(tmp_file)
+            raise IOError(f"{dest} 复制后校验不一致")
+        shutil.copystat(src, tmp_file)
+        os.replace(tmp_file, dest)
+
+    @staticmethod
+    def __get_resume_offset(src_f, dst_f, total):
+        """
+        计算断点续传的位置，校验已写入部分的末尾与源文件一致，不一致时重新复制
+        """
+        offset = min(os.fstat(dst_f.fileno()).st_size, total)
+        if not offset:
+            return 0
+        check_size = min(COPY_RESUME_CHECK_SIZE, offset)
+        src_f.seek(offset - check_size)
+        dst_f.seek(offset - check_size)
+        if src_f.read(check_size) != dst_f.read(check_size):
+            return 0
+        return offset
+
+    @staticmethod
+    def __reflink(src_f, dst_f):
+        """
+        尝试使用reflink（写时复制）克隆文件，仅支持btrfs/xfs等文件系统
+        """
+        if os.name == "nt":
+            return False
+        try:
+            import fcntl
+            # FICLONE
+            fcntl.ioctl(dst_f.fileno(), 0x40049409, src_f.fileno())
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def __kernel_copy(src_f, dst_f, offset, count):
+        """
+        使用copy_file_range或sendfile在内核中复制一段数据，都不支持时返回None
+        """
+        if hasattr(os, "copy_file_range"):
+            try:
+                return os.copy_file_range(src_f.fileno(), dst_f.fileno(), count, offset, offset)
+            except OSError as err:
+                if err.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL, errno.EBADF):
+                    raise
+        if hasattr(os, "sendfile") and platform.system() == "Linux":
+            try:
+                dst_f.seek(offset)
+                return os.sendfile(dst_f.fileno(), src_f.fileno(), offset, count)
+            except OSError as err:
+                if err.errno not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+        return None
+
+    @staticmethod
+    def __is_same_content(file1, file2):
+        """
+        按块比较两个文件内容是否一致
+        """
+        if os.path.getsize(file1) != os.path.getsize(file2):
+            return False
+        with open(file1, 'rb') as f1, open(file2, 'rb') as f2:
+            while True:
+                chunk1 = f1.read(COPY_CHUNK_SIZE)
+                if chunk1 != f2.read(COPY_CHUNK_SIZE):
+                    return False
+                if not chunk1:
+                    return True
+
     @staticmethod
     def link(src, dest):
         """
@@ -31,10 +31,83 @@ AUTO_REMOVE_TORRENTS_INTERVAL = 1800
 PT_TRANSFER_INTERVAL = 300
 # TMDB信息缓存定时保存时间
 METAINFO_SAVE_INTERVAL = 600
-# SYNC目录同步聚合转移时间
-SYNC_TRANSFER_INTERVAL = 60
+# 数据库批量IN查询时单次的参数个数
+DB_IN_QUERY_SIZE = 500
+# 数据库读连接池常驻连接数及可额外建立的连接数，查询完成即归还连接
+DB_POOL_SIZE = 10
+DB_POOL_OVERFLOW = 10
+# 数据库被锁定时的等待时间（秒）
+DB_BUSY_TIMEOUT = 30
+# 数据库每个连接的页缓存大小（KB）
+DB_CACHE_SIZE = 16 * 1024
+# 数据库内存映射大小
+DB_MMAP_SIZE = 256 * 1024 * 1024
+# 数据库写入队列单次事务最多合并的写操作数
+DB_WRITE_BATCH_SIZE = 50
+# 等待数据库写操作完成的最长时间（秒）
+DB_WRITE_TIMEOUT = 120
+# 数据库慢查询阈值（秒）
+DB_SLOW_QUERY_TIME = 1
+# 数据库执行统计最多记录的语句数
+DB_STATS_MAX_STATEMENTS = 500
+# 批量识别文件时并发查询TMDB的线程数
+TMDB_BATCH_WORKERS = 5
+# 名称识别结果缓存的条目数
+META_PARSE_CACHE_SIZE = 4096
+# SYNC目录同步检查待转移队列的时间间隔
+SYNC_TRANSFER_INTERVAL = 10
+# SYNC目录同步文件无新事件且大小不变多久后开始转移（秒）
+SYNC_QUIET_SECONDS = 30
+# SYNC目录同步并发转移的线程数
+SYNC_TRANSFER_WORKERS = 4
+# 文件转移时同一磁盘设备上的最大并发复制/移动数
+TRANSFER_DEVICE_CONCURRENCY = 2
+# 文件转移时每种远程转移方式（Rclone/Minio）的最大并发数
+TRANSFER_REMOTE_CONCURRENCY = 2
+# 复制文件时单次复制的块大小
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+# 断点续传时校验已写入部分末尾的大小
+COPY_RESUME_CHECK_SIZE = 1024 * 1024
+# 复制过程中临时文件的后缀
+COPY_TMP_SUFFIX = ".nastool.part"
+# 复制/跨盘移动完成后是否校验文件内容
+COPY_VERIFY = False
+# 媒体库目录索引最多缓存的目录数
+LIBRARY_INDEX_MAX_DIRS = 20000
+# 媒体库目录索引在该时间内（秒）不重复检查目录修改时间
+LIBRARY_INDEX_CHECK_INTERVAL = 5
+# SYNC目录监控去重记录的最大条目数
+SYNC_DEDUPE_MAX_SIZE = 100000
+# SYNC目录监控去重记录的有效期（秒）
+SYNC_DEDUPE_EXPIRE = 30 * 24 * 3600
 # RSS队列中处理时间间隔
 RSS_CHECK_INTERVAL = 300
+# 并发下载RSS的线程数
+RSS_FETCH_WORKERS = 10
+# 单个站点下载RSS的超时时间
+RSS_FETCH_TIMEOUT = 30
+# 资源搜索全局共用的线程数
+SEARCH_MAX_WORKERS = 32
+# 资源搜索时同一站点的最大并发数
+SEARCH_SITE_CONCURRENCY = 2
+# 单次资源搜索的最长时间（秒），超时未返回的站点不再等待
+SEARCH_TIMEOUT = 60
+# 站点搜索结果缓存时间（秒），有效期内相同站点、关键字不再重复请求站点
+SEARCH_CACHE_TTL = 300
+# 站点搜索结果缓存的最大条数，每个站点的每个关键字为一条
+SEARCH_CACHE_SIZE = 512
+# 同时进行的订阅搜索数，各订阅的站点搜索仍共用资源搜索线程池
+SUBSCRIBE_SEARCH_WORKERS = 4
+# 每轮订阅搜索中单个站点最多参与搜索的订阅数，配额用完的订阅顺延到下一轮
+SUBSCRIBE_SEARCH_SITE_BUDGET = 100
+# 定时搜索全部订阅时，跳过该时间内（秒）已搜索过的订阅，重启后不再从头搜索
+SUBSCRIBE_SEARCH_SKIP_INTERVAL = 3 * 3600
+# 上映/播出日期在该天数内的订阅优先搜索
+SUBSCRIBE_SEARCH_RECENT_DAYS = 30
+# 媒体库同步时分页获取媒体的数量
+MEDIASYNC_PAGE_SIZE = 500
+# 媒体库同步时并发查询剧集信息的线程数
+MEDIASYNC_WORKERS = 8
 # 刷新订阅TMDB数据的时间间隔（小时）
 RSS_REFRESH_TMDB_INTERVAL = 6
 # 刷流删除的检查时间间隔
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+目录文件遍历性能对比：os.walk加列表去重 与 PathUtils.iter_dir_files流式遍历
+运行：python -m tests.benchmark_dir_files [文件数]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from app.utils import PathUtils
+from config import RMT_MEDIAEXT
+
+# 默认生成的文件数
+FILE_COUNT = 500000
+# 原实现去重为平方复杂度，超过该文件数时不再测试
+OLD_MAX_COUNT = 50000
+# 每个季目录的文件数
+FILES_PER_DIR = 50
+# 最小文件大小
+MIN_FILESIZE = 1024
+
+
+def make_tree(root, count):
+    """
+    生成媒体库样例：剧集/季/文件，混有字幕、小文件、隐藏目录及回收站
+    """
+    for i in range(count):
+        season_dir = os.path.join(root,
+                                  f"Show {i // (FILES_PER_DIR * 10)}",
+                                  f"Season {i // FILES_PER_DIR % 10 + 1}")
+        if i % FILES_PER_DIR == 0:
+            os.makedirs(season_dir)
+            if i % (FILES_PER_DIR * 100) == 0:
+                os.makedirs(os.path.join(season_dir, "@eaDir"))
+                os.makedirs(os.path.join(season_dir, "#recycle"))
+                os.makedirs(os.path.join(season_dir, ".cache"))
+        name = f"Show - S01E{i % FILES_PER_DIR:02d} - {i}"
+        if i % 5 == 0:
+            name = f"{name}.ass"
+        elif i % 100 == 1:
+            name = f".{name}.mkv"
+        elif i % 100 == 2:
+            name = os.path.join("@eaDir" if i % (FILES_PER_DIR * 100) == 2 else "", f"{name}.mkv")
+        else:
+            name = f"{name}.mkv"
+        with open(os.path.join(season_dir, name), "wb") as f:
+            if i % 7:
+                f.truncate(MIN_FILESIZE)
+
+
+def get_dir_files_walk(in_path, exts="", filesize=0):
+    """
+    原os.walk实现，作为对照
+    """
+    ret_list = []
+    for root, dirs, files in os.walk(in_path):
+        for file in files:
+            cur_path = os.path.join(root, file)
+            if PathUtils.is_invalid_path(cur_path):
+                continue
+            if exts and os.path.splitext(file)[-1].lower() not in exts:
+                continue
+            if filesize and os.path.getsize(cur_path) < filesize:
+                continue
+            if cur_path not in ret_list:
+                ret_list.append(cur_path)
+    return ret_list
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else FILE_COUNT
+    root = tempfile.mkdtemp(prefix="nt-benchmark-")
+    try:
+        start = time.perf_counter()
+        make_tree(root, count)
+        print(f"生成 {count} 个文件，耗时 {time.perf_counter() - start:.1f} 秒")
+        new_cost, new_result = timeit(PathUtils.get_dir_files, root, RMT_MEDIAEXT, MIN_FILESIZE)
+        first_cost, _ = timeit(lambda: next(PathUtils.iter_dir_files(root, RMT_MEDIAEXT, MIN_FILESIZE)))
+        print(f"流式遍历：{new_cost:.3f} 秒，命中 {len(new_result)} 个，首个结果 {first_cost * 1000:.2f} 毫秒")
+        if count <= OLD_MAX_COUNT:
+            old_cost, old_result = timeit(get_dir_files_walk, root, RMT_MEDIAEXT, MIN_FILESIZE)
+            assert old_result == new_result, "遍历结果不一致"
+            print(f"os.walk：{old_cost:.3f} 秒，加速比 {old_cost / new_cost:.1f}")
+        else:
+            print(f"os.walk：文件数超过 {OLD_MAX_COUNT}，跳过")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
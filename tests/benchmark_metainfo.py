@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+名称识别性能测试：首次识别与命中缓存后的吞吐量
+运行：python -m tests.benchmark_metainfo
+"""
+import time
+
+from app.media.meta import MetaInfo, MetaInfoBatch
+from app.media.meta import metainfo
+from tests.cases.meta_cases import meta_cases
+
+# 每组重复次数
+ROUNDS = 20
+
+
+def meta_summary(meta_info):
+    """
+    提取用于比对的识别结果
+    """
+    return (meta_info.type, meta_info.cn_name, meta_info.en_name, meta_info.year, meta_info.part,
+            meta_info.get_season_string(), meta_info.get_episode_string(), meta_info.get_edtion_string(),
+            meta_info.resource_pix, meta_info.video_encode, meta_info.audio_encode, meta_info.resource_team,
+            meta_info.org_string, meta_info.rev_string)
+
+
+def run(items, clear_cache):
+    start = time.perf_counter()
+    count = 0
+    for _ in range(ROUNDS):
+        if clear_cache:
+            metainfo._meta_cache.clear()
+        for title, subtitle in items:
+            MetaInfo(title=title, subtitle=subtitle)
+            count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    items = [(case.get("title"), case.get("subtitle")) for case in meta_cases if case.get("title")]
+    metainfo._meta_cache.clear()
+    # 缓存返回的结果与首次识别一致，且修改返回对象不影响缓存
+    first = [MetaInfo(title=title, subtitle=subtitle) for title, subtitle in items]
+    cached = MetaInfoBatch(items)
+    assert [meta_summary(m) for m in first] == [meta_summary(m) for m in cached], "缓存识别结果不一致"
+    first[0].cn_name = "changed"
+    first[0].size = 1024
+    again = MetaInfo(title=items[0][0], subtitle=items[0][1])
+    assert meta_summary(again) == meta_summary(cached[0]) and not again.size, "缓存对象被修改"
+
+    cold = run(items, clear_cache=True)
+    warm = run(items, clear_cache=False)
+    print(f"样例数：{len(items)}，重复：{ROUNDS}")
+    print(f"首次识别：{cold:,.0f} 条/秒")
+    print(f"命中缓存：{warm:,.0f} 条/秒")
+    print(f"加速比：{warm / cold:.1f}")
+
+
+if __name__ == '__main__':
+    main()
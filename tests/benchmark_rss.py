@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+RSS解析性能对比：minidom整树解析 与 RssHelper流式解析
+运行：python -m tests.benchmark_rss
+"""
+import glob
+import os
+import time
+import xml.dom.minidom
+
+from app.helper.rss_helper import RssHelper, RSS_SPECIAL_TITLE_SITES, RSS_EXPIRED_MSG
+from app.utils import DomUtils, StringUtils
+
+# 测试的条目数
+ITEM_COUNTS = [500, 5000, 20000]
+# 每组重复次数
+ROUNDS = 3
+# 按站点实际输出结构整理的RSS样例，含RSS 1.0（RDF）默认命名空间及蜜柑计划的嵌套命名空间
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "rss")
+
+
+def make_rss_feed(count):
+    """
+    生成站点RSS样例
+    """
+    items = []
+    for i in range(count):
+        items.append(f"""
+    <item>
+      <title><![CDATA[Show.Name.S01E{i % 100:02d}.2023.1080p.WEB-DL.H264.AAC-GROUP{i}]]></title>
+      <link>https://pt.example.com/details.php?id={i}</link>
+      <description><![CDATA[<p>副标题 {i}</p>]]></description>
+      <enclosure url="https://pt.example.com/download.php?id={i}&amp;passkey=abc" length="{1024 * 1024 * (i + 1)}" type="application/x-bittorrent" />
+      <pubDate>Mon, 16 Oct 2023 10:{i % 60:02d}:00 +0800</pubDate>
+      <guid isPermaLink="false">{i}</guid>
+    </item>""")
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>Example</title><link>https://pt.example.com</link>{"".join(items)}
+</channel></rss>"""
+
+
+def make_torznab_feed(count):
+    """
+    生成Jackett/Prowlarr聚合RSS样例
+    """
+    items = []
+    for i in range(count):
+        items.append(f"""
+    <item>
+      <title>Movie Name {i} 2022 2160p UHD BluRay REMUX HEVC DTS-HD MA 7.1-GROUP</title>
+      <guid>https://indexer.example.com/dl/{i}</guid>
+      <jackettindexer id="site{i % 40}">Site {i % 40}</jackettindexer>
+      <comments>https://site.example.com/details/{i}</comments>
+      <pubDate>Tue, 17 Oct 2023 08:{i % 60:02d}:00 +0000</pubDate>
+      <size>{1024 * 1024 * 1024 + i}</size>
+      <link>https://indexer.example.com/dl/{i}?file=Movie+Name+{i}</link>
+      <category>2000</category>
+      <enclosure url="https://indexer.example.com/dl/{i}?file=Movie+Name+{i}" length="{1024 * 1024 * 1024 + i}" type="application/x-bittorrent" />
+      <torznab:attr name="category" value="2000" />
+      <torznab:attr name="seeders" value="{i % 300}" />
+      <torznab:attr name="peers" value="{i % 500}" />
+      <torznab:attr name="downloadvolumefactor" value="0" />
+      <torznab:attr name="uploadvolumefactor" value="1" />
+    </item>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" xmlns:torznab="http://torznab.com/schemas/2015/feed">
+<channel><atom:link href="https://indexer.example.com/api" rel="self" type="application/rss+xml" />
+<title>Aggregate</title>{"".join(items)}
+</channel></rss>"""
+
+
+def parse_rssxml_minidom(url, ret_xml):
+    """
+    原minidom实现，作为对照
+    """
+    ret_array = []
+    site_domain = StringUtils.get_url_domain(url)
+    try:
+        dom_tree = xml.dom.minidom.parseString(ret_xml)
+        rootNode = dom_tree.documentElement
+        items = rootNode.getElementsByTagName("item")
+        for item in items:
+            try:
+                title = DomUtils.tag_value(item, "title", default="")
+                if not title:
+                    continue
+                if site_domain and site_domain in RSS_SPECIAL_TITLE_SITES:
+                    title = RSS_SPECIAL_TITLE_SITES.get(site_domain)(title)
+                description = DomUtils.tag_value(item, "description", default="")
+                link = DomUtils.tag_value(item, "link", default="")
+                enclosure = DomUtils.tag_value(item, "enclosure", "url", default="")
+                if not enclosure and not link:
+                    continue
+                if not enclosure and link:
+                    enclosure = link
+                    link = None
+                size = DomUtils.tag_value(item, "enclosure", "length", default=0)
+                if size and str(size).isdigit():
+                    size = int(size)
+                else:
+                    size = 0
+                pubdate = DomUtils.tag_value(item, "pubDate", default="")
+                if pubdate:
+                    pubdate = StringUtils.get_time_stamp(pubdate)
+                ret_array.append({'title': title,
+                                  'enclosure': enclosure,
+                                  'size': size,
+                                  'description': description,
+                                  'link': link,
+                                  'pubdate': pubdate})
+            except Exception as e1:
+                print(str(e1))
+                continue
+    except Exception as e2:
+        if ret_xml in RSS_EXPIRED_MSG:
+            return None
+        print(str(e2))
+    return ret_array
+
+
+def timeit(func, *args):
+    best = None
+    result = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = func(*args)
+        cost = time.perf_counter() - start
+        best = cost if best is None else min(best, cost)
+    return best, result
+
+
+def main():
+    samples = []
+    for count in ITEM_COUNTS:
+        samples.append((f"站点RSS {count}条", "https://pt.example.com/torrentrss.php", make_rss_feed(count)))
+        samples.append((f"Torznab {count}条", "https://indexer.example.com/api", make_torznab_feed(count)))
+    for fixture in sorted(glob.glob(os.path.join(FIXTURE_PATH, "*.xml"))):
+        with open(fixture, encoding="utf-8") as f:
+            samples.append((os.path.basename(fixture), "https://pt.example.com/torrentrss.php", f.read()))
+    print(f"{'样例':<20}{'minidom(s)':>12}{'流式(s)':>12}{'加速比':>10}")
+    for name, url, content in samples:
+        old_cost, old_result = timeit(parse_rssxml_minidom, url, content)
+        new_cost, new_result = timeit(RssHelper.parse_rss_content, url, content)
+        assert old_result and old_result == new_result, f"{name} 解析结果不一致"
+        print(f"{name:<20}{old_cost:>12.3f}{new_cost:>12.3f}{old_cost / new_cost:>10.1f}")
+    assert RssHelper.parse_rss_content("https://pt.example.com", RSS_EXPIRED_MSG[0]) is None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+内置索引器单站点搜索延迟对比：启动爬虫轮询等待、启动爬虫事件等待 与 TorrentSpider.fetch直接请求解析
+运行：python -m tests.benchmark_spider_search [搜索次数]
+"""
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from app.indexer.client._spider import TorrentSpider
+from app.indexer.indexerConf import IndexerConf
+from config import Config
+
+# 默认搜索次数
+SEARCH_COUNT = 10
+# 使用的站点配置，页面为NexusPHP种子列表
+INDEXER_DOMAIN = "piggo.me"
+# 录制的站点页面
+FIXTURE_FILE = os.path.join(os.path.dirname(__file__), "fixtures", "spider", "nexusphp_torrents.html")
+# 搜索超时时间
+TIMEOUT = 30
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    任意路径均返回录制的站点页面
+    """
+    content = b""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(self.content)))
+        self.end_headers()
+        self.wfile.write(self.content)
+
+    def log_message(self, *args):
+        pass
+
+
+def get_indexer(domain):
+    """
+    从内置站点配置中取出索引器，域名指向本地服务
+    """
+    with open(Config().get_user_sites_bin_path(), "rb") as f:
+        user_sites = json.loads(base64.b64decode(f.read()).decode("utf-8"))
+    for item in user_sites.get("indexer", []):
+        if INDEXER_DOMAIN in item.get("domain", ""):
+            indexer = IndexerConf(item, cookie="c_secure_login=benchmark")
+            indexer.domain = domain
+            return indexer
+    raise RuntimeError(f"未找到站点配置：{INDEXER_DOMAIN}")
+
+
+def search_polling(indexer):
+    """
+    原实现：启动爬虫后每秒检查一次是否完成
+    """
+    spider = TorrentSpider()
+    spider.setparam(indexer=indexer, keyword="Three Body")
+    spider.start()
+    sleep_count = 0
+    while not spider.is_complete:
+        sleep_count += 1
+        time.sleep(1)
+        if sleep_count > TIMEOUT:
+            break
+    return spider.is_error, spider.torrents_info_array.copy()
+
+
+def search_event(indexer):
+    """
+    启动爬虫后等待完成事件
+    """
+    spider = TorrentSpider()
+    spider.setparam(indexer=indexer, keyword="Three Body")
+    spider.start()
+    spider.wait_complete(TIMEOUT)
+    return spider.is_error, spider.torrents_info_array.copy()
+
+
+def search_fetch(indexer):
+    """
+    共享连接池直接请求并解析
+    """
+    spider = TorrentSpider()
+    spider.setparam(indexer=indexer, keyword="Three Body")
+    return spider.fetch(timeout=TIMEOUT)
+
+
+def timeit(func, indexer, count):
+    costs = []
+    result = None
+    for _ in range(count):
+        start = time.perf_counter()
+        result = func(indexer)
+        costs.append(time.perf_counter() - start)
+    costs.sort()
+    return costs[len(costs) // 2], max(costs), result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else SEARCH_COUNT
+    with open(FIXTURE_FILE, "rb") as f:
+        FixtureHandler.content = f.read()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        indexer = get_indexer(f"http://127.0.0.1:{server.server_address[1]}/")
+        results = {}
+        for name, func in [("启动爬虫+轮询", search_polling),
+                           ("启动爬虫+事件", search_event),
+                           ("直接请求解析", search_fetch)]:
+            median, slowest, (error, torrents) = timeit(func, indexer, count)
+            assert not error, f"{name} 搜索出错"
+            results[name] = torrents
+            print(f"{name}：中位数 {median * 1000:.1f} 毫秒，最慢 {slowest * 1000:.1f} 毫秒，"
+                  f"解析 {len(torrents)} 条")
+        baseline = results["启动爬虫+轮询"]
+        for name, torrents in results.items():
+            assert torrents == baseline, f"{name} 解析结果不一致"
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from app.mediaserver import MediaServer
+from app.mediaserver.client.emby import Emby
+from app.mediaserver.client.jellyfin import Jellyfin
+
+
+class FakeMediaClient(object):
+    """
+    模拟媒体服务器，剧集的集信息可以设置为获取失败
+    """
+
+    def __init__(self):
+        self.items = [{"id": "1", "type": "Movie", "title": "电影", "etag": "m1"},
+                      {"id": "2", "type": "Series", "title": "剧集", "etag": "s1"}]
+        self.episodes = {"2": [{"season_num": 1, "episode_num": 1}]}
+        self.fail_episodes = set()
+        self.episode_requests = []
+
+    @staticmethod
+    def get_libraries():
+        return [{"id": "lib", "name": "媒体库"}]
+
+    def get_sync_items(self, parent):
+        return list(self.items)
+
+    def get_sync_tv_episodes(self, item_id):
+        self.episode_requests.append(item_id)
+        if item_id in self.fail_episodes:
+            return None
+        return self.episodes.get(item_id)
+
+
+class FakeMediaDb(object):
+    """
+    模拟媒体库同步数据，只记录etag及集信息
+    """
+
+    def __init__(self):
+        self.items = {}
+
+    def get_etags(self, server_type):
+        return {item_id: item.get("etag") for item_id, (item, _) in self.items.items()}
+
+    def sync(self, server_type, items, delete_ids, total_count, movie_count, tv_count):
+        for item, seasoninfo in items:
+            self.items[item.get("id")] = (item, seasoninfo)
+        for item_id in delete_ids:
+            self.items.pop(item_id, None)
+        return True
+
+
+class FakeSystemConfig(object):
+
+    @staticmethod
+    def get(key):
+        return ["lib"]
+
+
+class MediaSyncTest(TestCase):
+    """
+    媒体库增量同步：集信息获取失败的剧集不能登记新的etag，下次同步时需重新获取
+    """
+
+    def setUp(self) -> None:
+        self._mediaserver = MediaServer()
+        self._saved = (self._mediaserver._server, self._mediaserver.mediadb, self._mediaserver.systemconfig)
+        self._client = FakeMediaClient()
+        self._mediadb = FakeMediaDb()
+        self._mediaserver._server = self._client
+        self._mediaserver.mediadb = self._mediadb
+        self._mediaserver.systemconfig = FakeSystemConfig()
+
+    def tearDown(self) -> None:
+        self._mediaserver._server, self._mediaserver.mediadb, self._mediaserver.systemconfig = self._saved
+
+    def test_failed_episodes_refetched(self):
+        self._mediaserver.sync_mediaserver()
+        self.assertEqual(self._client.episode_requests, ["2"])
+        # 剧集有变化，但本次集信息获取失败，保留原数据
+        self._client.items[1] = dict(self._client.items[1], etag="s2")
+        self._client.episodes["2"] = [{"season_num": 1, "episode_num": 1}, {"season_num": 1, "episode_num": 2}]
+        self._client.fail_episodes.add("2")
+        self._mediaserver.sync_mediaserver()
+        self.assertEqual(self._client.episode_requests, ["2", "2"])
+        self.assertEqual(self._mediadb.get_etags(None).get("2"), "s1")
+        self.assertEqual(len(self._mediadb.items["2"][1]), 1)
+        # 恢复后下次同步重新获取并登记新的etag
+        self._client.fail_episodes.clear()
+        self._mediaserver.sync_mediaserver()
+        self.assertEqual(self._client.episode_requests, ["2", "2", "2"])
+        self.assertEqual(self._mediadb.get_etags(None).get("2"), "s2")
+        self.assertEqual(len(self._mediadb.items["2"][1]), 2)
+        # 没有变化时不再获取
+        self._mediaserver.sync_mediaserver()
+        self.assertEqual(self._client.episode_requests, ["2", "2", "2"])
+
+    def test_client_failed_episodes(self):
+        for client_class in [Emby, Jellyfin]:
+            client = client_class(config={"host": None})
+            client._host, client._apikey, client._user = "http://localhost/", "apikey", "user"
+            with patch(f"{client_class.__module__}.RequestUtils") as request_utils:
+                # 无法连接及请求失败时返回None
+                request_utils.return_value.get_res.return_value = None
+                self.assertIsNone(client.get_sync_tv_episodes("2"))
+                request_utils.return_value.get_res.return_value = MagicMock(status_code=500)
+                self.assertIsNone(client.get_sync_tv_episodes("2"))
+                request_utils.return_value.get_res.return_value = MagicMock(
+                    status_code=200, json=lambda: {"Items": [{"ParentIndexNumber": 1, "IndexNumber": 3}]})
+                self.assertEqual(client.get_sync_tv_episodes("2"), [{"season_num": 1, "episode_num": 3}])
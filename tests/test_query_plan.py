@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Query
+
+from app.db import main_db, media_db
+from app.db.models import Base, BaseMedia, TRANSFERHISTORY, TRANSFERBLACKLIST, TRANSFERUNKNOWN, SYNCHISTORY, \
+    RSSTORRENTS, RSSHISTORY, DOWNLOADHISTORY, SITESTATISTICSHISTORY, SITEUSERSEEDINGINFO, SITEBRUSHTORRENTS, \
+    PLUGINHISTORY, MEDIASYNCITEMS
+from app.helper import DbHelper, RssHelper
+from app.db import MediaDb
+
+# 每张表生成的记录数
+SEED_ROWS = 20000
+
+
+class QueryPlanTest(TestCase):
+    """
+    在生成的大数据量数据库上执行DbHelper等的高频查询，检查执行计划中不能有全表扫描
+    """
+
+    def setUp(self) -> None:
+        self._temp_path = tempfile.mkdtemp(prefix="nt-query-plan-")
+        self._main_engine = create_engine(f"sqlite:///{os.path.join(self._temp_path, 'user.db')}")
+        self._media_engine = create_engine(f"sqlite:///{os.path.join(self._temp_path, 'media.db')}")
+        Base.metadata.create_all(self._main_engine)
+        BaseMedia.metadata.create_all(self._media_engine)
+        self.__seed()
+        self._statements = []
+        for engine in [self._main_engine, self._media_engine]:
+            event.listen(engine, "before_cursor_execute", self.__record_statement)
+        # DbHelper、RssHelper、MediaDb的查询改到临时数据库上执行
+        main_db._Session.remove()
+        main_db._Session.configure(bind=self._main_engine)
+        media_db._Session.remove()
+        media_db._Session.configure(bind=self._media_engine)
+
+    def tearDown(self) -> None:
+        main_db._Session.remove()
+        main_db._Session.configure(bind=main_db._Engine)
+        media_db._Session.remove()
+        media_db._Session.configure(bind=media_db._Engine)
+        self._main_engine.dispose()
+        self._media_engine.dispose()
+        shutil.rmtree(self._temp_path, ignore_errors=True)
+
+    def __seed(self):
+        seeds = {
+            TRANSFERHISTORY: lambda i: {"SOURCE_PATH": f"/downloads/{i % 500}", "SOURCE_FILENAME": f"file{i}.mkv",
+                                        "DEST_PATH": f"/library/{i % 500}", "DEST_FILENAME": f"file{i}.mkv",
+                                        "TMDBID": i % 3000, "TITLE": f"title{i % 3000}",
+                                        "SEASON_EPISODE": f"S01E{i % 20:02d}", "DATE": f"2023-01-01 00:00:{i}"},
+            TRANSFERBLACKLIST: lambda i: {"PATH": f"/downloads/{i % 500}/file{i}.mkv"},
+            TRANSFERUNKNOWN: lambda i: {"PATH": f"/downloads/{i}", "DEST": "/library", "STATE": "N"},
+            SYNCHISTORY: lambda i: {"PATH": f"/downloads/{i}", "SRC": "/downloads", "DEST": f"/library/{i}"},
+            RSSTORRENTS: lambda i: {"TORRENT_NAME": f"torrent{i}", "ENCLOSURE": f"https://site/dl/{i}",
+                                    "TITLE": f"title{i % 3000}", "YEAR": "2023", "SEASON": "S01",
+                                    "EPISODE": f"E{i % 20:02d}"},
+            RSSHISTORY: lambda i: {"TYPE": "TV", "RSSID": str(i), "NAME": f"title{i}", "YEAR": "2023",
+                                   "SEASON": "S01"},
+            DOWNLOADHISTORY: lambda i: {"TITLE": f"title{i}", "ENCLOSURE": f"https://site/dl/{i}",
+                                        "DOWNLOADER": str(i % 3), "DOWNLOAD_ID": f"hash{i}",
+                                        "SAVE_PATH": f"/downloads/{i}", "DATE": f"2023-01-01 00:00:{i}"},
+            SITESTATISTICSHISTORY: lambda i: {"SITE": f"site{i % 50}", "URL": f"https://site{i % 50}/",
+                                              "DATE": f"2023-{i // 50:05d}"},
+            SITEUSERSEEDINGINFO: lambda i: {"SITE": f"site{i}", "URL": f"https://site{i}/"},
+            SITEBRUSHTORRENTS: lambda i: {"TASK_ID": str(i % 20), "TORRENT_NAME": f"torrent{i}",
+                                          "ENCLOSURE": f"https://site/dl/{i}", "DOWNLOAD_ID": f"hash{i}"},
+            PLUGINHISTORY: lambda i: {"PLUGIN_ID": f"plugin{i % 10}", "KEY": f"key{i}", "VALUE": "{}"},
+        }
+        with self._main_engine.begin() as conn:
+            for table, make_row in seeds.items():
+                conn.execute(table.__table__.insert(), [make_row(i) for i in range(SEED_ROWS)])
+        with self._media_engine.begin() as conn:
+            conn.execute(MEDIASYNCITEMS.__table__.insert(), [{
+                "SERVER": ["emby", "jellyfin", "plex"][i % 3], "LIBRARY": str(i % 10), "ITEM_ID": str(i),
+                "TITLE": f"title{i}", "YEAR": "2023", "TMDBID": str(i)
+            } for i in range(SEED_ROWS)])
+
+    def __record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            self._statements.append((conn.engine, statement, parameters))
+
+    @staticmethod
+    def __hot_queries():
+        dbhelper = DbHelper()
+        rsshelper = RssHelper()
+        mediadb = MediaDb()
+        return {
+            "is_transfer_history_exists": lambda: dbhelper.is_transfer_history_exists(
+                "/downloads/1", "file1.mkv", "/library/1", "file1.mkv"),
+            "is_transfer_history_exists_by_source_full_path": lambda: (
+                dbhelper.is_transfer_history_exists_by_source_full_path("/downloads/1/file1.mkv")),
+            "get_transfer_info_by": lambda: dbhelper.get_transfer_info_by(tmdbid=1, season="S01"),
+            "is_transfer_in_blacklist": lambda: dbhelper.is_transfer_in_blacklist("/downloads/1/file1.mkv"),
+            "get_transfer_in_blacklist": lambda: dbhelper.get_transfer_in_blacklist(
+                [f"/downloads/1/file{i}.mkv" for i in range(10)]),
+            "get_transfer_unknown_by_path": lambda: dbhelper.get_transfer_unknown_by_path("/downloads/1"),
+            "is_sync_in_history": lambda: dbhelper.is_sync_in_history("/downloads/1", "/library/1"),
+            "is_exists_download_history": lambda: dbhelper.is_exists_download_history(
+                "https://site/dl/1", "1", "hash1"),
+            "get_download_history_by_downloader": lambda: dbhelper.get_download_history_by_downloader("1", "hash1"),
+            "get_download_history_by_path": lambda: dbhelper.get_download_history_by_path("/downloads/1"),
+            "get_site_statistics_history": lambda: dbhelper.get_site_statistics_history("site1"),
+            "is_site_statistics_history_exists": lambda: dbhelper.is_site_statistics_history_exists(
+                "https://site1/", "2023-00001"),
+            "get_site_seeding_info": lambda: dbhelper.get_site_seeding_info("site1"),
+            "is_site_seeding_info_exist": lambda: dbhelper.is_site_seeding_info_exist("https://site1/"),
+            "is_brushtask_torrent_exists": lambda: dbhelper.is_brushtask_torrent_exists(
+                "1", "torrent1", "https://site/dl/1"),
+            "get_brushtask_torrent_by_enclosure": lambda: dbhelper.get_brushtask_torrent_by_enclosure(
+                "https://site/dl/1"),
+            "is_exists_rss_history": lambda: dbhelper.is_exists_rss_history("1"),
+            "check_rss_history": lambda: dbhelper.check_rss_history("TV", "title1", "2023", "S01"),
+            "get_plugin_history": lambda: dbhelper.get_plugin_history("plugin1", "key1"),
+            "is_rssd_by_enclosure": lambda: rsshelper.is_rssd_by_enclosure("https://site/dl/1"),
+            "get_rssd_enclosures": lambda: rsshelper.get_rssd_enclosures(
+                [f"https://site/dl/{i}" for i in range(10)]),
+            "is_rssd_by_simple": lambda: rsshelper.is_rssd_by_simple("torrent1", None),
+            "mediadb_query_by_tmdbid": lambda: mediadb.query("emby", "title1", "2023", "1"),
+            "mediadb_query_by_title": lambda: mediadb.query("emby", "title2", "2023", None),
+        }
+
+    def test_query_plan(self):
+        full_scans = []
+        for name, query in self.__hot_queries().items():
+            self._statements = []
+            ret = query()
+            if isinstance(ret, Query):
+                ret.all()
+            self.assertTrue(self._statements, f"{name} 未执行查询")
+            for engine, statement, parameters in self._statements:
+                with engine.connect() as conn:
+                    plans = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+                for plan in plans:
+                    detail = plan[-1]
+                    # SCAN为遍历整张表或整个索引，SEARCH才是按索引定位
+                    if detail.startswith("SCAN"):
+                        full_scans.append(f"{name}: {detail} <- {statement}")
+        self.assertFalse(full_scans, "以下查询存在全表扫描：\n" + "\n".join(full_scans))
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import glob
+import os
+import tempfile
+from unittest import TestCase
+
+from app.helper.rss_helper import RssHelper
+from tests.benchmark_rss import parse_rssxml_minidom, FIXTURE_PATH
+
+
+class RssHelperTest(TestCase):
+    """
+    RSS流式解析的安全性及与minidom实现的一致性
+    """
+
+    def test_external_entity_not_resolved(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("nastool-secret-content")
+        try:
+            ret_xml = f"""<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE rss [
+  <!ENTITY secret SYSTEM "file://{f.name}">
+  <!ENTITY remote SYSTEM "http://127.0.0.1:9/entity">
+]>
+<rss version="2.0"><channel>
+<item>
+<title>&secret;</title>
+<description>&remote;</description>
+<enclosure url="https://pt.example.com/download.php?id=1" length="1" type="application/x-bittorrent" />
+</item>
+<item>
+<title>Movie.2023.1080p.WEB-DL-GROUP &secret;</title>
+<link>https://pt.example.com/details.php?id=2</link>
+</item>
+</channel></rss>"""
+            results = RssHelper.parse_rss_content("https://pt.example.com/torrentrss.php", ret_xml)
+            self.assertNotIn("nastool-secret-content", repr(results))
+            self.assertEqual(["Movie.2023.1080p.WEB-DL-GROUP "], [item.get("title") for item in results])
+        finally:
+            os.remove(f.name)
+
+    def test_fixtures_match_minidom(self):
+        fixtures = sorted(glob.glob(os.path.join(FIXTURE_PATH, "*.xml")))
+        self.assertTrue(fixtures, "未找到RSS样例")
+        for fixture in fixtures:
+            with open(fixture, encoding="utf-8") as f:
+                ret_xml = f.read()
+            with self.subTest(fixture=os.path.basename(fixture)):
+                expected = parse_rssxml_minidom("https://pt.example.com/torrentrss.php", ret_xml)
+                self.assertTrue(expected)
+                self.assertEqual(expected,
+                                 RssHelper.parse_rss_content("https://pt.example.com/torrentrss.php", ret_xml))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import glob
+import json
+import os
+from unittest import TestCase
+
+from app.indexer.client._spider import TorrentSpider
+from app.indexer.indexerConf import IndexerConf
+
+# 录制的站点页面及期望结果，期望结果由逐行PyQuery解析的原实现生成
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "spider")
+
+
+class SpiderParserTest(TestCase):
+    """
+    各类站点页面结构下，预编译解析器的结果需与原实现一致
+    """
+
+    def test_parse_fixtures(self):
+        fixtures = sorted(glob.glob(os.path.join(FIXTURE_PATH, "*.json")))
+        self.assertTrue(fixtures, "未找到站点页面样例")
+        for fixture in fixtures:
+            with open(fixture, encoding="utf-8") as f:
+                expected = json.load(f)
+            with open(os.path.splitext(fixture)[0] + ".html", encoding="utf-8") as f:
+                html_text = f.read()
+            for item in expected.get("indexers"):
+                with self.subTest(fixture=os.path.basename(fixture), indexer=item.get("id")):
+                    spider = TorrentSpider()
+                    spider.setparam(indexer=IndexerConf({"id": item.get("id"),
+                                                         "name": item.get("id"),
+                                                         "domain": expected.get("domain"),
+                                                         "torrents": item.get("torrents")}))
+                    spider.result_num = expected.get("result_num")
+                    spider.parse_html(html_text)
+                    self.assertFalse(spider.is_error)
+                    # 按JSON序列化后比较，与期望结果的存储格式一致
+                    results = json.loads(json.dumps(spider.torrents_info_array, ensure_ascii=False))
+                    self.assertEqual(item.get("results"), results)
@@ -22,11 +22,12 @@ from werkzeug.security import generate_password_hash
 import log
 from app.brushtask import BrushTask
 from app.conf import SystemConfig, ModuleConf
+from app.db import MainDb, get_db_stats
 from app.downloader import Downloader
 from app.filetransfer import FileTransfer
 from app.filter import Filter
 from app.helper import DbHelper, ProgressHelper, ThreadHelper, \
-    MetaHelper, DisplayHelper, WordsHelper
+    MetaHelper, DisplayHelper, WordsHelper, HardlinkHelper
 from app.helper import RssHelper, PluginHelper
 from app.indexer import Indexer
 from app.media import Category, Media, Bangumi, DouBan, Scraper
@@ -241,6 +242,7 @@ class WebAction:
             "update_category_config": self.update_category_config,
             "get_category_config": self.get_category_config,
             "get_system_processes": self.get_system_processes,
+            "get_db_stats": self.__get_db_stats,
             "run_plugin_method": self.run_plugin_method,
             "get_library_resume": self.__get_resume,
         }
@@ -1038,7 +1040,7 @@ class WebAction:
                                                 e)
                                 rm_parent_dir = True
                             if rm_parent_dir \
-                                    and not PathUtils.get_dir_files(os.path.dirname(dest_path), exts=RMT_MEDIAEXT):
+                                    and not PathUtils.has_dir_files(os.path.dirname(dest_path), exts=RMT_MEDIAEXT):
                                 # 没有媒体文件时，删除整个目录
                                 try:
                                     shutil.rmtree(os.path.dirname(dest_path))
@@ -1065,7 +1067,7 @@ class WebAction:
             if re.findall(r"^S\d{2}|^Season", os.path.basename(filedir), re.I):
                 # 当前是季文件夹，判断并删除
                 seaon_dir = filedir
-                if seaon_dir.count('/') > 1 and not PathUtils.get_dir_files(seaon_dir, exts=RMT_MEDIAEXT):
+                if seaon_dir.count('/') > 1 and not PathUtils.has_dir_files(seaon_dir, exts=RMT_MEDIAEXT):
                     shutil.rmtree(seaon_dir)
                 # 媒体文件夹
                 media_dir = os.path.dirname(seaon_dir)
@@ -1075,7 +1077,7 @@ class WebAction:
             if media_dir != '/' \
                     and media_dir.count('/') > 1 \
                     and not re.search(r'[a-zA-Z]:/$', media_dir) \
-                    and not PathUtils.get_dir_files(media_dir, exts=RMT_MEDIAEXT):
+                    and not PathUtils.has_dir_files(media_dir, exts=RMT_MEDIAEXT):
                 shutil.rmtree(media_dir)
             return True, f"{file} 删除成功"
         except Exception as e:
@@ -1934,7 +1936,7 @@ class WebAction:
         修改TMDB缓存的标题
         """
         if MetaHelper().modify_meta_data(data.get("key"), data.get("title")):
-            MetaHelper().save_meta_data(force=True)
+            MetaHelper().save_meta_data()
         return {"code": 0}
 
     @staticmethod
@@ -2579,7 +2581,6 @@ class WebAction:
         """
         try:
             MetaHelper().clear_meta_data()
-            os.remove(MetaHelper().get_meta_data_path())
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
             return {"code": 0, "msg": str(e)}
@@ -2621,8 +2622,19 @@ class WebAction:
             config_path = Config().get_config_path()
             temp_path = Config().get_temp_path()
             file_path = os.path.join(temp_path, filename)
+            unpack_path = os.path.join(temp_path, f"{filename}.unpack")
             try:
-                shutil.unpack_archive(file_path, config_path, format='zip')
+                # 先解压到临时目录，关闭数据库连接并删除WAL日志后再替换文件
+                shutil.unpack_archive(file_path, unpack_path, format='zip')
+                MainDb.close()
+                try:
+                    for root, _, files in os.walk(unpack_path):
+                        dest_path = os.path.join(config_path, os.path.relpath(root, unpack_path))
+                        os.makedirs(dest_path, exist_ok=True)
+                        for file in files:
+                            shutil.move(os.path.join(root, file), os.path.join(dest_path, file))
+                finally:
+                    MainDb.reopen()
                 return {"code": 0, "msg": ""}
             except Exception as e:
                 ExceptionUtils.exception_traceback(e)
@@ -2630,6 +2642,8 @@ class WebAction:
             finally:
                 if os.path.exists(file_path):
                     os.remove(file_path)
+                if os.path.exists(unpack_path):
+                    shutil.rmtree(unpack_path)
 
         return {"code": 1, "msg": "文件不存在"}
 
@@ -4219,11 +4233,11 @@ class WebAction:
             for dir in sync_dirs:
                 if dir[0] and file.startswith(f"{dir[0]}/"):
                     direction = '→'
-                    hardlinks = parse_hardlinks(SystemUtils().find_hardlinks(file=file, fdir=dir[1]))
+                    hardlinks = parse_hardlinks(HardlinkHelper().find_hardlinks(file=file, fdir=dir[1]))
                     break
                 elif dir[1] and file.startswith(f"{dir[1]}/"):
                     direction = '←'
-                    hardlinks = parse_hardlinks(SystemUtils().find_hardlinks(file=file, fdir=dir[0]))
+                    hardlinks = parse_hardlinks(HardlinkHelper().find_hardlinks(file=file, fdir=dir[0]))
                     break     
             r={
                 "filepath": file,  # 文件路径
@@ -4505,7 +4519,7 @@ class WebAction:
         if files:
             try:
                 for file in files:
-                    hardlinks[os.path.basename(file)] = SystemUtils(
+                    hardlinks[os.path.basename(file)] = HardlinkHelper(
                     ).find_hardlinks(file=file, fdir=file_dir)
             except Exception as e:
                 ExceptionUtils.exception_traceback(e)
@@ -5100,15 +5114,25 @@ class WebAction:
         dataset = [["indexer", "avg"]]
         result = Indexer().get_indexer_statistics() or []
         dataset.extend([[ret[0], round(ret[4], 1)] for ret in result])
-        return {
-            "code": 0,
-            "data": [{
+        # 搜索结果缓存命中统计
+        cache_stats = Indexer().get_search_cache_stats()
+        data = []
+        for ret in result:
+            cache_stat = cache_stats.get(ret[0]) or {}
+            cache_hits = cache_stat.get("hits") or 0
+            cache_total = cache_hits + (cache_stat.get("misses") or 0)
+            data.append({
                 "name": ret[0],
                 "total": ret[1],
                 "fail": ret[2],
                 "success": ret[3],
                 "avg": round(ret[4], 1),
-            } for ret in result],
+                "cache_hits": cache_hits,
+                "cache_rate": round(cache_hits * 100 / cache_total, 1) if cache_total else 0
+            })
+        return {
+            "code": 0,
+            "data": data,
             "dataset": dataset
         }
 
@@ -5321,6 +5345,7 @@ class WebAction:
             # 把现有的相关文件进行copy备份
             shutil.copy(f'{config_path}/config.yaml', backup_path)
             shutil.copy(f'{config_path}/default-category.yaml', backup_path)
+            MainDb.checkpoint()
             shutil.copy(f'{config_path}/user.db', backup_path)
 
             # 完整备份不删除表
@@ -5354,6 +5379,13 @@ class WebAction:
             ExceptionUtils.exception_traceback(e)
             return None
 
+    @staticmethod
+    def __get_db_stats(data=None):
+        """
+        获取数据库语句执行及写入队列统计
+        """
+        return {"code": 0, "data": get_db_stats()}
+
     @staticmethod
     def get_system_processes():
         """
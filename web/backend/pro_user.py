@@ -113,7 +113,8 @@ SERVICE_CONF = {
     'ruletest': {'name': '过滤规则测试', 'time': '', 'state': 'OFF', 'svg': '<svg xmlns="http://www.w3.org/2000/svg" class="icon icon-tabler icon-tabler-adjustments-horizontal" width="24" height="24" viewBox="0 0 24 24" stroke-width="2" stroke="currentColor" fill="none" stroke-linecap="round" stroke-linejoin="round">\n                       <path stroke="none" d="M0 0h24v24H0z" fill="none"></path>\n                       <circle cx="14" cy="6" r="2"></circle>\n                       <line x1="4" y1="6" x2="12" y2="6"></line>\n                       <line x1="16" y1="6" x2="20" y2="6"></line>\n                       <circle cx="8" cy="12" r="2"></circle>\n                       <line x1="4" y1="12" x2="6" y2="12"></line>\n                       <line x1="10" y1="12" x2="20" y2="12"></line>\n                       <circle cx="17" cy="18" r="2"></circle>\n                       <line x1="4" y1="18" x2="15" y2="18"></line>\n                       <line x1="19" y1="18" x2="20" y2="18"></line>\n                    </svg>', 'color': 'yellow', 'level': 2},
     'nettest': {'name': '网络连通性测试', 'time': '', 'state': 'OFF', 'svg': '<svg xmlns="http://www.w3.org/2000/svg" class="icon icon-tabler icon-tabler-network" width="40" height="40" viewBox="0 0 24 24" stroke-width="2" stroke="currentColor" fill="none" stroke-linecap="round" stroke-linejoin="round">\n                       <path stroke="none" d="M0 0h24v24H0z" fill="none"></path>\n                       <circle cx="12" cy="9" r="6"></circle>\n                       <path d="M12 3c1.333 .333 2 2.333 2 6s-.667 5.667 -2 6"></path>\n                       <path d="M12 3c-1.333 .333 -2 2.333 -2 6s.667 5.667 2 6"></path>\n                       <path d="M6 9h12"></path>\n                       <path d="M3 19h7"></path>\n                       <path d="M14 19h7"></path>\n                       <circle cx="12" cy="19" r="2"></circle>\n                       <path d="M12 15v2"></path>\n                    </svg>', 'color': 'cyan', 'targets': ModuleConf.NETTEST_TARGETS, 'level': 1},
     'backup': {'name': '备份&恢复', 'time': '', 'state': 'OFF', 'svg': '<svg t="1660720525544" class="icon" viewBox="0 0 1024 1024" version="1.1" xmlns="http://www.w3.org/2000/svg" p-id="1559" width="16" height="16">\n                        <path d="M646 1024H100A100 100 0 0 1 0 924V258a100 100 0 0 1 100-100h546a100 100 0 0 1 100 100v31a40 40 0 1 1-80 0v-31a20 20 0 0 0-20-20H100a20 20 0 0 0-20 20v666a20 20 0 0 0 20 20h546a20 20 0 0 0 20-20V713a40 40 0 0 1 80 0v211a100 100 0 0 1-100 100z" fill="#ffffff" p-id="1560"></path>\n                        <path d="M924 866H806a40 40 0 0 1 0-80h118a20 20 0 0 0 20-20V100a20 20 0 0 0-20-20H378a20 20 0 0 0-20 20v8a40 40 0 0 1-80 0v-8A100 100 0 0 1 378 0h546a100 100 0 0 1 100 100v666a100 100 0 0 1-100 100z" fill="#ffffff" p-id="1561"></path>\n                        <path d="M469 887a40 40 0 0 1-27-10L152 618a40 40 0 0 1 1-60l290-248a40 40 0 0 1 66 30v128a367 367 0 0 0 241-128l94-111a40 40 0 0 1 70 35l-26 109a430 430 0 0 1-379 332v142a40 40 0 0 1-40 40zM240 589l189 169v-91a40 40 0 0 1 40-40c144 0 269-85 323-214a447 447 0 0 1-323 137 40 40 0 0 1-40-40v-83z" fill="#ffffff" p-id="1562"></path>\n                    </svg>', 'color': 'green', 'level': 1},
-    'processes': {'name': '系统进程', 'time': '', 'state': 'OFF', 'svg': '<svg xmlns="http://www.w3.org/2000/svg" class="icon icon-tabler icon-tabler-terminal-2" width="24" height="24" viewBox="0 0 24 24" stroke-width="2" stroke="currentColor" fill="none" stroke-linecap="round" stroke-linejoin="round">\n                        <path stroke="none" d="M0 0h24v24H0z" fill="none"></path>\n                        <path d="M8 9l3 3l-3 3"></path>\n                        <path d="M13 15l3 0"></path>\n                        <path d="M3 4m0 2a2 2 0 0 1 2 -2h14a2 2 0 0 1 2 2v12a2 2 0 0 1 -2 2h-14a2 2 0 0 1 -2 -2z"></path>\n                    </svg>', 'color': 'muted', 'level': 1}
+    'processes': {'name': '系统进程', 'time': '', 'state': 'OFF', 'svg': '<svg xmlns="http://www.w3.org/2000/svg" class="icon icon-tabler icon-tabler-terminal-2" width="24" height="24" viewBox="0 0 24 24" stroke-width="2" stroke="currentColor" fill="none" stroke-linecap="round" stroke-linejoin="round">\n                        <path stroke="none" d="M0 0h24v24H0z" fill="none"></path>\n                        <path d="M8 9l3 3l-3 3"></path>\n                        <path d="M13 15l3 0"></path>\n                        <path d="M3 4m0 2a2 2 0 0 1 2 -2h14a2 2 0 0 1 2 2v12a2 2 0 0 1 -2 2h-14a2 2 0 0 1 -2 -2z"></path>\n                    </svg>', 'color': 'muted', 'level': 1},
+    'dbstats': {'name': '数据库统计', 'time': '', 'state': 'OFF', 'svg': '<svg xmlns="http://www.w3.org/2000/svg" class="icon icon-tabler icon-tabler-database" width="24" height="24" viewBox="0 0 24 24" stroke-width="2" stroke="currentColor" fill="none" stroke-linecap="round" stroke-linejoin="round">\n                        <path stroke="none" d="M0 0h24v24H0z" fill="none"></path>\n                        <path d="M12 6m-8 0a8 3 0 1 0 16 0a8 3 0 1 0 -16 0"></path>\n                        <path d="M4 6v6a8 3 0 0 0 16 0v-6"></path>\n                        <path d="M4 12v6a8 3 0 0 0 16 0v-6"></path>\n                    </svg>', 'color': 'muted', 'level': 1}
 }
 
 
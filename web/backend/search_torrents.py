@@ -130,12 +130,24 @@ def search_medias_for_web(content, ident_flag=True, filters=None, tmdbid=None, m
     # 整合高级查询条件
     if filters:
         filter_args.update(filters)
+    # 清空缓存结果
+    _searcher.delete_all_search_torrents()
+
+    def __insert_site_results(_, site_results):
+        """
+        每个站点搜索完成即写入结果，搜索过程中即可查看已返回的资源
+        """
+        _searcher.insert_search_results(media_items=site_results,
+                                        ident_flag=ident_flag,
+                                        title=content)
+
     # 开始搜索
     log.info("【Web】开始搜索 %s ..." % content)
     media_list = _searcher.search_medias(key_word=first_search_name,
                                          filter_args=filter_args,
                                          match_media=media_info,
-                                         in_from=SearchType.WEB)
+                                         in_from=SearchType.WEB,
+                                         callback=__insert_site_results)
     # 使用第二名称重新搜索
     if ident_flag \
             and len(media_list) == 0 \
@@ -149,9 +161,8 @@ def search_medias_for_web(content, ident_flag=True, filters=None, tmdbid=None, m
         media_list = _searcher.search_medias(key_word=second_search_name,
                                              filter_args=filter_args,
                                              match_media=media_info,
-                                             in_from=SearchType.WEB)
-    # 清空缓存结果
-    _searcher.delete_all_search_torrents()
+                                             in_from=SearchType.WEB,
+                                             callback=__insert_site_results)
     # 结束进度
     _process.end(ProgressKey.Search)
     if len(media_list) == 0:
@@ -159,13 +170,13 @@ def search_medias_for_web(content, ident_flag=True, filters=None, tmdbid=None, m
         return 1, "%s 未搜索到任何资源" % content
     else:
         log.info("【Web】共搜索到 %s 个有效资源" % len(media_list))
-        # 插入数据库
+        # 按排序重新插入数据库
         media_list = sorted(media_list, key=lambda x: "%s%s%s" % (str(x.res_order).rjust(3, '0'),
                                                                   str(x.site_order).rjust(3, '0'),
                                                                   str(x.seeders).rjust(10, '0')), reverse=True)
-        _searcher.insert_search_results(media_items=media_list,
-                                        ident_flag=ident_flag,
-                                        title=content)
+        _searcher.replace_search_results(media_items=media_list,
+                                         ident_flag=ident_flag,
+                                         title=content)
         return 0, ""
 
 
@@ -419,11 +430,28 @@ def __search_media(in_from, media_info, user_id, user_name=None):
     Message().send_channel_msg(channel=in_from,
                                title="开始搜索 %s ..." % media_info.title,
                                user_id=user_id)
+    # 已返回结果的站点
+    result_sites = []
+
+    def __notify_site_results(indexer, site_results):
+        """
+        第一个站点返回结果时先发送消息，其它站点继续搜索
+        """
+        if not site_results:
+            return
+        result_sites.append(indexer.name)
+        if len(result_sites) == 1:
+            Message().send_channel_msg(channel=in_from,
+                                       title="%s 已在 %s 搜索到%s个资源，继续搜索其它站点 ..." % (
+                                           media_info.title, indexer.name, len(site_results)),
+                                       user_id=user_id)
+
     search_result, no_exists, search_count, download_count = Searcher().search_one_media(media_info=media_info,
                                                                                          in_from=in_from,
                                                                                          no_exists=no_exists,
                                                                                          sites=media_info.search_sites,
-                                                                                         user_name=user_name)
+                                                                                         user_name=user_name,
+                                                                                         callback=__notify_site_results)
     # 没有搜索到数据
     if not search_count:
         Message().send_channel_msg(channel=in_from,
@@ -30,10 +30,12 @@ import log
 from app.brushtask import BrushTask
 from app.conf import ModuleConf, SystemConfig
 from app.downloader import Downloader
+from app.filetransfer import FileTransfer
 from app.filter import Filter
 from app.helper import SecurityHelper, MetaHelper, ChromeHelper, ThreadHelper
 from app.indexer import Indexer
 from app.media.meta import MetaInfo
+from app.media.tmdbv3api import TMDb
 from app.mediaserver import MediaServer
 from app.message import Message
 from app.plugins import EventManager
@@ -856,7 +858,8 @@ def tmdbcache():
                            CurrentPage=current_page,
                            TotalPage=total_page,
                            PageRange=page_range,
-                           PageNum=page_num)
+                           PageNum=page_num,
+                           RequestCacheStats=TMDb.cache_stats())
 
 
 # 手工识别页面
@@ -939,9 +942,13 @@ def customwords():
 def directorysync():
     RmtModeDict = WebAction().get_rmt_modes()
     SyncPaths = Sync().get_sync_path_conf()
+    MonitorStats = Sync().get_monitor_stats()
+    TransferStats = FileTransfer().get_transfer_command_stats()
     return render_template("setting/directorysync.html",
                            SyncPaths=SyncPaths,
                            SyncCount=len(SyncPaths),
+                           MonitorStats=MonitorStats,
+                           TransferStats=TransferStats,
                            RmtModeDict=RmtModeDict)
 
 